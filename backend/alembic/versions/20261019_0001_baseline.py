@@ -0,0 +1,119 @@
+"""baseline schema
+
+Everything the app created with create_all() plus the hand-patched report_conclusion column.
+Written to be idempotent so it also adopts databases that predate Alembic: tables that
+already exist are left alone and only the missing pieces are added.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0001"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def _backfill_session_methods(bind: sa.engine.Connection) -> None:
+    sessions = sa.table("sessions", sa.column("session_id", sa.String), sa.column("methods_used", sa.JSON))
+    methods = sa.table("session_methods", sa.column("session_id", sa.String), sa.column("method", sa.String))
+    rows = []
+    for session_id, used in bind.execute(sa.select(sessions.c.session_id, sessions.c.methods_used)):
+        rows.extend({"session_id": session_id, "method": m} for m in dict.fromkeys(used or []) if isinstance(m, str))
+        if len(rows) >= 1000:
+            bind.execute(methods.insert(), rows)
+            rows = []
+    if rows:
+        bind.execute(methods.insert(), rows)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+
+    if "sessions" not in existing:
+        op.create_table(
+            "sessions",
+            sa.Column("session_id", sa.String(36), primary_key=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("file_name", sa.String(255), nullable=True),
+            sa.Column("file_uri", sa.Text(), nullable=True),
+            sa.Column("industry", sa.String(32), nullable=True),
+            sa.Column("first_query", sa.Text(), nullable=True),
+            sa.Column("methods_used", sa.JSON(), nullable=False),
+            sa.Column("message_count", sa.Integer(), nullable=False),
+            sa.Column("data_summary", sa.JSON(), nullable=True),
+            sa.Column("report_conclusion", sa.Text(), nullable=True),
+            sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        )
+    elif "report_conclusion" not in {c["name"] for c in inspector.get_columns("sessions")}:
+        op.add_column("sessions", sa.Column("report_conclusion", sa.Text(), nullable=True))
+
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("session_id", sa.String(36), sa.ForeignKey("sessions.session_id"), nullable=False),
+            sa.Column("role", sa.String(16), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("analysis", sa.JSON(), nullable=True),
+        )
+        op.create_index("ix_messages_session_id", "messages", ["session_id"])
+
+    if "session_methods" not in existing:
+        op.create_table(
+            "session_methods",
+            sa.Column(
+                "session_id", sa.String(36), sa.ForeignKey("sessions.session_id", ondelete="CASCADE"), primary_key=True
+            ),
+            sa.Column("method", sa.String(64), primary_key=True),
+        )
+        op.create_index("ix_session_methods_method_session", "session_methods", ["method", "session_id"])
+        if "sessions" in existing:
+            _backfill_session_methods(bind)
+
+    if "app_config" not in existing:
+        op.create_table(
+            "app_config",
+            sa.Column("key", sa.String(64), primary_key=True),
+            sa.Column("value", sa.JSON(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        )
+
+    if "config_version" not in existing:
+        op.create_table(
+            "config_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+
+    if "llm_cache" not in existing:
+        op.create_table(
+            "llm_cache",
+            sa.Column("key", sa.String(64), primary_key=True),
+            sa.Column("provider", sa.String(32), nullable=False),
+            sa.Column("model", sa.String(128), nullable=False),
+            sa.Column("response", sa.Text(), nullable=False),
+            sa.Column("hits", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index("ix_llm_cache_last_used_at", "llm_cache", ["last_used_at"])
+        op.create_index("ix_llm_cache_expires_at", "llm_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    for table in ("llm_cache", "config_version", "app_config", "session_methods", "messages", "sessions"):
+        op.drop_table(table)
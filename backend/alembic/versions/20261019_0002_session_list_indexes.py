@@ -0,0 +1,36 @@
+"""indexes for keyset pagination of the sessions list
+
+(deleted_at, updated_at, session_id) serves the default history page: the deleted_at IS NULL
+prefix is an equality and the remaining columns match ORDER BY updated_at DESC, session_id DESC,
+so a page is an index range scan whatever its depth. The industry variant serves the industry
+filter the same way; created_at serves the date-range filter.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "0002"
+down_revision: str | None = "0001"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_sessions_live_updated", "sessions", ["deleted_at", "updated_at", "session_id"], if_not_exists=True)
+    op.create_index(
+        "ix_sessions_industry_updated", "sessions", ["industry", "deleted_at", "updated_at", "session_id"], if_not_exists=True
+    )
+    op.create_index("ix_sessions_created_at", "sessions", ["created_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sessions_created_at", table_name="sessions")
+    op.drop_index("ix_sessions_industry_updated", table_name="sessions")
+    op.drop_index("ix_sessions_live_updated", table_name="sessions")
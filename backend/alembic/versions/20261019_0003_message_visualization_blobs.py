@@ -0,0 +1,36 @@
+"""move chart payloads out of messages.analysis
+
+Adds the blob reference and chart count columns. The rows themselves are moved by
+scripts/migrate_analysis_blobs.py in small batches (readers accept both layouts), so
+this revision stays a cheap ALTER on large databases.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0003"
+down_revision: str | None = "0002"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("messages")}
+    if "visualizations_ref" not in columns:
+        op.add_column("messages", sa.Column("visualizations_ref", sa.String(64), nullable=True))
+    if "visualization_count" not in columns:
+        op.add_column("messages", sa.Column("visualization_count", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_column("visualization_count")
+        batch.drop_column("visualizations_ref")
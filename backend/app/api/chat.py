@@ -1,63 +1,58 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-import math
+import time
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import asdict
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.db.session import get_db
-from app.schemas.api import ChatRequest, ChatResponse
-from app.schemas.llm import IntentOut, PlanOut
+from app.core.serialization import FastJSONResponse, dumps_str
+from app.core.settings import settings
+from app.db.session import SessionLocal, get_db
+from app.schemas.api import ChatBatchRequest, ChatBatchResponse, ChatRequest, ChatResponse
 from app.services.config_store import get_model_config, get_prompt_templates
 from app.services.data_loader import load_dataframe
 from app.services.engine.data_summary import build_data_summary
-from app.services.llm.client import LLMError, LLMModelConfig, call_llm_json
+from app.services.engine.methods import EngineResult
+from app.services.executor import AnalysisCancelled, AnalysisTimeout, analysis_executor
+from app.services.jobs import Job, job_manager
+from app.services.llm.client import LLMModelConfig
 from app.services.llm.intent import Intent, parse_intent_heuristic
-from app.services.llm.json_parse import extract_first_json_object
-from app.services.planner import Plan, choose_plan, run_plan
-from app.services.sessions import add_message, create_session, get_session_or_404
+from app.services.llm.planning import start_llm_planning
+from app.services.planner import Plan, choose_plan
+from app.services.sessions import ChatTurn
 from app.services.storage.files import save_upload_base64
+from app.services.storage.snapshots import write_snapshot
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-def _sanitize_nan(obj: Any) -> Any:
-    """Replace NaN/Inf floats with None recursively to ensure JSON compliance."""
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    if isinstance(obj, dict):
-        return {k: _sanitize_nan(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple)):
-        return [_sanitize_nan(v) for v in obj]
-    return obj
-
-
-def _ensure_session_data(db: Session, *, session_id: str, file_b64: str | None, industry: str | None) -> tuple[str, dict]:
-    s = get_session_or_404(db, session_id)
+def _ensure_session_data(turn: ChatTurn, *, file_b64: str | None, industry: str | None) -> tuple[str, dict]:
+    s = turn.session
     if industry and not s.industry:
         s.industry = industry
     if file_b64:
-        file_name, file_path = save_upload_base64(session_id, "data.csv", file_b64)
+        file_name, file_path = save_upload_base64(turn.session_id, "data.csv", file_b64)
         s.file_name = file_name
         s.file_uri = file_path
         loaded = load_dataframe(file_path)
         summary = build_data_summary(loaded.df)
         s.data_summary = summary
-        db.add(s)
-        db.commit()
     if not s.file_uri:
         raise HTTPException(status_code=400, detail="请先上传数据文件（/api/v2/upload）或在本次请求携带 file(base64)")
     if not s.data_summary:
         loaded = load_dataframe(s.file_uri)
         s.data_summary = build_data_summary(loaded.df)
-        db.add(s)
-        db.commit()
     return s.file_uri, s.data_summary
 
 
@@ -114,140 +109,449 @@ def _fill_missing_params(plan: Plan, df) -> Plan:
     return Plan(method=plan.method, params=p)
 
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, db: Session = Depends(get_db)) -> ChatResponse:
+# Stage callback: emit(event, data) is called as the turn progresses (used by the SSE endpoint)
+StageEmitter = Callable[[str, dict[str, Any]], None]
+
+
+def _prepare_turn(db: Session, req: ChatRequest, emit: StageEmitter | None = None) -> tuple[ChatTurn, str, Plan]:
+    """Stage the user message, resolve intent/plan and snapshot the frame for the executor."""
+    turn = ChatTurn.open(db, req.session_id, industry=req.industry)
+    if emit:
+        emit("session", {"session_id": turn.session_id})
+    turn.add_message("user", req.message)
     try:
-        if req.session_id:
-            session_id = req.session_id
-            _ = get_session_or_404(db, session_id)
-        else:
-            session = create_session(db, industry=req.industry)
-            session_id = session.session_id
+        snapshot, plan = _plan_turn(turn, req, emit)
+    except Exception:
+        turn.fail()
+        raise
+    return turn, snapshot, plan
 
-        add_message(db, session_id=session_id, role="user", content=req.message, analysis=None)
 
-        file_uri, data_summary = _ensure_session_data(db, session_id=session_id, file_b64=req.file, industry=req.industry)
+def _explicit_intent(message: str) -> Intent | None:
+    """Explicit JSON with task/x/y (from the variable picker) bypasses intent parsing."""
+    try:
+        msg_obj = json.loads(message)
+    except (ValueError, TypeError):
+        return None
+    if not (isinstance(msg_obj, dict) and msg_obj.get("task") and (
+        msg_obj.get("x") or msg_obj.get("y") or msg_obj.get("specs")
+    )):
+        return None
+    try:
+        return Intent(
+            task=str(msg_obj.get("task", "auto")),
+            x=msg_obj.get("x"),
+            y=msg_obj.get("y"),
+            group=msg_obj.get("group"),
+            alpha=float(msg_obj.get("alpha", 0.05)),
+            usl=float(msg_obj["usl"]) if msg_obj.get("usl") is not None else None,
+            lsl=float(msg_obj["lsl"]) if msg_obj.get("lsl") is not None else None,
+            stream=str(msg_obj["stream"]) if msg_obj.get("stream") is not None else None,
+            chart_type=msg_obj.get("chart_type"),
+            specs=msg_obj.get("specs"),
+            top_n=int(msg_obj["top_n"]) if msg_obj.get("top_n") is not None else None,
+            window=int(msg_obj["window"]) if msg_obj.get("window") is not None else None,
+        )
+    except (ValueError, TypeError):
+        return None
+
+
+def _start_planning(
+    message: str, data_summary: dict[str, Any], model_cfg_raw: dict[str, Any], prompts: dict[str, Any]
+) -> tuple[Intent | None, Future[tuple[Intent, Plan]] | None]:
+    """Return (explicit intent, None) or (None, LLM planning future if an api_key is configured)."""
+    intent = _explicit_intent(message)
+    if intent is not None:
+        logger.info("Explicit intent from JSON message: %s", intent)
+        return intent, None
+
+    # Optional LLM path: only when api_key is set AND intent was not explicit
+    if model_cfg_raw.get("api_key"):
+        try:
+            return None, start_llm_planning(
+                LLMModelConfig(**model_cfg_raw), prompts, message, data_summary,
+                merged=settings.llm_merged_planning,
+            )
+        except Exception:
+            logger.warning("llm_planning_not_started", exc_info=True)
+    return None, None
+
+
+def _settle_plan(
+    message: str,
+    df,
+    data_summary: dict[str, Any],
+    intent: Intent | None,
+    llm_future: Future[tuple[Intent, Plan]] | None,
+    deadline: float,
+) -> tuple[Intent, Plan, str]:
+    """
+    Heuristic plan now; the LLM answer replaces it if it arrives before the deadline. A
+    heuristic failure (e.g. data it cannot classify) only surfaces when there is no LLM
+    plan to use instead.
+    """
+    source = "explicit" if intent is not None else "heuristic"
+    heuristic_error: Exception | None = None
+    try:
+        if intent is None:
+            intent = parse_intent_heuristic(message, data_summary["column_names"])
+        plan = choose_plan(df, intent)
+    except Exception as e:
+        heuristic_error = e
 
-        loaded = load_dataframe(file_uri)
-        df = loaded.df
+    if llm_future is not None:
+        try:
+            intent, plan = llm_future.result(timeout=max(deadline - time.monotonic(), 0.0))
+            return intent, _fill_missing_params(plan, df), "llm"
+        except FutureTimeout:
+            logger.info("llm_plan_budget_exceeded (%.1fs), using heuristic plan", settings.llm_plan_budget_s)
+        except Exception:
+            # Fall back to heuristic
+            logger.warning("llm_planning_failed", exc_info=True)
+
+    if heuristic_error is not None:
+        raise heuristic_error
+    return intent, _fill_missing_params(plan, df), source
+
+
+def _plan_turn(
+    turn: ChatTurn, req: ChatRequest, emit: StageEmitter | None = None
+) -> tuple[str, Plan]:
+    """
+    Resolve the plan with a latency budget: the LLM path (when configured) starts first and
+    runs while the data is loaded, snapshotted and the heuristic plan is computed; if it has
+    not answered within LLM_PLAN_BUDGET_S the heuristic plan is used.
+    """
+    deadline = time.monotonic() + settings.llm_plan_budget_s
+    file_uri, data_summary = _ensure_session_data(turn, file_b64=req.file, industry=req.industry)
+    intent, llm_future = _start_planning(
+        req.message, data_summary, get_model_config(turn.db), get_prompt_templates(turn.db)
+    )
+
+    df = load_dataframe(file_uri).df
+    snapshot = write_snapshot(df, file_uri)
+
+    intent, plan, source = _settle_plan(req.message, df, data_summary, intent, llm_future, deadline)
+    if emit:
+        emit("intent", {k: v for k, v in asdict(intent).items() if v is not None})
+        emit("plan", {"method": plan.method, "params": plan.params, "source": source})
+    return snapshot, plan
+
+
+def _analysis_payload(result: EngineResult) -> dict[str, Any]:
+    return {
+        "method": result.method,
+        "method_name": result.method_name,
+        "p_value": result.p_value,
+        "effect_size": result.effect_size,
+        "significant": result.significant,
+        "interpretation": result.interpretation,
+        "suggestions": result.suggestions,
+        "visualizations": result.visualizations,
+    }
+
+
+def _finish_turn(turn: ChatTurn, result: EngineResult) -> dict[str, Any]:
+    """Stage the assistant message, commit the whole turn and build the response body."""
+    analysis = _analysis_payload(result)
+    reply = result.interpretation
+    # NaN/Inf and numpy values are handled once, at encode time (DB JSON columns and responses)
+    turn.add_message("assistant", reply, analysis)
+    turn.record_method(result.method)
+    turn.commit()
+    return {
+        "session_id": turn.session_id,
+        "reply": reply,
+        "analysis": analysis,
+        "suggestions": result.suggestions,
+        "visualizations": result.visualizations,
+    }
 
-        model_cfg_raw = get_model_config(db)
-        prompts = get_prompt_templates(db)
 
-        intent = None
-        plan = None
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest, request: Request, db: Session = Depends(get_db)) -> ChatResponse:
+    try:
+        turn, snapshot, plan = await run_in_threadpool(_prepare_turn, db, req)
+        try:
+            result = await analysis_executor.run(snapshot, plan, is_cancelled=request.is_disconnected)
+        except Exception:
+            await run_in_threadpool(turn.fail)
+            raise
+        resp_data = await run_in_threadpool(_finish_turn, turn, result)
+        return FastJSONResponse(content=resp_data)
+    except AnalysisCancelled:
+        logger.info("chat_cancelled: client disconnected")
+        return Response(status_code=499)
+    except AnalysisTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("chat_failed")
+        # Match frontend interceptor: message or detail
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Check if message is an explicit JSON with task/x/y (from variable picker)
-        _explicit_intent = False
+
+def _error_status(e: BaseException) -> tuple[int, str]:
+    if isinstance(e, AnalysisTimeout):
+        return 504, str(e)
+    if isinstance(e, AnalysisCancelled):
+        return 499, "cancelled"
+    if isinstance(e, HTTPException):
+        return e.status_code, str(e.detail)
+    if isinstance(e, KeyError):
+        return 404, "会话不存在"
+    return 400, str(e)
+
+
+def _prepare_batch(db: Session, req: ChatBatchRequest) -> tuple[ChatTurn, str, list[str], list[Plan | Exception]]:
+    """Load and snapshot the frame once, then plan every question against it (LLM calls run concurrently)."""
+    messages = [m if isinstance(m, str) else json.dumps(m, ensure_ascii=False) for m in req.messages]
+    deadline = time.monotonic() + settings.llm_plan_budget_s
+    turn = ChatTurn.open(db, req.session_id)
+    file_uri, data_summary = _ensure_session_data(turn, file_b64=None, industry=None)
+    model_cfg_raw, prompts = get_model_config(db), get_prompt_templates(db)
+    pending = [_start_planning(m, data_summary, model_cfg_raw, prompts) for m in messages]
+
+    df = load_dataframe(file_uri).df
+    snapshot = write_snapshot(df, file_uri)
+
+    plans: list[Plan | Exception] = []
+    for message, (intent, llm_future) in zip(messages, pending):
         try:
-            import json as _json
-            msg_obj = _json.loads(req.message)
-            if isinstance(msg_obj, dict) and msg_obj.get("task") and (msg_obj.get("x") or msg_obj.get("y")):
-                intent = Intent(
-                    task=str(msg_obj.get("task", "auto")),
-                    x=msg_obj.get("x"),
-                    y=msg_obj.get("y"),
-                    group=msg_obj.get("group"),
-                    alpha=float(msg_obj.get("alpha", 0.05)),
-                    usl=float(msg_obj["usl"]) if msg_obj.get("usl") is not None else None,
-                    lsl=float(msg_obj["lsl"]) if msg_obj.get("lsl") is not None else None,
-                )
-                _explicit_intent = True
-                logger.info("Explicit intent from JSON message: %s", intent)
-        except (ValueError, TypeError):
-            pass
-
-        # Optional LLM path: only when api_key is set AND intent was not explicit
-        if not _explicit_intent:
+            plans.append(_settle_plan(message, df, data_summary, intent, llm_future, deadline)[1])
+        except Exception as e:
+            plans.append(e)
+    return turn, snapshot, messages, plans
+
+
+def _finish_batch(
+    turn: ChatTurn, messages: list[str], outcomes: list[EngineResult | BaseException]
+) -> dict[str, Any]:
+    """Persist every question and answer in one transaction; failed items keep only the question."""
+    items: list[dict[str, Any]] = []
+    for index, (message, outcome) in enumerate(zip(messages, outcomes)):
+        turn.add_message("user", message)
+        if isinstance(outcome, KeyError):
+            # the session was resolved up front, so a KeyError here is a missing column
+            outcome = ValueError(f"字段不存在：{outcome}")
+        if isinstance(outcome, BaseException):
+            status, error = _error_status(outcome)
+            items.append({"index": index, "message": message, "status": status, "error": error})
+            continue
+        analysis = _analysis_payload(outcome)
+        turn.add_message("assistant", outcome.interpretation, analysis)
+        turn.record_method(outcome.method)
+        items.append({
+            "index": index,
+            "message": message,
+            "status": 200,
+            "reply": outcome.interpretation,
+            "analysis": analysis,
+            "suggestions": outcome.suggestions,
+            "visualizations": outcome.visualizations,
+        })
+    turn.commit()
+    return {"session_id": turn.session_id, "results": items}
+
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest, request: Request, db: Session = Depends(get_db)) -> ChatBatchResponse:
+    """
+    Run several questions over one session's dataset: the file is loaded and snapshotted once,
+    the plans run concurrently in the analysis pool (at most one per worker in flight) and all
+    messages are saved in one commit.
+    Results come back in request order; a failing item carries its own status and error.
+    """
+    try:
+        turn, snapshot, messages, plans = await run_in_threadpool(_prepare_batch, db, req)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("chat_batch_failed")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # each pending executor.run holds a threadpool thread while it waits for a worker process;
+    # admitting only as many items as there are workers keeps a large batch from draining the
+    # shared anyio threadpool that every sync endpoint runs on
+    slots = asyncio.Semaphore(max(analysis_executor.max_workers, 1))
+
+    async def _run(plan: Plan | Exception) -> EngineResult:
+        if isinstance(plan, Exception):
+            raise plan
+        async with slots:
+            return await analysis_executor.run(snapshot, plan, is_cancelled=request.is_disconnected)
+
+    outcomes = await asyncio.gather(*(_run(p) for p in plans), return_exceptions=True)
+    if await request.is_disconnected():
+        logger.info("chat_batch_cancelled: client disconnected")
+        return Response(status_code=499)
+    resp_data = await run_in_threadpool(_finish_batch, turn, messages, outcomes)
+    return FastJSONResponse(content=resp_data)
+
+
+def _sse_event(event: str, data: dict[str, Any]) -> str:
+    payload = dumps_str(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request) -> StreamingResponse:
+    """
+    SSE variant of /chat. Events, in order: session, intent, plan, statistic (everything
+    except the charts), charts, done; or error {status, detail} at any point. The analysis
+    computes the charts together with the statistic, so statistic and charts are sent back
+    to back; the split only lets clients show the conclusion before the chart payload is
+    transferred and parsed. The assistant message is persisted after the charts are sent,
+    so done means the turn is saved.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[str, dict[str, Any]]] = asyncio.Queue()
+
+    def emit(event: str, data: dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    async def pipeline() -> None:
+        # the request-scoped session from get_db is closed before a streamed body runs
+        db = SessionLocal()
+        worker: asyncio.Future | None = None
+
+        async def in_thread(fn, *args):
+            nonlocal worker
+            # shielded: a disconnect cancels this task, but not the thread still using db
+            worker = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            return await asyncio.shield(worker)
+
+        try:
+            turn, snapshot, plan = await in_thread(_prepare_turn, db, req, emit)
             try:
-                if model_cfg_raw.get("api_key"):
-                    cfg = LLMModelConfig(**model_cfg_raw)
-                    system = "你是一个统计分析助手。严格只输出 JSON，不要输出额外文字。"
-
-                    intent_prompt = (
-                        f"{prompts.get('intent','')}\n\n"
-                        f"用户问题：{req.message}\n"
-                        f"数据列名：{data_summary.get('column_names',[])}\n\n"
-                        "请输出 JSON：{task,x,y,group,value,alpha}，task 只能是 auto/regression/difference/correlation/chi_square。"
-                    )
-                    intent_text = call_llm_json(config=cfg, system_prompt=system, user_prompt=intent_prompt)
-                    intent_obj = extract_first_json_object(intent_text)
-                    intent_out = IntentOut.model_validate(intent_obj)
-
-                    plan_prompt = (
-                        f"{prompts.get('planning','')}\n\n"
-                        f"intent：{intent_out.model_dump()}\n"
-                        f"data_summary：{data_summary}\n\n"
-                        "请输出 JSON：{method,params}，method 只能是 "
-                        "auto/linear_regression/pearson/spearman/t_test/mann_whitney_u/anova/kruskal/chi_square/auto_group_diff。"
-                    )
-                    plan_text = call_llm_json(config=cfg, system_prompt=system, user_prompt=plan_prompt)
-                    plan_obj = extract_first_json_object(plan_text)
-                    plan_out = PlanOut.model_validate(plan_obj)
-
-                    intent = Intent(
-                        task=intent_out.task,
-                        x=intent_out.x,
-                        y=intent_out.y or intent_out.value,
-                        group=intent_out.group,
-                        alpha=float(intent_out.alpha),
-                    )
-                    plan = Plan(method=plan_out.method, params=plan_out.params)
-            except (LLMError, ValueError, Exception):
-                # Fall back to heuristic
-                intent = None
-                plan = None
+                result = await analysis_executor.run(snapshot, plan, is_cancelled=request.is_disconnected)
+            except Exception:
+                await in_thread(turn.fail)
+                raise
+            emit("statistic", {
+                "session_id": turn.session_id,
+                "method": result.method,
+                "method_name": result.method_name,
+                "p_value": result.p_value,
+                "effect_size": result.effect_size,
+                "significant": result.significant,
+                "interpretation": result.interpretation,
+                "suggestions": result.suggestions,
+            })
+            emit("charts", {"visualizations": result.visualizations})
+            resp_data = await in_thread(_finish_turn, turn, result)
+            emit("done", {"session_id": turn.session_id, "reply": resp_data["reply"]})
+        except AnalysisCancelled:
+            logger.info("chat_stream_cancelled: client disconnected")
+            emit("error", {"status": 499, "detail": "cancelled"})
+        except AnalysisTimeout as e:
+            emit("error", {"status": 504, "detail": str(e)})
+        except KeyError:
+            emit("error", {"status": 404, "detail": "会话不存在"})
+        except HTTPException as e:
+            emit("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception("chat_stream_failed")
+            emit("error", {"status": 400, "detail": str(e)})
+        finally:
+            if worker is not None and not worker.done():
+                await asyncio.gather(worker, return_exceptions=True)
+            db.close()
+
+    async def events() -> AsyncIterator[str]:
+        task = asyncio.ensure_future(pipeline())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield _sse_event(event, data)
+                if event in ("done", "error"):
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
 
-        if intent is None:
-            intent = parse_intent_heuristic(req.message, data_summary["column_names"])
-
-        if plan is None:
-            plan = choose_plan(df, intent)
-
-        plan = _fill_missing_params(plan, df)
-        result = run_plan(df, plan)
-
-        s = get_session_or_404(db, session_id)
-        used = s.methods_used or []
-        if result.method not in used:
-            used.append(result.method)
-        s.methods_used = used
-        db.add(s)
-        db.commit()
-
-        analysis = _sanitize_nan({
-            "method": result.method,
-            "method_name": result.method_name,
-            "p_value": result.p_value,
-            "effect_size": result.effect_size,
-            "significant": result.significant,
-            "interpretation": result.interpretation,
-            "suggestions": result.suggestions,
-            "visualizations": result.visualizations,
-        })
-        reply = result.interpretation
-        add_message(db, session_id=session_id, role="assistant", content=reply, analysis=analysis)
-
-        # Build response as plain dict and force NaN-safe JSON serialization
-        # to avoid Pydantic/Starlette rejecting NaN floats from numpy
-        import json as _json, re as _re
-        resp_data = {
-            "session_id": session_id,
-            "reply": reply,
-            "analysis": analysis,
-            "suggestions": result.suggestions,
-            "visualizations": _sanitize_nan(result.visualizations),
-        }
-        raw = _json.dumps(resp_data, ensure_ascii=False, allow_nan=True, default=str)
-        raw = _re.sub(r'\bNaN\b', 'null', raw)
-        raw = _re.sub(r'\b-?Infinity\b', 'null', raw)
-        from fastapi.responses import JSONResponse
-        return JSONResponse(content=_json.loads(raw))
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _job_key(session_id: str, plan: Plan) -> str:
+    return f"{session_id}:" + json.dumps({"method": plan.method, "params": plan.params}, sort_keys=True, default=str)
+
+
+def _run_job(job: Job, req: ChatRequest, snapshot: str, plan: Plan) -> dict[str, Any]:
+    db = SessionLocal()
+    try:
+        turn = ChatTurn.open(db, job.session_id)
+        turn.add_message("user", req.message)
+        job.report("analyzing", 0.2)
+        try:
+            result = analysis_executor.execute(snapshot, plan, cancel=job.cancel)
+        except Exception:
+            turn.fail()
+            raise
+        job.report("saving", 0.9)
+        return _finish_turn(turn, result)
+    finally:
+        db.close()
+
+
+def _get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.post("/chat/jobs", status_code=202)
+def submit_chat_job(req: ChatRequest, db: Session = Depends(get_db)) -> dict:
+    """Plan the turn now, run the analysis in the background; identical in-flight jobs are shared."""
+    try:
+        turn = ChatTurn.open(db, req.session_id, industry=req.industry)
+        snapshot, plan = _plan_turn(turn, req)
+        # new session / data summary are committed now; the job records the messages
+        turn.commit()
+        session_id = turn.session_id
     except KeyError:
         raise HTTPException(status_code=404, detail="会话不存在")
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("chat_failed")
-        # Match frontend interceptor: message or detail
+        logger.exception("chat_job_submit_failed")
         raise HTTPException(status_code=400, detail=str(e))
+
+    job, created = job_manager.register(_job_key(session_id, plan), session_id)
+    if created:
+        job.report("planned", 0.1)
+        job_manager.start(job, lambda j: _run_job(j, req, snapshot, plan))
+    return {**job.to_dict(), "method": plan.method, "deduplicated": not created}
+
+
+@router.get("/chat/jobs/{job_id}")
+def get_chat_job(job_id: str) -> dict:
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.get("/chat/jobs/{job_id}/result", response_model=ChatResponse)
+def get_chat_job_result(job_id: str) -> ChatResponse:
+    job = _get_job_or_404(job_id)
+    if not job.done:
+        raise HTTPException(status_code=409, detail="任务尚未完成")
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail="任务已取消")
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status or 400, detail=job.error)
+    return FastJSONResponse(content=job.result)
+
+
+@router.delete("/chat/jobs/{job_id}")
+def cancel_chat_job(job_id: str) -> dict:
+    _get_job_or_404(job_id)
+    return job_manager.cancel(job_id).to_dict()
@@ -1,23 +1,23 @@
 from __future__ import annotations
 
-import io
-import json
-import zipfile
+import os
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
 from app.schemas.api import ExportRequest, ExportResponse
-from app.services.config_store import get_model_config
-from app.services.exporter import build_docx_report, build_markdown_report
+from app.services.exporter import has_charts, write_docx_report, write_markdown_report
 from app.services.sessions import get_session_or_404
-from app.services.storage.files import resolve_export_path, save_export_bytes
+from app.services.storage.files import export_writer, resolve_export_path
 
 router = APIRouter()
 
+# exports are named per second and may be regenerated, so clients revalidate with the ETag
+_DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+
 
 def _now_tag() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
@@ -27,31 +27,26 @@ def _now_tag() -> str:
 def export_report(req: ExportRequest, request: Request, db: Session = Depends(get_db)) -> ExportResponse:
     try:
         s = get_session_or_404(db, req.session_id)
-        llm_config = get_model_config(db)
         if not s.report_conclusion:
             raise HTTPException(status_code=400, detail="请先生成分析报告结论后再导出")
 
         if req.format == "md":
-            md_text, chart_images = build_markdown_report(s, include_charts=req.include_charts, llm_config=llm_config)
-            if chart_images:
-                # Pack MD + PNG images into a zip
-                buf = io.BytesIO()
-                with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-                    zf.writestr("report.md", md_text.encode("utf-8"))
-                    for img_name, img_bytes in chart_images:
-                        zf.writestr(img_name, img_bytes)
-                content = buf.getvalue()
-                file_name = f"report-{_now_tag()}.zip"
-            else:
-                content = md_text.encode("utf-8")
-                file_name = f"report-{_now_tag()}.md"
+            stem = f"report-{_now_tag()}"
+            with export_writer(req.session_id, f"{stem}.zip") as path:
+                zipped = write_markdown_report(s, req.include_charts and has_charts(s), path)
+                if not zipped:
+                    # no chart rendered: publish the plain Markdown instead of an image-less zip
+                    with export_writer(req.session_id, f"{stem}.md") as md_path:
+                        os.replace(path, md_path)
+            file_name = f"{stem}.zip" if zipped else f"{stem}.md"
         elif req.format == "docx":
-            content = build_docx_report(s, include_charts=req.include_charts, llm_config=llm_config)
             file_name = f"report-{_now_tag()}.docx"
+            with export_writer(req.session_id, file_name) as path:
+                write_docx_report(s, req.include_charts, path)
         else:
             raise ValueError("Unsupported export format")
 
-        saved_name, _ = save_export_bytes(req.session_id, file_name, content)
+        saved_name = resolve_export_path(req.session_id, file_name).name
         download_url = str(request.base_url).rstrip("/") + f"/api/v2/download/{req.session_id}/{saved_name}"
         return ExportResponse(download_url=download_url, file_name=saved_name)
     except KeyError:
@@ -60,13 +55,34 @@ def export_report(req: ExportRequest, request: Request, db: Session = Depends(ge
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/download/{session_id}/{file_name}")
-def download(session_id: str, file_name: str, db: Session = Depends(get_db)) -> FileResponse:
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@router.api_route("/download/{session_id}/{file_name}", methods=["GET", "HEAD"])
+def download(session_id: str, file_name: str, request: Request, db: Session = Depends(get_db)) -> Response:
+    """
+    Serve an export file. FileResponse answers Range / If-Range requests with 206 partial
+    content against its ETag, so interrupted downloads can resume; If-None-Match gets a 304.
+    """
     try:
         _ = get_session_or_404(db, session_id)
         path = resolve_export_path(session_id, file_name)
-        if not path.exists():
+        # exports still being written are dot-prefixed temp files
+        if path.name.startswith(".") or not path.is_file():
             raise HTTPException(status_code=404, detail="文件不存在")
-        return FileResponse(path=str(path), filename=path.name)
+        response = FileResponse(
+            path=str(path),
+            filename=path.name,
+            stat_result=path.stat(),
+            headers={"Cache-Control": _DOWNLOAD_CACHE_CONTROL},
+        )
+        etag = response.headers["etag"]
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _DOWNLOAD_CACHE_CONTROL})
+        return response
     except KeyError:
         raise HTTPException(status_code=404, detail="会话不存在")
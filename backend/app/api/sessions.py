@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from app.core.serialization import dumps
 from app.db.session import get_db
-from app.schemas.session import SessionDetail, SessionsResponse
+from app.schemas.session import MessageVisualizations, SessionDetail, SessionsResponse
 from app.services.sessions import (
+    InvalidCursor,
     get_session_or_404,
+    iter_message_visualizations,
     list_sessions,
     serialize_session_detail,
     serialize_session,
@@ -25,30 +29,68 @@ def get_sessions(
     method: str | None = None,
     start_date: str | None = None,
     end_date: str | None = None,
+    cursor: str | None = None,
+    with_total: bool = True,
     db: Session = Depends(get_db),
 ) -> SessionsResponse:
-    total, items = list_sessions(
-        db,
-        page=page,
-        size=size,
-        keyword=keyword,
-        industry=industry,
-        method=method,
-        start_date=start_date,
-        end_date=end_date,
+    try:
+        total, items, next_cursor = list_sessions(
+            db,
+            page=page,
+            size=size,
+            keyword=keyword,
+            industry=industry,
+            method=method,
+            start_date=start_date,
+            end_date=end_date,
+            cursor=cursor,
+            with_total=with_total,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SessionsResponse(
+        total=total, page=page, items=[serialize_session(s) for s in items], next_cursor=next_cursor  # type: ignore[arg-type]
     )
-    return SessionsResponse(total=total, page=page, items=[serialize_session(s) for s in items])  # type: ignore[arg-type]
 
 
 @router.get("/session/{session_id}", response_model=SessionDetail)
-def get_session_detail(session_id: str, db: Session = Depends(get_db)) -> SessionDetail:
+def get_session_detail(
+    session_id: str,
+    page: int = Query(default=1, ge=1),
+    size: int = Query(default=100, ge=1, le=500),
+    db: Session = Depends(get_db),
+) -> SessionDetail:
     try:
         s = get_session_or_404(db, session_id)
-        return SessionDetail(**serialize_session_detail(s))  # type: ignore[arg-type]
+        return SessionDetail(**serialize_session_detail(db, s, page=page, size=size))  # type: ignore[arg-type]
     except KeyError:
         raise HTTPException(status_code=404, detail="会话不存在")
 
 
+@router.get(
+    "/session/{session_id}/messages/{message_id}/visualizations",
+    response_class=StreamingResponse,
+    responses={200: {"model": MessageVisualizations}},
+)
+def get_visualizations(session_id: str, message_id: str, db: Session = Depends(get_db)) -> StreamingResponse:
+    try:
+        get_session_or_404(db, session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    try:
+        chunks = iter_message_visualizations(db, session_id, message_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="消息不存在")
+
+    def body():
+        # {"message_id": ..., "visualizations": <blob>} without decoding the blob
+        yield dumps({"message_id": message_id})[:-1] + b',"visualizations":'
+        yield from chunks
+        yield b"}"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
 @router.delete("/session/{session_id}", response_class=Response, status_code=204)
 def delete_session(session_id: str, db: Session = Depends(get_db)) -> Response:
     try:
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_PREFIX = "hts"
+
+# (stage, seconds) pairs for the current request; None outside a request
+_request_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_timings", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+
+class StageMetrics:
+    """Process-wide latency histograms keyed by (stage, labels), rendered as Prometheus text."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, tuple[tuple[str, str], ...]], _Histogram] = {}
+
+    def observe(self, stage: str, seconds: float, **labels: Any) -> None:
+        key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            for i, bound in enumerate(_BUCKETS):
+                if seconds <= bound:
+                    hist.counts[i] += 1
+            hist.total += seconds
+            hist.count += 1
+
+    def render(self) -> list[str]:
+        name = f"{_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} histogram"]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshot = [(key, list(h.counts), h.total, h.count) for key, h in items]
+        for (stage, labels), counts, total, count in snapshot:
+            base = [("stage", stage), *labels]
+            for bound, n in zip(_BUCKETS, counts):
+                lines.append(f"{name}_bucket{{{_labels([*base, ('le', repr(bound))])}}} {n}")
+            lines.append(f"{name}_bucket{{{_labels([*base, ('le', '+Inf')])}}} {count}")
+            lines.append(f"{name}_sum{{{_labels(base)}}} {total:.6f}")
+            lines.append(f"{name}_count{{{_labels(base)}}} {count}")
+        return lines
+
+
+def _labels(pairs: list[tuple[str, str]]) -> str:
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped))
+
+
+stage_metrics = StageMetrics()
+
+
+def record(stage: str, seconds: float, **labels: Any) -> None:
+    """Feed the histogram and, inside a request, the Server-Timing header."""
+    stage_metrics.observe(stage, seconds, **labels)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str, **labels: Any) -> Iterator[None]:
+    """Time a block; also usable as a decorator (`@timed("load_dataframe")`)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started, **labels)
+
+
+def server_timing(timings: list[tuple[str, float]], total_s: float) -> str:
+    merged: dict[str, list[float]] = {}
+    for stage, seconds in timings:
+        merged.setdefault(stage, []).append(seconds)
+    parts = []
+    for stage, values in merged.items():
+        desc = f';desc="x{len(values)}"' if len(values) > 1 else ""
+        parts.append(f"{stage};dur={sum(values) * 1000:.1f}{desc}")
+    parts.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware: collects the stage timings recorded while a request is handled
+    and attaches them as a Server-Timing header. Streamed responses only carry the stages
+    that finished before the headers went out; the histograms still get everything.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: list[tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
+
+def render_gauges(groups: dict[str, dict[str, Any]]) -> list[str]:
+    """Flatten {subsystem: {name: number}} stats dicts into Prometheus gauge lines."""
+    lines = []
+    for group, values in groups.items():
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{_PREFIX}_{group}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return lines
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import orjson
+from fastapi.responses import JSONResponse
+
+from app.core.metrics import timed
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    # orjson already maps NaN/Infinity to null and handles contiguous numeric arrays natively;
+    # this only sees the leftovers (numpy scalars it doesn't know, object/strided arrays, sets).
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Single-pass JSON encoding: UTF-8, numpy-aware, non-finite floats become null."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`; NaN/Infinity become null instead of raising."""
+
+    def render(self, content: Any) -> bytes:
+        with timed("encode"):
+            return dumps(content)
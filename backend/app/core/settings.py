@@ -11,7 +11,17 @@ class Settings(BaseSettings):
     app_port: int = 8001
 
     database_url: str = "sqlite:///./app.db"
+    # "wal": WAL journal, synchronous=NORMAL, mmap/cache pragmas and a sized pool for file-backed
+    # SQLite; "default" keeps SQLite's rollback journal and SQLAlchemy's stock pool
+    db_profile: str = "wal"
+    db_busy_timeout_ms: int = 5000
+    db_mmap_size_mb: int = 256
+    db_cache_size_mb: int = 64
+    db_pool_size: int = 8
+    db_max_overflow: int = 16
     data_dir: str = "./data"
+    # gzip level for chart payloads in the content-addressed blob store (data_dir/blobs)
+    blob_compress_level: int = 6
 
     cors_origins: str = "http://localhost:5173,http://localhost:5174,http://localhost:3000"
 
@@ -23,10 +33,78 @@ class Settings(BaseSettings):
     default_model_base_url: str = "https://open.bigmodel.cn/api/paas/v4"
     default_model_name: str = "GLM-4.7"
 
+    # analysis worker processes (0 = run inline in the request thread)
+    analysis_workers: int = 2
+    analysis_timeout_s: float = 120.0
+    # per-method overrides, e.g. "kruskal=30,linear_regression=60"
+    analysis_method_timeouts: str = ""
+    analysis_start_method: str = "spawn"
+
+    # report charts are rendered in their own process pool (pyplot is not thread-safe); 0 = inline
+    chart_render_workers: int = 2
+    chart_render_timeout_s: float = 20.0
+    # rendered PNGs are cached in data_dir/chart_cache by content hash (LRU-evicted past the bound)
+    chart_cache_enabled: bool = True
+    chart_cache_max_mb: int = 256
+
+    # background analysis jobs (/api/v2/chat/jobs)
+    job_workers: int = 4
+    job_retention_s: float = 3600.0
+
+    # outbound LLM calls (shared keep-alive pool; HTTP/2 needs the optional h2 package)
+    llm_max_concurrency: int = 8
+    llm_max_connections: int = 20
+    llm_keepalive_expiry_s: float = 60.0
+    llm_connect_timeout_s: float = 10.0
+    llm_read_timeout_s: float = 120.0
+    llm_max_retries: int = 3
+    llm_retry_backoff_s: float = 0.5
+    llm_http2: bool = True
+
+    # persistent LLM response cache (bypassed for temperature > 0 unless allow_sampling)
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_s: float = 7 * 24 * 3600.0
+    llm_cache_max_entries: int = 5000
+    llm_cache_allow_sampling: bool = False
+
+    # intent/plan calls run at llm_planning_temperature, overriding the temperature saved in
+    # the model config (which still applies to report conclusions), so planning is
+    # deterministic and served from the cache; set llm_planning_use_model_temperature to
+    # plan with the configured temperature instead
+    llm_planning_temperature: float = 0.0
+    llm_planning_use_model_temperature: bool = False
+
+    # app_config is cached in memory; other workers' writes are picked up within this interval
+    config_cache_check_s: float = 2.0
+
+    # history list totals are cached per filter set for this long (0 = count on every request)
+    sessions_total_cache_s: float = 10.0
+
+    # background reaper: soft-deleted sessions (rows, uploads, exports) and unreferenced chart
+    # blobs are removed once older than the grace period; freed DB pages are vacuumed in slices
+    reaper_enabled: bool = True
+    reaper_grace_s: float = 7 * 24 * 3600.0
+    reaper_interval_s: float = 3600.0
+    reaper_batch_size: int = 100
+    reaper_vacuum_pages: int = 2000
+
+    # chat planning: the heuristic plan is used if the LLM has not answered within the budget
+    llm_plan_budget_s: float = 4.0
+    llm_merged_planning: bool = True
+
     @property
     def cors_origin_list(self) -> list[str]:
         return [o.strip() for o in self.cors_origins.split(",") if o.strip()]
 
+    @property
+    def analysis_method_timeout_map(self) -> dict[str, float]:
+        out: dict[str, float] = {}
+        for item in self.analysis_method_timeouts.split(","):
+            method, _, value = item.partition("=")
+            if method.strip() and value.strip():
+                out[method.strip()] = float(value)
+        return out
+
 
 settings = Settings()
 
@@ -1,17 +1,37 @@
 from __future__ import annotations
 
-from sqlalchemy import text
+from pathlib import Path
 
-from app.db.models import Base
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.models import ConfigVersionModel
+from app.db.search import install_search_index
 from app.db.session import engine
 
+_ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def alembic_config(connection: Connection | None = None) -> Config:
+    cfg = Config(str(_ALEMBIC_INI))
+    cfg.attributes["configure_logger"] = False  # keep the app's logging setup
+    if connection is not None:
+        cfg.attributes["connection"] = connection
+    return cfg
+
 
-def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
-    if engine.dialect.name == "sqlite":
-        with engine.connect() as conn:
-            cols = conn.execute(text("PRAGMA table_info(sessions)")).fetchall()
-            col_names = {row[1] for row in cols}
-            if "report_conclusion" not in col_names:
-                conn.execute(text("ALTER TABLE sessions ADD COLUMN report_conclusion TEXT"))
-                conn.commit()
+def init_db(bind: Engine | None = None) -> None:
+    """
+    Upgrade the schema to the latest Alembic revision. Databases created before Alembic
+    (no alembic_version table) are adopted by the idempotent baseline revision.
+    """
+    bind = bind if bind is not None else engine
+    with bind.begin() as conn:
+        command.upgrade(alembic_config(conn), "head")
+    with bind.begin() as conn:
+        if conn.execute(select(ConfigVersionModel.id)).first() is None:
+            conn.execute(insert(ConfigVersionModel).values(id=1, version=0))
+    # SQLite-only FTS5 tables/triggers; created at runtime because FTS5 may not be compiled in
+    install_search_index(bind)
@@ -4,7 +4,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -18,6 +18,12 @@ class Base(DeclarativeBase):
 
 class SessionModel(Base):
     __tablename__ = "sessions"
+    # keyset pagination of the history list (see alembic revision 0002)
+    __table_args__ = (
+        Index("ix_sessions_live_updated", "deleted_at", "updated_at", "session_id"),
+        Index("ix_sessions_industry_updated", "industry", "deleted_at", "updated_at", "session_id"),
+        Index("ix_sessions_created_at", "created_at"),
+    )
 
     session_id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
@@ -51,13 +57,48 @@ class MessageModel(Base):
     content: Mapped[str] = mapped_column(Text)
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
     analysis: Mapped[dict[str, Any] | None] = mapped_column(JSON, nullable=True)
+    # analysis["visualizations"] lives in the blob store (app.services.storage.blobs)
+    visualizations_ref: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    visualization_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     session: Mapped[SessionModel] = relationship(back_populates="messages")
 
 
+class SessionMethodModel(Base):
+    """Normalized copy of sessions.methods_used so the history filter is an index lookup."""
+
+    __tablename__ = "session_methods"
+    __table_args__ = (Index("ix_session_methods_method_session", "method", "session_id"),)
+
+    session_id: Mapped[str] = mapped_column(String(36), ForeignKey("sessions.session_id", ondelete="CASCADE"), primary_key=True)
+    method: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+
 class AppConfigModel(Base):
     __tablename__ = "app_config"
 
     key: Mapped[str] = mapped_column(String(64), primary_key=True)
     value: Mapped[dict[str, Any]] = mapped_column(JSON)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+
+class ConfigVersionModel(Base):
+    """Single-row counter bumped on every app_config write; workers poll it to drop stale caches."""
+
+    __tablename__ = "config_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class LLMCacheModel(Base):
+    __tablename__ = "llm_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    provider: Mapped[str] = mapped_column(String(32))
+    model: Mapped[str] = mapped_column(String(128))
+    response: Mapped[str] = mapped_column(Text)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
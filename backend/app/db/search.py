@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Trigram FTS5 indexes (SQLite >= 3.34): substring matching that also works for Chinese text,
+# which has no word boundaries for the default tokenizer. Both are external-content tables
+# kept in sync by triggers, so every code path that writes sessions/messages is covered.
+_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5("
+    "file_name, first_query, content='sessions', content_rowid='rowid', tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='rowid', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS sessions_fts_ai AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts(rowid, file_name, first_query) VALUES (new.rowid, new.file_name, new.first_query);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS sessions_fts_ad AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_fts(sessions_fts, rowid, file_name, first_query)
+        VALUES ('delete', old.rowid, old.file_name, old.first_query);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS sessions_fts_au AFTER UPDATE OF file_name, first_query ON sessions BEGIN
+        INSERT INTO sessions_fts(sessions_fts, rowid, file_name, first_query)
+        VALUES ('delete', old.rowid, old.file_name, old.first_query);
+        INSERT INTO sessions_fts(rowid, file_name, first_query) VALUES (new.rowid, new.file_name, new.first_query);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    END""",
+]
+
+# Keywords shorter than a trigram (most Chinese search terms are two characters) use a
+# second, contentless pair of indexes over the same fields. Their terms come from the
+# search_grams() SQL function, registered on every connection by build_engine.
+_GRAMS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sessions_grams USING fts5(grams, content='', tokenize='unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_grams USING fts5(grams, content='', tokenize='unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS sessions_grams_ai AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_grams(rowid, grams) VALUES (new.rowid, search_grams(new.file_name, new.first_query));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS sessions_grams_ad AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_grams(sessions_grams, rowid, grams)
+        VALUES ('delete', old.rowid, search_grams(old.file_name, old.first_query));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS sessions_grams_au AFTER UPDATE OF file_name, first_query ON sessions BEGIN
+        INSERT INTO sessions_grams(sessions_grams, rowid, grams)
+        VALUES ('delete', old.rowid, search_grams(old.file_name, old.first_query));
+        INSERT INTO sessions_grams(rowid, grams) VALUES (new.rowid, search_grams(new.file_name, new.first_query));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_grams_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_grams(rowid, grams) VALUES (new.rowid, search_grams(new.content));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_grams_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_grams(messages_grams, rowid, grams) VALUES ('delete', old.rowid, search_grams(old.content));
+    END""",
+]
+
+_GRAMS_BACKFILL = [
+    "INSERT INTO sessions_grams(rowid, grams) SELECT rowid, search_grams(file_name, first_query) FROM sessions",
+    "INSERT INTO messages_grams(rowid, grams) SELECT rowid, search_grams(content) FROM messages",
+]
+
+# trigram tokens: shorter keywords go to the *_grams indexes instead
+FTS_MIN_KEYWORD = 3
+
+_fts_enabled = False
+
+
+def fts_enabled() -> bool:
+    return _fts_enabled
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": name}).first() is not None
+
+
+def search_grams(*fields: str | None) -> str:
+    """
+    Index terms for keywords of one or two characters: every case-folded character pair of
+    each field plus its last character. Terms are hex-encoded UTF-8, so unicode61 keeps each
+    one as a single token whatever it contains; since UTF-8 is prefix-free, a one-character
+    keyword is a prefix query that only matches at character boundaries. The output is
+    deterministic, which the contentless tables' 'delete' commands rely on.
+    """
+    grams: set[str] = set()
+    for value in fields:
+        if not value:
+            continue
+        folded = value.casefold()
+        grams.update(folded[i:i + 2] for i in range(len(folded) - 1))
+        grams.add(folded[-1])
+    return " ".join(sorted(g.encode("utf-8").hex() for g in grams))
+
+
+def register_search_functions(dbapi_conn, _record=None) -> None:
+    """Connect hook: the *_grams triggers call search_grams() on every write."""
+    dbapi_conn.create_function("search_grams", -1, search_grams, deterministic=True)
+
+
+def gram_query(keyword: str) -> str | None:
+    """MATCH expression against the *_grams indexes, or None if the keyword is too long for them."""
+    folded = keyword.casefold()
+    if not folded or len(folded) >= FTS_MIN_KEYWORD:
+        return None
+    term = f'"{folded.encode("utf-8").hex()}"'
+    return term + "*" if len(folded) == 1 else term
+
+
+def _backfill(conn: Connection) -> None:
+    conn.execute(text("INSERT INTO sessions_fts(sessions_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO sessions_grams(sessions_grams) VALUES ('delete-all')"))
+    conn.execute(text("INSERT INTO messages_grams(messages_grams) VALUES ('delete-all')"))
+    for stmt in _GRAMS_BACKFILL:
+        conn.execute(text(stmt))
+
+
+def install_search_index(engine: Engine) -> bool:
+    """Create the FTS5 tables/triggers (backfilling existing rows once); False if unavailable."""
+    global _fts_enabled
+    if engine.dialect.name != "sqlite":
+        _fts_enabled = False
+        return False
+    try:
+        with engine.begin() as conn:
+            fresh = not _table_exists(conn, "sessions_fts") or not _table_exists(conn, "sessions_grams")
+            for ddl in _FTS_DDL + _GRAMS_DDL:
+                conn.execute(text(ddl))
+            if fresh:
+                _backfill(conn)
+    except Exception:
+        logger.warning("fts5_unavailable: history search falls back to LIKE", exc_info=True)
+        _fts_enabled = False
+        return False
+    _fts_enabled = True
+    return True
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    """
+    Re-index every row. Needed after a full VACUUM, which may renumber the rowids the
+    indexes point at (sessions and messages have no INTEGER PRIMARY KEY).
+    """
+    if engine.dialect.name != "sqlite" or not _fts_enabled:
+        return
+    with engine.begin() as conn:
+        _backfill(conn)
+
+
+def fts_phrase(keyword: str) -> str:
+    """Quote a user keyword as a single FTS5 phrase (no query syntax passes through)."""
+    return '"' + keyword.replace('"', '""') + '"'
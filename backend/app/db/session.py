@@ -2,14 +2,70 @@ from __future__ import annotations
 
 from collections.abc import Generator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
+from app.core.serialization import dumps_str
 from app.core.settings import settings
+from app.db.search import register_search_functions
 
 
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, future=True, connect_args=connect_args)
+def _is_memory_sqlite(url: str) -> bool:
+    return url in {"sqlite://", "sqlite:///:memory:"} or "mode=memory" in url
+
+
+def _apply_sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA busy_timeout={int(settings.db_busy_timeout_ms)}")
+        # only takes effect on a new (or VACUUMed) file; lets the reaper use incremental_vacuum
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # readers no longer block the writer (and vice versa); NORMAL is durable in WAL
+        # except for the last transactions before a power loss, never corrupting
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA mmap_size={int(settings.db_mmap_size_mb) * 1024 * 1024}")
+        cur.execute(f"PRAGMA cache_size=-{int(settings.db_cache_size_mb) * 1024}")  # negative: KiB
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+
+def build_engine(url: str, *, profile: str | None = None) -> Engine:
+    """Create the engine for `url` using the given (or configured) database profile."""
+    profile = (profile or settings.db_profile).lower()
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            future=True,
+            json_serializer=dumps_str,
+            pool_pre_ping=True,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+        )
+
+    connect_args = {"check_same_thread": False}
+    if profile != "wal" or _is_memory_sqlite(url):
+        eng = create_engine(url, future=True, connect_args=connect_args, json_serializer=dumps_str)
+        event.listen(eng, "connect", register_search_functions)
+        return eng
+
+    connect_args["timeout"] = settings.db_busy_timeout_ms / 1000
+    eng = create_engine(
+        url,
+        future=True,
+        connect_args=connect_args,
+        json_serializer=dumps_str,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+    event.listen(eng, "connect", _apply_sqlite_pragmas)
+    event.listen(eng, "connect", register_search_functions)
+    return eng
+
+
+engine = build_engine(settings.database_url)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
@@ -20,4 +76,3 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
-
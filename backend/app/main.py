@@ -1,47 +1,25 @@
 from __future__ import annotations
 
-import json
-import math
-from typing import Any
-
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 
 from app.api.routes import api_router
 from app.core.errors import unhandled_exception_handler
 from app.core.logging import configure_logging
+from app.core.metrics import ServerTimingMiddleware, render_gauges, stage_metrics
+from app.core.serialization import FastJSONResponse
 from app.core.settings import settings
 from app.db.init_db import init_db
+from app.db.session import engine
+from app.services.charts import chart_cache, chart_renderer
+from app.services.executor import analysis_executor
+from app.services.jobs import job_manager
+from app.services.llm.client import llm_pool
+from app.services.reaper import session_reaper
 from app.services.storage.paths import ensure_data_dirs
 
 
-def _sanitize_nan(obj: Any) -> Any:
-    """Replace NaN/Inf floats with None recursively."""
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    if isinstance(obj, dict):
-        return {k: _sanitize_nan(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple)):
-        return [_sanitize_nan(v) for v in obj]
-    return obj
-
-
-class NaNSafeJSONResponse(JSONResponse):
-    """JSONResponse that converts NaN/Infinity to null instead of raising."""
-
-    def render(self, content: Any) -> bytes:
-        return json.dumps(
-            _sanitize_nan(content),
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
-
-
 def create_app() -> FastAPI:
     configure_logging()
     init_db()
@@ -50,7 +28,7 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="Hypothesis Testing Service",
         version="2.0",
-        default_response_class=NaNSafeJSONResponse,
+        default_response_class=FastJSONResponse,
     )
     app.add_exception_handler(Exception, unhandled_exception_handler)
 
@@ -61,11 +39,47 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(ServerTimingMiddleware)
     app.include_router(api_router)
 
+    @app.on_event("startup")
+    def start_executor() -> None:
+        analysis_executor.start()
+        chart_renderer.start()
+        if settings.reaper_enabled:
+            session_reaper.start()
+
+    @app.on_event("shutdown")
+    def shutdown_pools() -> None:
+        session_reaper.stop()
+        analysis_executor.shutdown()
+        chart_renderer.shutdown()
+        llm_pool.close()
+        # closing the last connection checkpoints the SQLite WAL back into the main file
+        engine.dispose()
+
     @app.get("/health")
     def health() -> dict:
-        return {"status": "ok"}
+        return {"status": "ok", "executor": analysis_executor.stats(), "llm": llm_pool.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics() -> str:
+        """Prometheus text exposition: stage latency histograms plus pool/cache gauges."""
+        llm = llm_pool.stats()
+        cache = llm.pop("cache") or {}
+        lookups = cache.get("hits", 0) + cache.get("misses", 0)
+        cache["hit_ratio"] = cache.get("hits", 0) / lookups if lookups else 0.0
+        lines = stage_metrics.render()
+        lines += render_gauges({
+            "executor": analysis_executor.stats(),
+            "llm": llm,
+            "llm_cache": cache,
+            "jobs": job_manager.stats(),
+            "reaper": session_reaper.stats(),
+            "charts": chart_renderer.stats(),
+            "chart_cache": chart_cache.stats(),
+        })
+        return "\n".join(lines) + "\n"
 
     return app
 
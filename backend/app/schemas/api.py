@@ -45,6 +45,28 @@ class ChatResponse(BaseModel):
     visualizations: list[ChartConfig] = Field(default_factory=list)
 
 
+class ChatBatchRequest(BaseModel):
+    session_id: str
+    # free-text questions or explicit intents ({"task", "x", "y", ...}, as sent by the variable picker)
+    messages: list[str | dict] = Field(..., min_length=1, max_length=50)
+
+
+class ChatBatchItem(BaseModel):
+    index: int
+    message: str
+    status: int
+    reply: str | None = None
+    analysis: AnalysisResult | None = None
+    suggestions: list[str] = Field(default_factory=list)
+    visualizations: list[ChartConfig] = Field(default_factory=list)
+    error: str | None = None
+
+
+class ChatBatchResponse(BaseModel):
+    session_id: str
+    results: list[ChatBatchItem]
+
+
 class UploadResponse(BaseModel):
     session_id: str
     file_name: str
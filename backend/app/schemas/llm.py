@@ -15,7 +15,14 @@ class IntentOut(BaseModel):
 class PlanOut(BaseModel):
     method: str = Field(
         ...,
-        pattern="^(auto|linear_regression|pearson|spearman|t_test|mann_whitney_u|anova|kruskal|chi_square|auto_group_diff|spc)$",
+        pattern="^(auto|linear_regression|pearson|spearman|t_test|mann_whitney_u|anova|kruskal|chi_square|auto_group_diff|spc|spc_stratified|capability_batch|capability_rolling)$",
     )
     params: dict = Field(default_factory=dict)
 
+
+
+class IntentPlanOut(BaseModel):
+    """Merged intent + plan answer (single LLM round-trip)."""
+
+    intent: IntentOut
+    plan: PlanOut
@@ -30,9 +30,10 @@ class Session(BaseModel):
 
 
 class SessionsResponse(BaseModel):
-    total: int
+    total: int | None
     page: int
     items: list[Session]
+    next_cursor: str | None = None
 
 
 class SessionsQuery(BaseModel):
@@ -43,6 +44,7 @@ class SessionsQuery(BaseModel):
     method: str | None = None
     start_date: str | None = None
     end_date: str | None = None
+    cursor: str | None = None
 
 
 class Message(BaseModel):
@@ -51,9 +53,17 @@ class Message(BaseModel):
     content: str
     timestamp: str
     analysis: dict | None = None
+    visualization_count: int = 0
 
 
 class SessionDetail(Session):
     messages: list[Message]
+    messages_total: int = 0
+    messages_page: int = 1
     data_summary: DataSummary | None = None
     report_conclusion: str | None = None
+
+
+class MessageVisualizations(BaseModel):
+    message_id: str
+    visualizations: list[dict] = Field(default_factory=list)
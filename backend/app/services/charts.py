@@ -0,0 +1,562 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+import warnings
+from collections.abc import Iterator
+from multiprocessing.connection import wait as wait_connections
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from app.core.metrics import record, timed
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHART_DPI = 150
+# part of the chart cache key: bump whenever render_chart_png's output changes
+RENDERER_VERSION = "1"
+_PENDING = object()
+_ZH_FONTS = ("Microsoft YaHei", "SimHei", "WenQuanYi Micro Hei", "Noto Sans CJK SC", "Arial Unicode MS")
+
+_plt: Any = None
+_setup_lock = threading.Lock()
+
+
+def setup_fonts() -> Any:
+    """
+    Select the Agg backend and a CJK-capable sans-serif font, once per process, and return
+    pyplot. Fonts are looked up by family name in matplotlib's font list; findfont with
+    fallback_to_default=False raises for a missing family, which used to abort every render.
+    """
+    global _plt
+    if _plt is not None:
+        return _plt
+    with _setup_lock:
+        if _plt is None:
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.font_manager as fm
+            import matplotlib.pyplot as plt
+
+            installed = {f.name for f in fm.fontManager.ttflist}
+            found = next((name for name in _ZH_FONTS if name in installed), None)
+            if found:
+                plt.rcParams["font.sans-serif"] = [found, *plt.rcParams.get("font.sans-serif", [])]
+            else:
+                logger.warning("chart_font_missing: no CJK font installed, Chinese labels will not render")
+                warnings.filterwarnings("ignore", message="Glyph .* missing from", category=UserWarning)
+            plt.rcParams["axes.unicode_minus"] = False
+            _plt = plt
+    return _plt
+
+
+def chart_title(title: str | None, fallback: str) -> str:
+    if title and str(title).strip():
+        return str(title).strip()
+    return fallback
+
+
+def control_chart_series(data: dict[str, Any]) -> tuple[list, list, list[tuple[Any, Any, list[int]]], int]:
+    """
+    Normalize a control-chart payload to (xs, ys, anomalies, n).
+
+    Accepts the columnar format (``y`` array, sparse ``anomalies`` index list and
+    ``rules`` map) as well as the legacy per-point dicts stored by older sessions.
+    anomalies is a list of (x, y, rule_ids); n is the full series length.
+    """
+    if data.get("format") == "columnar":
+        ys = list(data.get("y") or [])
+        xs = list(data.get("x") or range(1, len(ys) + 1))
+        y_at = dict(zip(xs, ys))
+        rules = data.get("rules") or {}
+        anomalies = [(a, y_at.get(a), list(rules.get(str(a), []))) for a in data.get("anomalies") or []]
+        return xs, ys, anomalies, int(data.get("n") or len(ys))
+
+    points = data.get("points", [])
+    xs = [p.get("x", i) for i, p in enumerate(points)]
+    ys = [p.get("y", 0) for p in points]
+    anomalies = [
+        (p.get("x", i), p.get("y", 0), list(p.get("rule_violated") or []))
+        for i, p in enumerate(points)
+        if p.get("is_anomaly")
+    ]
+    return xs, ys, anomalies, len(points)
+
+
+def render_chart_png(config: dict[str, Any], dpi: int = CHART_DPI) -> bytes | None:
+    """Render one chart config to PNG bytes; None if the payload cannot be drawn."""
+    plt = setup_fonts()
+
+    chart_type = config.get("type")
+    title = chart_title(config.get("title"), "Chart")
+    data = config.get("data") or {}
+
+    fig, ax = plt.subplots(figsize=(6, 3.5))
+    ax.set_title(title)
+
+    def _maybe_sample(points: list[list[float]], max_n: int = 4000) -> list[list[float]]:
+        if len(points) <= max_n:
+            return points
+        step = max(1, len(points) // max_n)
+        return points[::step]
+
+    try:
+        if chart_type in {"scatter", "residual"}:
+            points = data.get("points", [])
+            points = _maybe_sample(points)
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            ax.scatter(xs, ys, s=12, alpha=0.7)
+            if config.get("xLabel"):
+                ax.set_xlabel(str(config.get("xLabel")))
+            if config.get("yLabel"):
+                ax.set_ylabel(str(config.get("yLabel")))
+
+        elif chart_type == "box":
+            groups = data.get("groups", [])
+            values = data.get("values", [])
+            if groups and values:
+                ax.boxplot(values, labels=[str(g) for g in groups], showfliers=False)
+                if config.get("xLabel"):
+                    ax.set_xlabel(str(config.get("xLabel")))
+                if config.get("yLabel"):
+                    ax.set_ylabel(str(config.get("yLabel")))
+
+        elif chart_type == "bar":
+            table = data.get("table")
+            if table and isinstance(table, dict):
+                series_names = list(table.keys())
+                row_set = set()
+                for col in series_names:
+                    rows = table.get(col, {}) or {}
+                    row_set.update(rows.keys())
+                categories = list(row_set)
+                bottoms = [0] * len(categories)
+                for col in series_names:
+                    vals = [int((table.get(col, {}) or {}).get(r, 0)) for r in categories]
+                    ax.bar(categories, vals, bottom=bottoms, label=str(col))
+                    bottoms = [b + v for b, v in zip(bottoms, vals)]
+                ax.legend(fontsize=7)
+            else:
+                categories = data.get("categories", [])
+                values = data.get("values", [])
+                ax.bar(categories, values)
+            if config.get("xLabel"):
+                ax.set_xlabel(str(config.get("xLabel")))
+            if config.get("yLabel"):
+                ax.set_ylabel(str(config.get("yLabel")))
+
+        elif chart_type == "distribution":
+            bins = data.get("bins", [])
+            counts = data.get("counts", [])
+            if bins and counts:
+                labels = [f"{b[0]}-{b[1]}" if isinstance(b, list) else str(b) for b in bins]
+                ax.bar(labels, counts)
+                ax.tick_params(axis="x", labelrotation=45)
+            if config.get("xLabel"):
+                ax.set_xlabel(str(config.get("xLabel")))
+            if config.get("yLabel"):
+                ax.set_ylabel(str(config.get("yLabel")))
+
+        elif chart_type == "control_chart":
+            ucl = data.get("ucl")
+            cl = data.get("cl")
+            lcl = data.get("lcl")
+            chart_subtype = data.get("chart_type", "")
+
+            xs, ys, anomalies, _n = control_chart_series(data)
+
+            # Normal points line
+            ax.plot(xs, ys, marker="o", markersize=4, linewidth=1, color="#3498db", label="数据", zorder=2)
+
+            # Anomaly points
+            anom_xs = [a[0] for a in anomalies if a[1] is not None]
+            anom_ys = [a[1] for a in anomalies if a[1] is not None]
+            if anom_xs:
+                ax.scatter(anom_xs, anom_ys, color="#e74c3c", s=50, zorder=3, label="异常点")
+
+            # CUSUM lower statistic (-C⁻)
+            lower = data.get("lower_series")
+            if lower and len(lower) == len(xs):
+                ax.plot(xs, lower, marker="o", markersize=3, linewidth=1, color="#9b59b6", label="C⁻", zorder=2)
+
+            # Control limits; EWMA limits widen over a warm-up segment before reaching ucl/lcl
+            ucl_series = data.get("ucl_series") or []
+            lcl_series = data.get("lcl_series") or []
+            x_end = xs[-1] if xs else len(ucl_series)
+            if ucl is not None and ucl_series:
+                ax.plot(list(range(1, len(ucl_series) + 1)) + [x_end], list(ucl_series) + [ucl], color="#e74c3c", linestyle="--", linewidth=1.2, label=f"UCL={ucl:.2f}")
+            elif ucl is not None:
+                ax.axhline(y=ucl, color="#e74c3c", linestyle="--", linewidth=1.2, label=f"UCL={ucl:.2f}")
+            if cl is not None:
+                ax.axhline(y=cl, color="#2ecc71", linestyle="-", linewidth=1.5, label=f"CL={cl:.2f}")
+            if lcl is not None and lcl_series:
+                ax.plot(list(range(1, len(lcl_series) + 1)) + [x_end], list(lcl_series) + [lcl], color="#e74c3c", linestyle="--", linewidth=1.2, label=f"LCL={lcl:.2f}")
+            elif lcl is not None:
+                ax.axhline(y=lcl, color="#e74c3c", linestyle="--", linewidth=1.2, label=f"LCL={lcl:.2f}")
+
+            ax.set_xlabel("样本序号")
+            ax.set_ylabel(chart_subtype or "值")
+            ax.legend(fontsize=7, loc="upper right")
+
+        elif chart_type == "line":
+            xs = data.get("x") or []
+            for name, ys in (data.get("series") or {}).items():
+                if len(ys) == len(xs):
+                    ax.plot(xs, [float("nan") if v is None else v for v in ys], linewidth=1.2, label=str(name))
+            for name, level in (data.get("reference") or {}).items():
+                ax.axhline(y=level, color="#7f8c8d", linestyle="--", linewidth=1, label=str(name))
+            if config.get("xLabel"):
+                ax.set_xlabel(str(config.get("xLabel")))
+            if config.get("yLabel"):
+                ax.set_ylabel(str(config.get("yLabel")))
+            ax.legend(fontsize=7, loc="upper right")
+
+        else:
+            ax.text(0.5, 0.5, f"Unsupported chart type: {chart_type}", ha="center", va="center")
+    except Exception:
+        plt.close(fig)
+        return None
+
+    buf = io.BytesIO()
+    fig.tight_layout()
+    fig.savefig(buf, format="png", dpi=dpi)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def _render_timed(config: dict[str, Any], dpi: int) -> tuple[bytes | None, float]:
+    started = time.perf_counter()
+    return render_chart_png(config, dpi), time.perf_counter() - started
+
+
+def _chart_worker_main(conn: Any) -> None:
+    """Worker loop: fonts once, then receive (config, dpi) and send back (png | None, seconds)."""
+    setup_fonts()
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            return
+        try:
+            conn.send(_render_timed(*msg))
+        except Exception:
+            conn.send((None, 0.0))
+
+
+class ChartCache:
+    """
+    Rendered PNGs on disk, keyed by a hash of the chart config, the renderer version and
+    the DPI, so md and docx exports of the same session (and re-exports after one more
+    analysis) only render what is new. Hits refresh the file's mtime; once the directory
+    grows past `max_bytes` the least recently used images are evicted down to 90%.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._size: int | None = None  # approximate; rescanned when it crosses the bound
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(config: dict[str, Any], dpi: int) -> str:
+        payload = orjson.dumps(config, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str)
+        return hashlib.sha256(f"{RENDERER_VERSION}|{dpi}|".encode() + payload).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.png"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            png = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            png = None
+        with self._lock:
+            self._counters["hits" if png is not None else "misses"] += 1
+        return png
+
+    def put(self, key: str, png: bytes) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".tmp-{uuid.uuid4().hex}")
+            tmp.write_bytes(png)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("chart_cache_write_failed", exc_info=True)
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += len(png)
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.root.glob("*/*.png"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= target:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._size = total
+            self._counters["evictions"] += evicted
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._counters, "bytes": self._size or 0, "max_bytes": self.max_bytes}
+
+
+class _ChartWorker:
+    def __init__(self, ctx: Any) -> None:
+        self.conn, child = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(target=_chart_worker_main, args=(child,), name="chart-worker", daemon=True)
+        self.process.start()
+        child.close()
+        self.task: int | None = None
+        self.deadline = 0.0
+
+    def stop(self, *, kill: bool) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout=2)
+        except Exception:
+            logger.debug("chart_worker_stop_failed", exc_info=True)
+        finally:
+            self.conn.close()
+
+
+class ChartRenderer:
+    """
+    Renders report charts on long-lived worker processes (pyplot keeps global state and is
+    not thread-safe, so concurrent exports cannot share one interpreter). Workers set up
+    fonts once when they start. A batch is spread over the free workers and reassembled in
+    input order; a chart that exceeds `timeout_s` comes back as None and its worker is
+    killed and replaced lazily. max_workers <= 0 renders inline, serialized by a lock.
+    """
+
+    def __init__(
+        self, max_workers: int, timeout_s: float, start_method: str = "spawn", cache: ChartCache | None = None
+    ) -> None:
+        self.max_workers = int(max_workers)
+        self.timeout_s = float(timeout_s)
+        self.cache = cache
+        self._ctx = mp.get_context(start_method)
+        self._cond = threading.Condition()
+        self._inline_lock = threading.Lock()
+        self._idle: list[_ChartWorker] = []
+        self._spawned = 0
+        self._counters = {"rendered": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+    def start(self) -> None:
+        """Pre-spawn the workers so the first export does not pay the matplotlib import."""
+        with self._cond:
+            while self._spawned < self.max_workers:
+                self._idle.append(_ChartWorker(self._ctx))
+                self._spawned += 1
+
+    def render_many(self, configs: list[dict[str, Any]], dpi: int = CHART_DPI) -> list[bytes | None]:
+        """PNG per config, in order (None where rendering failed); cached images are reused."""
+        return list(self.iter_render(configs, dpi))
+
+    def iter_render(self, configs: list[dict[str, Any]], dpi: int = CHART_DPI) -> Iterator[bytes | None]:
+        """
+        Same results as render_many, yielded in input order as soon as a chart and every
+        chart before it are done, so callers can write images out while the rest render.
+        Closing the iterator early gives up the charts still in flight.
+        """
+        if not configs:
+            return
+        keys = [self.cache.key(config, dpi) for config in configs] if self.cache else list(range(len(configs)))
+        results: list[Any] = [self.cache.get(key) for key in keys] if self.cache else [None] * len(configs)
+        missing = [i for i, png in enumerate(results) if png is None]
+        # identical charts within one report are rendered once
+        first_of: dict[Any, int] = {}
+        for i in missing:
+            first_of.setdefault(keys[i], i)
+        copies: dict[int, list[int]] = {i: [] for i in first_of.values()}
+        for i in missing:
+            results[i] = _PENDING
+            if first_of[keys[i]] != i:
+                copies[first_of[keys[i]]].append(i)
+        todo = list(copies)
+
+        ready = 0
+        with timed("render_charts"):
+            if self.max_workers <= 0:
+                stream = self._render_inline([configs[i] for i in todo], dpi)
+            else:
+                stream = self._render_in_pool([configs[i] for i in todo], dpi)
+            try:
+                for pos, png in stream:
+                    i = todo[pos]
+                    for j in (i, *copies[i]):
+                        results[j] = png
+                    if png is not None and self.cache:
+                        self.cache.put(keys[i], png)
+                    with self._cond:
+                        self._counters["rendered" if png is not None else "failed"] += 1
+                    while ready < len(results) and results[ready] is not _PENDING:
+                        yield results[ready]
+                        ready += 1
+            finally:
+                stream.close()
+        while ready < len(results):
+            yield results[ready]
+            ready += 1
+
+    def _render_inline(self, configs: list[dict[str, Any]], dpi: int) -> Iterator[tuple[int, bytes | None]]:
+        for index, config in enumerate(configs):
+            with self._inline_lock:
+                png, seconds = _render_timed(config, dpi)
+            record("render_chart", seconds)
+            yield index, png
+
+    def _acquire(self, wanted: int) -> list[_ChartWorker]:
+        """At least one worker (waiting if all are busy), at most `wanted`."""
+        with self._cond:
+            while not self._idle and self._spawned >= self.max_workers:
+                self._cond.wait()
+            workers = [self._idle.pop() for _ in range(min(wanted, len(self._idle)))]
+            fresh = min(wanted - len(workers), self.max_workers - self._spawned)
+            self._spawned += fresh
+        created: list[_ChartWorker] = []
+        try:
+            for _ in range(fresh):
+                created.append(_ChartWorker(self._ctx))
+        except Exception:
+            with self._cond:
+                self._spawned -= fresh - len(created)
+                self._cond.notify_all()
+            if not workers and not created:
+                raise
+            logger.warning("chart_worker_spawn_failed", exc_info=True)
+        return workers + created
+
+    def _release(self, worker: _ChartWorker, *, healthy: bool) -> None:
+        if healthy and worker.process.is_alive():
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+            return
+        worker.stop(kill=True)
+        with self._cond:
+            self._spawned -= 1
+            self._counters["restarts"] += 1
+            self._cond.notify()
+
+    def _render_in_pool(self, configs: list[dict[str, Any]], dpi: int) -> Iterator[tuple[int, bytes | None]]:
+        """(index, png) pairs in completion order; a chart whose worker died or timed out yields None."""
+        pending = iter(range(len(configs)))
+        busy: list[_ChartWorker] = []
+
+        def assign(worker: _ChartWorker) -> None:
+            index = next(pending, None)
+            if index is None:
+                self._release(worker, healthy=True)
+                return
+            worker.task, worker.deadline = index, time.monotonic() + self.timeout_s
+            busy.append(worker)
+            try:
+                worker.conn.send((configs[index], dpi))
+            except OSError:
+                pass  # the worker is gone; the loop below sees its sentinel and replaces it
+
+        def retire(worker: _ChartWorker) -> int:
+            index = worker.task
+            busy.remove(worker)
+            self._release(worker, healthy=False)
+            # keep the batch going on a replacement worker
+            for replacement in self._acquire(1):
+                assign(replacement)
+            return index
+
+        for worker in self._acquire(len(configs)):
+            assign(worker)
+        try:
+            while busy:
+                ready = wait_connections([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout=0.05)
+                now = time.monotonic()
+                for worker in list(busy):
+                    if worker.conn in ready and worker.conn.poll():
+                        try:
+                            png, seconds = worker.conn.recv()
+                        except (EOFError, OSError):
+                            logger.warning("chart_worker_lost index=%s", worker.task)
+                            yield retire(worker), None
+                            continue
+                        record("render_chart", seconds)
+                        index = worker.task
+                        busy.remove(worker)
+                        # hand the worker its next chart before the caller consumes this one
+                        assign(worker)
+                        yield index, png
+                    elif worker.process.sentinel in ready or now > worker.deadline:
+                        if now > worker.deadline:
+                            with self._cond:
+                                self._counters["timeouts"] += 1
+                            logger.warning("chart_render_timeout index=%s timeout_s=%s", worker.task, self.timeout_s)
+                        yield retire(worker), None
+        except BaseException:
+            for worker in busy:
+                self._release(worker, healthy=False)
+            raise
+
+    def shutdown(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+        for worker in idle:
+            worker.stop(kill=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "workers": self._spawned,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+
+chart_cache = ChartCache(Path(settings.data_dir) / "chart_cache", settings.chart_cache_max_mb * 1024 * 1024)
+
+chart_renderer = ChartRenderer(
+    max_workers=settings.chart_render_workers,
+    timeout_s=settings.chart_render_timeout_s,
+    start_method=settings.analysis_start_method,
+    cache=chart_cache if settings.chart_cache_enabled else None,
+)
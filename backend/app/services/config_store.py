@@ -1,35 +1,98 @@
 from __future__ import annotations
 
+import copy
 import logging
+import threading
+import time
+from typing import Any
 
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from app.core.settings import settings
-from app.db.models import AppConfigModel
+from app.db.models import AppConfigModel, ConfigVersionModel
 
 logger = logging.getLogger(__name__)
 
+_VERSION_ROW = 1
+
+
+class ConfigCache:
+    """
+    Versioned in-memory copy of the app_config table. Reads are served from memory; at most
+    once per check_interval_s a single primary-key lookup of the config_version row decides
+    whether another worker has written and the table must be reloaded. Writes in this
+    process go through set_config and update the cache immediately.
+    """
+
+    def __init__(self, check_interval_s: float) -> None:
+        self.check_interval_s = float(check_interval_s)
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._values: dict[str, dict[str, Any]] = {}
+        self._checked_at = 0.0
+
+    def get(self, db: Session, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            fresh = self._version is not None and time.monotonic() - self._checked_at < self.check_interval_s
+        if not fresh:
+            self._refresh(db)
+        with self._lock:
+            value = self._values.get(key)
+        # callers patch the dict (e.g. api_key fallback); never hand out the cached object
+        return copy.deepcopy(value) if value is not None else None
+
+    def _refresh(self, db: Session) -> None:
+        version = db.scalar(select(ConfigVersionModel.version).where(ConfigVersionModel.id == _VERSION_ROW)) or 0
+        with self._lock:
+            if version == self._version:
+                self._checked_at = time.monotonic()
+                return
+        values = {row.key: row.value for row in db.scalars(select(AppConfigModel))}
+        with self._lock:
+            self._values, self._version, self._checked_at = values, version, time.monotonic()
+
+    def store(self, key: str, value: dict[str, Any], version: int) -> None:
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                # missed someone else's write in between: reload everything on the next read
+                self._version = None
+                return
+            self._values[key] = copy.deepcopy(value)
+            self._version, self._checked_at = version, time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+
+
+config_cache = ConfigCache(check_interval_s=settings.config_cache_check_s)
+
+
+def _bump_version(db: Session) -> int:
+    bumped = db.execute(
+        update(ConfigVersionModel)
+        .where(ConfigVersionModel.id == _VERSION_ROW)
+        .values(version=ConfigVersionModel.version + 1)
+        .returning(ConfigVersionModel.version)
+    ).scalar()
+    if bumped is None:
+        db.add(ConfigVersionModel(id=_VERSION_ROW, version=1))
+        bumped = 1
+    return bumped
+
 
 def get_config(db: Session, key: str) -> dict | None:
-    row = db.get(AppConfigModel, key)
-    return row.value if row else None
+    return config_cache.get(db, key)
 
 
 def set_config(db: Session, key: str, value: dict) -> None:
-    # Delete-then-insert to avoid SQLAlchemy JSON column change-detection issues
-    row = db.get(AppConfigModel, key)
-    if row:
-        db.delete(row)
-        db.flush()
-    new_row = AppConfigModel(key=key, value=value)
-    db.add(new_row)
+    """Upsert the row and bump the version counter in one transaction, then write through."""
+    db.merge(AppConfigModel(key=key, value=value))
+    version = _bump_version(db)
     db.commit()
-    # Verify write
-    saved = db.get(AppConfigModel, key)
-    if saved:
-        logger.info("set_config OK: key=%s, api_key present=%s", key, bool(saved.value.get("api_key")))
-    else:
-        logger.error("set_config FAILED: key=%s not found after commit", key)
+    config_cache.store(key, value, version)
+    logger.info("set_config OK: key=%s, version=%s, api_key present=%s", key, version, bool(value.get("api_key")))
 
 
 def get_model_config(db: Session) -> dict:
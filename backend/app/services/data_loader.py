@@ -6,6 +6,8 @@ from pathlib import Path
 import chardet
 import pandas as pd
 
+from app.core.metrics import timed
+
 
 @dataclass(frozen=True)
 class LoadedData:
@@ -24,6 +26,7 @@ def _detect_encoding(path: Path, max_bytes: int = 512 * 1024) -> str:
     return "utf-8"
 
 
+@timed("load_dataframe")
 def load_dataframe(file_path: str) -> LoadedData:
     path = Path(file_path)
     suffix = path.suffix.lower()
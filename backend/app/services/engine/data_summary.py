@@ -5,6 +5,8 @@ from typing import Any
 import numpy as np
 import pandas as pd
 
+from app.core.metrics import timed
+
 
 def infer_column_type(series: pd.Series) -> str:
     if pd.api.types.is_bool_dtype(series):
@@ -24,6 +26,7 @@ def infer_column_type(series: pd.Series) -> str:
     return "text"
 
 
+@timed("build_data_summary")
 def build_data_summary(df: pd.DataFrame) -> dict[str, Any]:
     df2 = df.copy()
     column_names = [str(c) for c in df2.columns.tolist()]
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from typing import Any, Literal
 
 import numpy as np
@@ -8,7 +10,7 @@ import pandas as pd
 import scipy.stats as st
 import statsmodels.api as sm
 
-from app.services.engine.spc import compute_limits, detect_western_rules
+from app.services.engine.spc import compute_limits, compute_stratified_limits, detect_western_rules
 
 
 EffectType = Literal["cohens_d", "r_squared", "eta_squared", "cramers_v"]
@@ -428,6 +430,56 @@ _RULE_DESCRIPTIONS = {
 }
 
 
+# 控制图显示点上限（异常点不计入，始终保留）
+_CONTROL_CHART_MAX_POINTS = 2000
+
+
+def _display_indices(values: np.ndarray, keep: np.ndarray, max_points: int = _CONTROL_CHART_MAX_POINTS) -> np.ndarray:
+    """分桶取极小/极大值降采样，并入首尾点与必须保留的索引，返回升序索引。"""
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(max_points // 2, 1))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    grid = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picked = np.concatenate([
+        offsets + np.nanargmin(grid, axis=1),
+        offsets + np.nanargmax(grid, axis=1),
+        [0, n - 1],
+        keep,
+    ])
+    return np.unique(picked.astype(np.int64))
+
+
+def _control_chart_columns(
+    series: np.ndarray, anomaly_map: dict[int, list[int]], lower: np.ndarray | None = None
+) -> dict[str, Any]:
+    """
+    列式控制图数据：x/y 为显示用（可能降采样）的样本序号与取值，
+    anomalies 为全部异常点的样本序号（1 起），rules 为 序号 → 触发规则 的稀疏映射。
+    """
+    anomaly_idx = np.array(sorted(anomaly_map), dtype=np.int64)
+    idx = _display_indices(series, anomaly_idx)
+    data: dict[str, Any] = {
+        "format": "columnar",
+        "n": int(len(series)),
+        "x": (idx + 1).tolist(),
+        "y": np.round(series[idx], 6).tolist(),
+        "anomalies": (anomaly_idx + 1).tolist(),
+        "rules": {str(i + 1): anomaly_map[i] for i in anomaly_idx.tolist()},
+    }
+    if lower is not None:
+        data["lower_series"] = np.round(lower[idx], 6).tolist()
+    return data
+
+
+# 小偏移控制图：只判定统计量是否超出控制限
+_SMALL_SHIFT_CHARTS = ("EWMA", "CUSUM")
+
+
 def _choose_chart_type(values: list[float]) -> str:
     """自动选择控制图类型：连续型默认 IX-MR，离散型根据值域判断。"""
     arr = np.array(values)
@@ -445,14 +497,14 @@ def _choose_chart_type(values: list[float]) -> str:
     return "IX-MR"
 
 
-def spc_control_chart(df: pd.DataFrame, y: str, alpha: float = 0.05) -> EngineResult:
-    """SPC 控制图分析：自动选型 → 计算控制限 → 西联规则检测。"""
+def spc_control_chart(df: pd.DataFrame, y: str, alpha: float = 0.05, chart_type: str | None = None) -> EngineResult:
+    """SPC 控制图分析：自动选型（或指定 chart_type）→ 计算控制限 → 西联规则检测。"""
     series = pd.to_numeric(df[y], errors="coerce").dropna()
     if len(series) < 5:
         raise ValueError(f"列 '{y}' 的有效数值不足 5 个，无法进行 SPC 分析")
 
     values = series.tolist()
-    chart_type = _choose_chart_type(values)
+    chart_type = chart_type.upper() if chart_type else _choose_chart_type(values)
 
     # 计算控制限
     limits = compute_limits(chart_type, values)
@@ -462,59 +514,74 @@ def spc_control_chart(df: pd.DataFrame, y: str, alpha: float = 0.05) -> EngineRe
     sigma = limits["sigma"]
     chart_series = limits.get("chart_series", values)
 
-    # 西联规则检测（启用全部 8 条）
-    enabled_rules = list(range(1, 9))
-    anomalies = detect_western_rules(chart_series, cl, sigma, enabled_rules)
+    if chart_type in _SMALL_SHIFT_CHARTS:
+        # EWMA/CUSUM 统计量自相关，只判定是否超出控制限（记为规则1）
+        anomalies = [(int(i), 1) for i in limits["signals"]]
+    else:
+        # 西联规则检测（启用全部 8 条）
+        enabled_rules = list(range(1, 9))
+        anomalies = detect_western_rules(chart_series, cl, sigma, enabled_rules)
 
     # 按索引聚合触发的规则
     anomaly_map: dict[int, list[int]] = {}
     for idx, rule_id in anomalies:
         anomaly_map.setdefault(idx, []).append(rule_id)
 
-    # 构建控制图数据点
-    points = []
-    for i, val in enumerate(chart_series):
-        rules = anomaly_map.get(i, [])
-        points.append({
-            "x": i + 1,
-            "y": round(float(val), 6),
-            "is_anomaly": len(rules) > 0,
-            "rule_violated": rules,
-        })
-
     anomaly_count = len(anomaly_map)
     triggered_rules = sorted(set(r for rules in anomaly_map.values() for r in rules))
 
-    # 可视化
+    # 可视化：列式数据，超长序列降采样显示但保留全部异常点
+    chart_data = _control_chart_columns(
+        np.asarray(chart_series, dtype=float),
+        anomaly_map,
+        lower=np.asarray(limits["lower_series"], dtype=float) if "lower_series" in limits else None,
+    )
+    chart_data.update({
+        "ucl": round(ucl, 6),
+        "cl": round(cl, 6),
+        "lcl": round(lcl, 6),
+        "chart_type": chart_type,
+    })
+    for key in ("ucl_series", "lcl_series"):
+        if key in limits:
+            chart_data[key] = np.round(np.asarray(limits[key], dtype=float), 6).tolist()
+    if "state" in limits:
+        chart_data["state"] = limits["state"]
     viz = [{
         "type": "control_chart",
         "title": f"{chart_type} 控制图 — {y}",
-        "data": {
-            "points": points,
-            "ucl": round(ucl, 6),
-            "cl": round(cl, 6),
-            "lcl": round(lcl, 6),
-            "chart_type": chart_type,
-        },
+        "data": chart_data,
     }]
 
     # 解读
+    if chart_type == "CUSUM":
+        limit_text = f"目标值={limits['target']:.4g}，H={ucl:.4g}，K={limits['state']['k'] * sigma:.4g}。"
+    else:
+        limit_text = f"CL={cl:.4g}，UCL={ucl:.4g}，LCL={lcl:.4g}。"
     if anomaly_count == 0:
         level = "过程受控"
-        interp = f"SPC 分析（{chart_type} 控制图）：{y} 过程受控，未检测到异常点。CL={cl:.4g}，UCL={ucl:.4g}，LCL={lcl:.4g}。"
+        interp = f"SPC 分析（{chart_type} 控制图）：{y} 过程受控，未检测到异常点。{limit_text}"
+    elif chart_type in _SMALL_SHIFT_CHARTS:
+        level = "过程失控" if anomaly_count >= 3 else "过程预警"
+        interp = (
+            f"SPC 分析（{chart_type} 控制图）：{y} {level}，"
+            f"共 {anomaly_count} 个点超出控制限，提示过程均值存在小幅持续偏移。{limit_text}"
+        )
     else:
         level = "过程失控" if anomaly_count >= 3 else "过程预警"
         rule_desc = "、".join(_RULE_DESCRIPTIONS.get(r, f"规则{r}") for r in triggered_rules)
         interp = (
             f"SPC 分析（{chart_type} 控制图）：{y} {level}，"
             f"共 {anomaly_count} 个异常点，触发规则：{rule_desc}。"
-            f"CL={cl:.4g}，UCL={ucl:.4g}，LCL={lcl:.4g}。"
+            f"{limit_text}"
         )
 
     suggestions = []
     if anomaly_count > 0:
         suggestions.append("建议排查异常点对应的生产批次或时间段，寻找特殊原因。")
-        if 1 in triggered_rules:
+        if chart_type in _SMALL_SHIFT_CHARTS:
+            suggestions.append(f"{chart_type} 报警：过程均值可能发生小幅持续偏移，建议从首个报警点向前追溯变更。")
+        elif 1 in triggered_rules:
             suggestions.append("规则1触发：存在极端偏离，优先检查该点的原材料或设备状态。")
         if 2 in triggered_rules:
             suggestions.append("规则2触发：过程均值可能发生偏移，建议检查是否有系统性变化。")
@@ -533,6 +600,197 @@ def spc_control_chart(df: pd.DataFrame, y: str, alpha: float = 0.05) -> EngineRe
     )
 
 
+# 分层 SPC 严重度权重：超 3σ 最重，均值偏移/趋势类次之
+_RULE_SEVERITY = {1: 4, 2: 2, 3: 2, 4: 1, 5: 2, 6: 1, 7: 1, 8: 1}
+_STRATIFIED_MIN_POINTS = 5
+_STRATIFIED_CHART_TOP = 20
+_STRATIFIED_LIST_TOP = 200
+
+
+def spc_stratified(
+    df: pd.DataFrame, y: str, group: str, stream: str | None = None, alpha: float = 0.05
+) -> EngineResult:
+    """
+    分层 SPC：按 group 列将 y 拆分为多条数据流（如各机台/主轴），批量计算 IX 控制限与西联规则，
+    返回按严重度排序的数据流摘要；指定 stream 时按需返回该数据流的单值控制图。
+    """
+    if group not in df.columns:
+        raise ValueError(f"分组列 '{group}' 不存在")
+
+    if stream is not None:
+        sub = df[df[group].astype(str) == str(stream)]
+        if sub.empty:
+            raise ValueError(f"分组列 '{group}' 中不存在数据流 '{stream}'")
+        result = spc_control_chart(sub, y=y, alpha=alpha, chart_type="IX-MR")
+        return replace(result, interpretation=f"【{group}={stream}】{result.interpretation}")
+
+    values = pd.to_numeric(df[y], errors="coerce").to_numpy(dtype=float)
+    codes, uniques = pd.factorize(df[group], sort=False)
+    keep = (codes >= 0) & np.isfinite(values)
+    n_streams = len(uniques)
+    if n_streams == 0 or not keep.any():
+        raise ValueError(f"列 '{y}' 按 '{group}' 分层后没有有效数值，无法进行 SPC 分析")
+
+    enabled_rules = list(range(1, 9))
+    stats = compute_stratified_limits(values[keep], codes[keep], n_streams, enabled_rules)
+
+    weights = np.array([_RULE_SEVERITY[r] for r in range(1, 9)])
+    severity = stats["rule_counts"] @ weights
+    eligible = stats["n"] >= _STRATIFIED_MIN_POINTS
+    ranked = [i for i in np.lexsort((-stats["anomaly_count"], -severity)) if eligible[i]]
+
+    streams = []
+    for i in ranked:
+        rule_counts = stats["rule_counts"][i]
+        streams.append({
+            "stream": str(uniques[i]),
+            "n": int(stats["n"][i]),
+            "cl": round(float(stats["cl"][i]), 6),
+            "ucl": round(float(stats["ucl"][i]), 6),
+            "lcl": round(float(stats["lcl"][i]), 6),
+            "anomaly_count": int(stats["anomaly_count"][i]),
+            "rules_triggered": [r + 1 for r in range(8) if rule_counts[r] > 0],
+            "severity": int(severity[i]),
+        })
+    if not streams:
+        raise ValueError(f"列 '{y}' 各数据流的有效数值均不足 {_STRATIFIED_MIN_POINTS} 个，无法进行 SPC 分析")
+
+    flagged = [s for s in streams if s["anomaly_count"] > 0]
+    skipped = int((~eligible).sum())
+    top = streams[:_STRATIFIED_CHART_TOP]
+
+    viz = [{
+        "type": "bar",
+        "title": f"分层 SPC — {y}（按 {group}，异常点数 Top {len(top)}）",
+        "data": {
+            "categories": [s["stream"] for s in top],
+            "values": [s["anomaly_count"] for s in top],
+            "streams": streams[:_STRATIFIED_LIST_TOP],
+            "stream_count": len(streams),
+            "flagged_count": len(flagged),
+            "fetch": {"method": "spc_stratified", "y": y, "group": group},
+        },
+        "xLabel": group,
+        "yLabel": "异常点数",
+    }]
+
+    if not flagged:
+        interp = f"分层 SPC：按 {group} 将 {y} 拆分为 {len(streams)} 条数据流，均未检测到异常点，过程受控。"
+    else:
+        worst = "、".join(f"{s['stream']}（{s['anomaly_count']} 个异常点）" for s in flagged[:3])
+        interp = (
+            f"分层 SPC：按 {group} 将 {y} 拆分为 {len(streams)} 条数据流，"
+            f"其中 {len(flagged)} 条存在异常，最严重的为：{worst}。"
+        )
+    if skipped:
+        interp += f"另有 {skipped} 条数据流有效数值不足 {_STRATIFIED_MIN_POINTS} 个，未参与判定。"
+
+    suggestions = []
+    if flagged:
+        suggestions.append("建议优先排查严重度靠前的数据流；指定 stream 可单独查看该数据流的控制图。")
+        if any(1 in s["rules_triggered"] for s in flagged):
+            suggestions.append("部分数据流触发规则1（超出3σ），优先检查对应机台/产线的设备状态。")
+    else:
+        suggestions.append("各数据流均稳定，可继续分层监控。")
+
+    return EngineResult(
+        method="spc_stratified",
+        method_name="分层 SPC 控制图",
+        p_value=None,
+        significant=bool(flagged),
+        effect_size={"type": "cohens_d", "value": 0.0, "level": "small"},
+        interpretation=interp,
+        suggestions=suggestions,
+        visualizations=viz,
+    )
+
+
+def _capability_normality(values: np.ndarray) -> tuple[str, float, float]:
+    """流程能力正态性检验：n ≤ 5000 用 Shapiro-Wilk，否则 Anderson-Darling（p 值为近似）。"""
+    if len(values) <= 5000:
+        _stat, _p = st.shapiro(values)
+        return "Shapiro-Wilk", float(_stat), float(_p)
+    result_ad = st.anderson(values, dist="norm")
+    stat_val = float(result_ad.statistic)
+    critical = result_ad.critical_values[2] if len(result_ad.critical_values) > 2 else result_ad.critical_values[-1]
+    p_norm = 0.01 if stat_val > float(critical) else 0.10
+    return "Anderson-Darling", stat_val, p_norm
+
+
+def _capability_grade(cpk: float | None) -> tuple[str, str]:
+    if cpk is None:
+        return "—", "无法评估"
+    if cpk >= 2.0:
+        return "A", "优秀"
+    if cpk >= 1.67:
+        return "B", "良好"
+    if cpk >= 1.33:
+        return "C", "可接受"
+    if cpk >= 1.0:
+        return "D", "勉强，需改进"
+    return "F", "不合格，必须改进"
+
+
+def _capability_chart(
+    y: str,
+    values: np.ndarray,
+    usl: float,
+    lsl: float,
+    *,
+    mean_val: float,
+    std_overall: float,
+    std_within: float,
+    cp: float | None,
+    cpk: float | None,
+    pp: float | None,
+    ppk: float | None,
+    ppm: float,
+    normality: tuple[str, float, float],
+) -> dict[str, Any]:
+    """流程能力直方图 + 正态拟合曲线 + 规格限。"""
+    # 构建直方图数据 + 规格限
+    hist_counts, bin_edges = np.histogram(values, bins="auto")
+    hist_data = []
+    for i in range(len(hist_counts)):
+        hist_data.append({
+            "bin_start": round(float(bin_edges[i]), 6),
+            "bin_end": round(float(bin_edges[i + 1]), 6),
+            "count": int(hist_counts[i]),
+        })
+
+    # 正态拟合曲线数据
+    x_range = np.linspace(float(np.min(values)) - 2 * std_overall, float(np.max(values)) + 2 * std_overall, 200)
+    y_pdf = st.norm.pdf(x_range, mean_val, std_overall)
+    normal_curve = [{"x": round(float(xv), 6), "y": round(float(yv), 8)} for xv, yv in zip(x_range, y_pdf)]
+
+    norm_method, stat_val, p_norm = normality
+    return {
+        "type": "distribution",
+        "title": f"流程能力分析 — {y}",
+        "data": {
+            "histogram": hist_data,
+            "normal_curve": normal_curve,
+            "usl": round(usl, 6),
+            "lsl": round(lsl, 6),
+            "mean": round(mean_val, 6),
+            "std_dev": round(std_overall, 6),
+            "std_within": round(std_within, 6),
+            "sample_size": int(len(values)),
+            "cp": round(cp, 4) if cp is not None else None,
+            "cpk": round(cpk, 4) if cpk is not None else None,
+            "pp": round(pp, 4) if pp is not None else None,
+            "ppk": round(ppk, 4) if ppk is not None else None,
+            "ppm": round(ppm, 2),
+            "normality_test": {
+                "method": norm_method,
+                "statistic": round(float(stat_val), 6),
+                "p_value": round(float(p_norm), 6),
+                "is_normal": bool(p_norm > 0.05),
+            },
+        },
+    }
+
+
 def capability_analysis(
     df: pd.DataFrame, y: str, usl: float, lsl: float, alpha: float = 0.05
 ) -> EngineResult:
@@ -553,18 +811,7 @@ def capability_analysis(
     std_within = mr_bar / d2 if mr_bar > 0 else std_overall
 
     # 正态性检验
-    if n <= 5000:
-        _stat, _p = st.shapiro(values)
-        stat_val = float(_stat)
-        p_norm = float(_p)
-        norm_method = "Shapiro-Wilk"
-    else:
-        result_ad = st.anderson(values, dist="norm")
-        stat_val = float(result_ad.statistic)
-        critical = result_ad.critical_values[2] if len(result_ad.critical_values) > 2 else result_ad.critical_values[-1]
-        p_norm = 0.01 if stat_val > float(critical) else 0.10
-        norm_method = "Anderson-Darling"
-
+    norm_method, stat_val, p_norm = _capability_normality(values)
     is_normal = bool(p_norm > 0.05)
 
     # Cp / Cpk（短期，基于组内标准差）
@@ -596,60 +843,14 @@ def capability_analysis(
         ppm = 0.0
 
     # 能力等级
-    if cpk is not None:
-        if cpk >= 2.0:
-            grade, grade_label = "A", "优秀"
-        elif cpk >= 1.67:
-            grade, grade_label = "B", "良好"
-        elif cpk >= 1.33:
-            grade, grade_label = "C", "可接受"
-        elif cpk >= 1.0:
-            grade, grade_label = "D", "勉强，需改进"
-        else:
-            grade, grade_label = "F", "不合格，必须改进"
-    else:
-        grade, grade_label = "—", "无法评估"
+    grade, grade_label = _capability_grade(cpk)
 
-    # 构建直方图数据 + 规格限
-    hist_counts, bin_edges = np.histogram(values, bins="auto")
-    hist_data = []
-    for i in range(len(hist_counts)):
-        hist_data.append({
-            "bin_start": round(float(bin_edges[i]), 6),
-            "bin_end": round(float(bin_edges[i + 1]), 6),
-            "count": int(hist_counts[i]),
-        })
-
-    # 正态拟合曲线数据
-    x_range = np.linspace(float(np.min(values)) - 2 * std_overall, float(np.max(values)) + 2 * std_overall, 200)
-    y_pdf = st.norm.pdf(x_range, mean_val, std_overall)
-    normal_curve = [{"x": round(float(xv), 6), "y": round(float(yv), 8)} for xv, yv in zip(x_range, y_pdf)]
-
-    viz = [{
-        "type": "distribution",
-        "title": f"流程能力分析 — {y}",
-        "data": {
-            "histogram": hist_data,
-            "normal_curve": normal_curve,
-            "usl": round(usl, 6),
-            "lsl": round(lsl, 6),
-            "mean": round(mean_val, 6),
-            "std_dev": round(std_overall, 6),
-            "std_within": round(std_within, 6),
-            "sample_size": n,
-            "cp": round(cp, 4) if cp is not None else None,
-            "cpk": round(cpk, 4) if cpk is not None else None,
-            "pp": round(pp, 4) if pp is not None else None,
-            "ppk": round(ppk, 4) if ppk is not None else None,
-            "ppm": round(ppm, 2),
-            "normality_test": {
-                "method": norm_method,
-                "statistic": round(float(stat_val), 6),
-                "p_value": round(float(p_norm), 6),
-                "is_normal": is_normal,
-            },
-        },
-    }]
+    viz = [_capability_chart(
+        y, values, usl, lsl,
+        mean_val=mean_val, std_overall=std_overall, std_within=std_within,
+        cp=cp, cpk=cpk, pp=pp, ppk=ppk, ppm=ppm,
+        normality=(norm_method, stat_val, p_norm),
+    )]
 
     # 解读
     norm_note = "数据服从正态分布" if is_normal else "数据不服从正态分布（结果仅供参考）"
@@ -693,6 +894,272 @@ def capability_analysis(
     )
 
 
+_CAPABILITY_MIN_POINTS = 5
+_CAPABILITY_BATCH_CHART_TOP = 30
+
+
+def _normalize_specs(specs: list[dict[str, Any]]) -> list[tuple[str, float, float]]:
+    """规格表：每行 {y|column, usl, lsl}，返回 (列名, USL, LSL)。"""
+    out: list[tuple[str, float, float]] = []
+    for row in specs or []:
+        col = row.get("y") or row.get("column")
+        if not col or row.get("usl") is None or row.get("lsl") is None:
+            raise ValueError(f"规格表行缺少列名或 USL/LSL：{row}")
+        out.append((str(col), float(row["usl"]), float(row["lsl"])))
+    if not out:
+        raise ValueError("规格表为空，无法进行批量流程能力分析")
+    return out
+
+
+def capability_batch(
+    df: pd.DataFrame, specs: list[dict[str, Any]], top_n: int = 5, alpha: float = 0.05
+) -> EngineResult:
+    """
+    批量流程能力分析：按规格表对多个特性一次性向量化计算 Cp/Cpk/Pp/Ppk，
+    正态性检验并行执行，输出按 Cpk 升序排列的能力表，仅为最差 top_n 个特性生成分布图。
+    """
+    rows = _normalize_specs(specs)
+    missing = [col for col, _, _ in rows if col not in df.columns]
+    if missing:
+        raise ValueError(f"规格表中的列不存在：{'、'.join(missing)}")
+
+    cols = [col for col, _, _ in rows]
+    usl = np.array([u for _, u, _ in rows], dtype=float)
+    lsl = np.array([l for _, _, l in rows], dtype=float)
+    X = df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    valid = np.isfinite(X)
+    counts = valid.sum(axis=0)
+    enough = counts >= _CAPABILITY_MIN_POINTS
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(np.where(valid, X, np.nan), axis=0)
+        std_overall = np.nanstd(np.where(valid, X, np.nan), axis=0, ddof=1)
+        # 移动极差：先把每列有效值稳定地前移（保持原顺序），再整体做差分
+        compact = np.take_along_axis(X, np.argsort(~valid, axis=0, kind="stable"), axis=0)
+        mr = np.abs(np.diff(compact, axis=0))
+        mr_valid = np.arange(len(mr))[:, None] < (counts - 1)[None, :]
+        mr_bar = np.where(mr_valid, mr, 0.0).sum(axis=0) / np.maximum(counts - 1, 1)
+        std_within = np.where(mr_bar > 0, mr_bar / 1.128, std_overall)
+
+        ok_w = std_within > 0
+        ok_o = std_overall > 0
+        cp = np.where(ok_w, (usl - lsl) / (6 * std_within), np.nan)
+        cpk = np.where(ok_w, np.minimum(usl - mean, mean - lsl) / (3 * std_within), np.nan)
+        pp = np.where(ok_o, (usl - lsl) / (6 * std_overall), np.nan)
+        ppk = np.where(ok_o, np.minimum(usl - mean, mean - lsl) / (3 * std_overall), np.nan)
+        ppm = np.where(
+            ok_o,
+            (st.norm.sf((usl - mean) / std_overall) + st.norm.sf((mean - lsl) / std_overall)) * 1_000_000,
+            0.0,
+        )
+
+    # 正态性检验（逐列、并行）
+    columns = [X[valid[:, j], j] for j in range(len(cols))]
+    checked = [j for j in range(len(cols)) if enough[j]]
+    normality: dict[int, tuple[str, float, float]] = {}
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        for j, res in zip(checked, pool.map(lambda j: _capability_normality(columns[j]), checked)):
+            normality[j] = res
+
+    def _opt(v: float) -> float | None:
+        return round(float(v), 4) if np.isfinite(v) else None
+
+    ranked: list[tuple[int, dict[str, Any]]] = []
+    for j, col in enumerate(cols):
+        if not enough[j]:
+            continue
+        grade, _ = _capability_grade(_opt(cpk[j]))
+        ranked.append((j, {
+            "y": col,
+            "usl": float(usl[j]),
+            "lsl": float(lsl[j]),
+            "n": int(counts[j]),
+            "mean": round(float(mean[j]), 6),
+            "std_dev": round(float(std_overall[j]), 6),
+            "cp": _opt(cp[j]),
+            "cpk": _opt(cpk[j]),
+            "pp": _opt(pp[j]),
+            "ppk": _opt(ppk[j]),
+            "ppm": round(float(ppm[j]), 2),
+            "grade": grade,
+            "is_normal": bool(normality[j][2] > 0.05),
+        }))
+    if not ranked:
+        raise ValueError(f"规格表中所有特性的有效数值均不足 {_CAPABILITY_MIN_POINTS} 个，无法进行流程能力分析")
+    # Cpk 升序（最差在前），无法计算的排在最后
+    ranked.sort(key=lambda item: (item[1]["cpk"] is None, item[1]["cpk"] or 0.0))
+    table = [r for _, r in ranked]
+
+    top = table[:_CAPABILITY_BATCH_CHART_TOP]
+    viz: list[dict[str, Any]] = [{
+        "type": "bar",
+        "title": f"Cpk 排名（最差 {len(top)} 个特性）",
+        "data": {
+            "categories": [r["y"] for r in top],
+            "values": [r["cpk"] if r["cpk"] is not None else 0.0 for r in top],
+            "rows": table,
+            "spec_count": len(rows),
+        },
+        "xLabel": "特性",
+        "yLabel": "Cpk",
+    }]
+    for j, r in ranked[: max(int(top_n), 0)]:
+        viz.append(_capability_chart(
+            r["y"], columns[j], float(usl[j]), float(lsl[j]),
+            mean_val=float(mean[j]), std_overall=float(std_overall[j]), std_within=float(std_within[j]),
+            cp=r["cp"], cpk=r["cpk"], pp=r["pp"], ppk=r["ppk"], ppm=float(ppm[j]),
+            normality=normality[j],
+        ))
+
+    poor = [r for r in table if r["cpk"] is not None and r["cpk"] < 1.33]
+    skipped = len(rows) - len(table)
+    worst = "、".join(f"{r['y']}（Cpk={r['cpk']:.3f}）" for r in poor[:3])
+    interp = f"批量流程能力分析：共 {len(table)} 个特性，其中 {len(poor)} 个 Cpk < 1.33"
+    interp += f"，最差为：{worst}。" if poor else "，全部达到可接受水平。"
+    if skipped:
+        interp += f"另有 {skipped} 个特性有效数值不足 {_CAPABILITY_MIN_POINTS} 个，未参与计算。"
+
+    suggestions: list[str] = []
+    if poor:
+        suggestions.append("建议优先改进 Cpk 最低的特性，查看其分布图判断是中心偏移还是波动过大。")
+    non_normal = sum(1 for r in table if not r["is_normal"])
+    if non_normal:
+        suggestions.append(f"{non_normal} 个特性未通过正态性检验，其能力指数仅供参考。")
+    if not suggestions:
+        suggestions.append("各特性流程能力均达标，建议定期复查。")
+
+    worst_cpk = table[0]["cpk"]
+    return EngineResult(
+        method="capability_batch",
+        method_name="批量流程能力分析",
+        p_value=None,
+        significant=bool(poor),
+        effect_size={
+            "type": "cohens_d",
+            "value": worst_cpk if worst_cpk is not None else 0.0,
+            "level": _capability_grade(worst_cpk)[1],
+        },
+        interpretation=interp,
+        suggestions=suggestions,
+        visualizations=viz,
+    )
+
+
+_ROLLING_CAPABILITY_WINDOW = 50
+_ROLLING_CAPABILITY_MAX_POINTS = 2000
+
+
+def rolling_capability_indices(
+    values: np.ndarray, usl: float, lsl: float, window: int
+) -> dict[str, np.ndarray]:
+    """
+    滑动窗口 Cp/Cpk/Pp/Ppk：用 x、x² 与移动极差的累加和在 O(n) 内得到每个窗口的
+    均值、总体方差与平均移动极差（窗口 [i, i+w) 内含 w-1 个移动极差），第 k 个元素对应以样本 k+w-1 结尾的窗口。
+    """
+    x = np.asarray(values, dtype=float)
+    w = int(window)
+    # 先减去全局均值再累加，降低 x² 累加和相减时的精度损失
+    shift = float(np.mean(x))
+    d = x - shift
+    c1 = np.concatenate(([0.0], np.cumsum(d)))
+    c2 = np.concatenate(([0.0], np.cumsum(d * d)))
+    cm = np.concatenate(([0.0], np.cumsum(np.abs(np.diff(x)))))
+
+    s1 = c1[w:] - c1[:-w]
+    s2 = c2[w:] - c2[:-w]
+    mean = s1 / w + shift
+    std_overall = np.sqrt(np.maximum((s2 - s1 * s1 / w) / (w - 1), 0.0))
+    mr_bar = (cm[w - 1:] - cm[: len(cm) - w + 1]) / (w - 1)
+    std_within = np.where(mr_bar > 0, mr_bar / 1.128, std_overall)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ok_w = std_within > 0
+        ok_o = std_overall > 0
+        cp = np.where(ok_w, (usl - lsl) / (6 * std_within), np.nan)
+        cpk = np.where(ok_w, np.minimum(usl - mean, mean - lsl) / (3 * std_within), np.nan)
+        pp = np.where(ok_o, (usl - lsl) / (6 * std_overall), np.nan)
+        ppk = np.where(ok_o, np.minimum(usl - mean, mean - lsl) / (3 * std_overall), np.nan)
+    return {"mean": mean, "std_overall": std_overall, "std_within": std_within, "cp": cp, "cpk": cpk, "pp": pp, "ppk": ppk}
+
+
+def capability_rolling(
+    df: pd.DataFrame, y: str, usl: float, lsl: float, window: int | None = None, alpha: float = 0.05
+) -> EngineResult:
+    """滚动流程能力分析：按样本逐点推进的窗口 Cp/Cpk/Pp/Ppk 趋势（折线图）。"""
+    series = pd.to_numeric(df[y], errors="coerce").dropna()
+    values = series.to_numpy(dtype=float)
+    n = len(values)
+    w = int(window) if window else min(_ROLLING_CAPABILITY_WINDOW, n)
+    if w < _CAPABILITY_MIN_POINTS:
+        raise ValueError(f"滚动窗口至少为 {_CAPABILITY_MIN_POINTS} 个样本")
+    if n < w:
+        raise ValueError(f"列 '{y}' 的有效数值（{n} 个）少于滚动窗口 {w}，无法进行滚动流程能力分析")
+
+    idx = rolling_capability_indices(values, usl, lsl, w)
+    cpk = idx["cpk"]
+    m = len(cpk)
+    ends = np.arange(w, n + 1)  # 窗口末端样本序号（1-based）
+
+    finite = np.isfinite(cpk)
+    worst = int(np.nanargmin(cpk)) if finite.any() else None
+    keep = np.array([worst], dtype=np.int64) if worst is not None else np.array([], dtype=np.int64)
+    shown = _display_indices(np.where(finite, cpk, 0.0), keep, _ROLLING_CAPABILITY_MAX_POINTS)
+
+    def _col(arr: np.ndarray) -> list[float | None]:
+        return [round(float(v), 4) if np.isfinite(v) else None for v in arr[shown]]
+
+    viz = [{
+        "type": "line",
+        "title": f"滚动流程能力趋势 — {y}（窗口 {w}）",
+        "data": {
+            "x": ends[shown].tolist(),
+            "series": {"Cp": _col(idx["cp"]), "Cpk": _col(cpk), "Pp": _col(idx["pp"]), "Ppk": _col(idx["ppk"])},
+            "reference": {"Cpk=1.33": 1.33, "Cpk=1.0": 1.0},
+            "window": w,
+            "n": m,
+            "usl": round(usl, 6),
+            "lsl": round(lsl, 6),
+        },
+        "xLabel": "样本序号（窗口末端）",
+        "yLabel": "能力指数",
+    }]
+
+    last = float(cpk[-1]) if finite[-1] else None
+    below = int(np.count_nonzero(cpk[finite] < 1.33))
+    grade, grade_label = _capability_grade(last)
+    if last is None:
+        interp = f"滚动流程能力分析：{y}，最近窗口标准差为零，无法计算能力指数。"
+    else:
+        first = float(cpk[finite][0])
+        trend = "上升" if last > first * 1.05 else "下降" if last < first * 0.95 else "基本平稳"
+        interp = (
+            f"滚动流程能力分析：{y}，窗口 {w} 个样本，共 {m} 个窗口。"
+            f"最近窗口 Cpk={last:.3f}（{grade}，{grade_label}），首个窗口 Cpk={first:.3f}，趋势{trend}。"
+        )
+        if worst is not None:
+            interp += f"最低 Cpk={float(cpk[worst]):.3f}，出现在第 {int(ends[worst])} 个样本结束的窗口；"
+        interp += f"{below}/{int(finite.sum())} 个窗口 Cpk < 1.33。"
+
+    suggestions: list[str] = []
+    if last is not None and last < 1.33:
+        suggestions.append("最近窗口 Cpk < 1.33，流程能力不足，建议结合控制图排查近期的均值偏移或波动增大。")
+    if worst is not None and below and (last is None or last >= 1.33):
+        suggestions.append(f"第 {int(ends[worst])} 个样本附近能力曾明显下降，建议追溯该时段的工艺变更或异常事件。")
+    if not suggestions:
+        suggestions.append("各窗口流程能力均达标，建议保持监控并定期复查。")
+
+    return EngineResult(
+        method="capability_rolling",
+        method_name="滚动流程能力分析",
+        p_value=None,
+        significant=last is not None and last < 1.33,
+        effect_size={"type": "cohens_d", "value": round(last, 4) if last is not None else 0.0, "level": grade_label},
+        interpretation=interp,
+        suggestions=suggestions,
+        visualizations=viz,
+    )
+
+
 def suggest_default_method(df: pd.DataFrame) -> tuple[str, dict[str, Any]]:
     numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
     cat_cols = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
@@ -1,7 +1,12 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
 from statistics import mean, pstdev
 from typing import Dict, List, Tuple
 
+import numpy as np
+from scipy.signal import lfilter
+
 # 常数表：A2、A3、d2 等（子组 2-10）
 A2_TABLE = {
     2: 1.880,
@@ -190,79 +195,235 @@ def _sign(v: float) -> int:
     return 0
 
 
+def _window_count(mask: np.ndarray, window: int) -> np.ndarray:
+    """
+    以 i 结尾、长度为 window 的滑窗内 mask 为 True 的个数；i < window-1 处为 0。
+    基于累加和，O(n)。
+    """
+    n = len(mask)
+    out = np.zeros(n, dtype=np.int64)
+    if n < window:
+        return out
+    csum = np.cumsum(mask, dtype=np.int64)
+    out[window - 1 :] = csum[window - 1 :] - np.concatenate(([0], csum[: n - window]))
+    return out
+
+
+def western_rule_mask(
+    values: np.ndarray,
+    z: np.ndarray,
+    enabled_rules: List[int],
+    position: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    向量化西电规则判定，返回形状 (n, 8) 的布尔矩阵，第 r-1 列表示规则 r 在该点触发。
+    position: 每个点在所属数据流中的序号；多条数据流首尾相接时，
+    滑窗只在 position >= 窗口长度-1 处生效，保证窗口不跨流。缺省视为单条数据流。
+    """
+    values = np.asarray(values, dtype=float)
+    z = np.asarray(z, dtype=float)
+    n = len(values)
+    pos = np.arange(n) if position is None else np.asarray(position)
+    mask = np.zeros((n, 8), dtype=bool)
+    if n == 0:
+        return mask
+
+    def windowed(hit: np.ndarray, window: int, need: int) -> np.ndarray:
+        return (_window_count(hit, window) >= need) & (pos >= window - 1)
+
+    # 相邻差分；每条流的首点无差分
+    diff = np.zeros(n)
+    diff[1:] = values[1:] - values[:-1]
+    has_diff = pos >= 1
+
+    # Rule 1: 1 point beyond 3 sigma
+    if 1 in enabled_rules:
+        mask[:, 0] = np.abs(z) > 3
+    # Rule 2: 9 consecutive on same side
+    if 2 in enabled_rules:
+        mask[:, 1] = windowed(z > 0, 9, 9) | windowed(z < 0, 9, 9)
+    # Rule 3: 6 points in a row steadily increasing or decreasing
+    if 3 in enabled_rules:
+        up = windowed((diff > 0) & has_diff, 5, 5) & (pos >= 5)
+        down = windowed((diff < 0) & has_diff, 5, 5) & (pos >= 5)
+        mask[:, 2] = up | down
+    # Rule 4: 14 points alternating up and down
+    if 4 in enabled_rules:
+        alternating = np.zeros(n, dtype=bool)
+        alternating[1:] = diff[1:] * diff[:-1] < 0
+        alternating &= pos >= 2
+        mask[:, 3] = windowed(alternating, 12, 12) & (pos >= 13)
+    # Rule 5: 2 of 3 consecutive beyond 2 sigma (same side)
+    if 5 in enabled_rules:
+        mask[:, 4] = windowed(z > 2, 3, 2) | windowed(z < -2, 3, 2)
+    # Rule 6: 4 of 5 consecutive beyond 1 sigma (same side)
+    if 6 in enabled_rules:
+        mask[:, 5] = windowed(z > 1, 5, 4) | windowed(z < -1, 5, 4)
+    # Rule 7: 15 consecutive within 1 sigma (both sides)
+    if 7 in enabled_rules:
+        mask[:, 6] = windowed(np.abs(z) < 1, 15, 15)
+    # Rule 8: 8 consecutive outside 1 sigma (either side)
+    if 8 in enabled_rules:
+        mask[:, 7] = windowed(np.abs(z) > 1, 8, 8)
+    return mask
+
+
 def detect_western_rules(values: List[float], cl: float, sigma: float, enabled_rules: List[int]) -> List[Tuple[int, int]]:
     """
-    返回 (index, rule_id) 列表。
-    规则参考：1~8 西电规则；实现为简化滑窗逻辑。
+    返回 (index, rule_id) 列表，按索引、规则号升序。
+    规则参考：1~8 西电规则；基于 western_rule_mask 向量化判定。
     """
     if sigma <= 0:
         return []
 
-    z = [(v - cl) / sigma for v in values]
-    anomalies: List[Tuple[int, int]] = []
-    n = len(values)
+    arr = np.asarray(values, dtype=float)
+    z = (arr - cl) / sigma
+    # 同一索引可能触发多规则，保留全部
+    idx, rule_col = np.nonzero(western_rule_mask(arr, z, enabled_rules))
+    return [(int(i), int(r) + 1) for i, r in zip(idx, rule_col)]
+
+
+# EWMA / CUSUM 默认参数（对 1σ 左右的小幅持续偏移敏感）
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+CUSUM_CHUNK = 1 << 16
 
-    def add(idx: int, rule_id: int):
-        anomalies.append((idx, rule_id))
-
-    for i in range(n):
-        zi = z[i]
-        # Rule 1: 1 point beyond 3 sigma
-        if 1 in enabled_rules and abs(zi) > 3:
-            add(i, 1)
-
-        # Rule 2: 9 consecutive on same side
-        if 2 in enabled_rules and i >= 8:
-            window = z[i - 8 : i + 1]
-            if all(v > 0 for v in window) or all(v < 0 for v in window):
-                add(i, 2)
-
-        # Rule 3: 6 points in a row steadily increasing or decreasing
-        if 3 in enabled_rules and i >= 5:
-            window = values[i - 5 : i + 1]
-            if all(window[j] > window[j - 1] for j in range(1, 6)) or all(
-                window[j] < window[j - 1] for j in range(1, 6)
-            ):
-                add(i, 3)
-
-        # Rule 4: 14 points alternating up and down
-        if 4 in enabled_rules and i >= 13:
-            window = values[i - 13 : i + 1]
-            if all((window[j] - window[j - 1]) * (window[j - 1] - window[j - 2]) < 0 for j in range(2, 14)):
-                add(i, 4)
-
-        # Rule 5: 2 of 3 consecutive beyond 2 sigma (same side)
-        if 5 in enabled_rules and i >= 2:
-            window = z[i - 2 : i + 1]
-            if sum(1 for v in window if v > 2) >= 2 or sum(1 for v in window if v < -2) >= 2:
-                add(i, 5)
-
-        # Rule 6: 4 of 5 consecutive beyond 1 sigma (same side)
-        if 6 in enabled_rules and i >= 4:
-            window = z[i - 4 : i + 1]
-            if sum(1 for v in window if v > 1) >= 4 or sum(1 for v in window if v < -1) >= 4:
-                add(i, 6)
-
-        # Rule 7: 15 consecutive within 1 sigma (both sides)
-        if 7 in enabled_rules and i >= 14:
-            window = z[i - 14 : i + 1]
-            if all(abs(v) < 1 for v in window):
-                add(i, 7)
-
-        # Rule 8: 8 consecutive outside 1 sigma (either side)
-        if 8 in enabled_rules and i >= 7:
-            window = z[i - 7 : i + 1]
-            if all(abs(v) > 1 for v in window):
-                add(i, 8)
-
-    # 去重: 同一索引可能触发多规则，保留全部
-    return anomalies
+
+def _moving_range_sigma(values: np.ndarray) -> float:
+    """移动极差法估计短期 sigma：MR̄ / d2（n=2）。"""
+    if len(values) < 2:
+        return 0.0
+    return float(np.mean(np.abs(np.diff(values)))) / d2_TABLE[2]
+
+
+def ewma_filter(values: np.ndarray, lam: float, z0: float) -> np.ndarray:
+    """
+    EWMA 递推 z_i = λ·x_i + (1-λ)·z_{i-1}，以 lfilter 一次完成。
+    z0 为起始状态（首次计算取目标均值，续算时取上次末值）。
+    """
+    z, _ = lfilter([lam], [1.0, lam - 1.0], values, zi=[(1.0 - lam) * z0])
+    return z
+
+
+def compute_ewma_limits(
+    values: List[float],
+    lam: float = EWMA_LAMBDA,
+    L: float = EWMA_L,
+    state: Dict[str, float] | None = None,
+) -> Dict[str, object]:
+    """
+    EWMA 控制图：CL=目标均值，σ 用移动极差法估计，
+    第 i 点控制限 CL ± L·σ·sqrt(λ/(2-λ)·(1-(1-λ)^{2i}))，ucl/lcl 为渐近值。
+    - ucl_series/lcl_series 只保留尚未收敛到渐近值的起始段
+    - 传入上次返回的 state 可只对新追加的数据续算
+    """
+    x = np.asarray(values, dtype=float)
+    if state:
+        cl, sigma, z_prev, start = float(state["cl"]), float(state["sigma"]), float(state["z"]), int(state["n"])
+        lam, L = float(state.get("lam", lam)), float(state.get("L", L))
+    else:
+        cl, sigma, start = float(np.mean(x)), _moving_range_sigma(x), 0
+        z_prev = cl
+
+    z = ewma_filter(x, lam, z_prev)
+    i = np.arange(start + 1, start + len(x) + 1, dtype=float)
+    asym = L * sigma * sqrt(lam / (2 - lam))
+    width = L * sigma * np.sqrt(lam / (2 - lam) * (1 - (1 - lam) ** (2 * i)))
+    ucl_i = cl + width
+    lcl_i = cl - width
+    if sigma > 0:
+        signals = np.nonzero((z > ucl_i) | (z < lcl_i))[0]
+    else:
+        signals = np.array([], dtype=np.int64)
+    warmup = int(np.count_nonzero(width < asym * (1 - 1e-3)))
+
+    return {
+        "cl": cl,
+        "ucl": cl + asym,
+        "lcl": cl - asym,
+        "sigma": sigma,
+        "chart_series": z,
+        "signals": signals,
+        "ucl_series": ucl_i[:warmup],
+        "lcl_series": lcl_i[:warmup],
+        "state": {"cl": cl, "sigma": sigma, "z": float(z[-1]) if len(z) else z_prev, "n": start + len(x), "lam": lam, "L": L},
+    }
+
+
+def cusum_kernel(d: np.ndarray, c0: float = 0.0, chunk: int = CUSUM_CHUNK) -> np.ndarray:
+    """
+    表格 CUSUM 递推 C_i = max(0, C_{i-1} + d_i) 的分块向量化实现。
+    块内 C_i = S_i - min(0, min_{j<=i} S_j)（S 为自 c0 起的累加和）；
+    块间传递末状态，累加和的舍入误差不会跨块累积。
+    """
+    d = np.asarray(d, dtype=float)
+    out = np.empty(len(d))
+    c = float(c0)
+    for lo in range(0, len(d), chunk):
+        s = c + np.cumsum(d[lo : lo + chunk])
+        out[lo : lo + len(s)] = s - np.minimum(np.minimum.accumulate(s), 0.0)
+        c = float(out[lo + len(s) - 1])
+    return out
+
+
+def compute_cusum_limits(
+    values: List[float],
+    k: float = CUSUM_K,
+    h: float = CUSUM_H,
+    state: Dict[str, float] | None = None,
+) -> Dict[str, object]:
+    """
+    表格 CUSUM 控制图：目标值 μ0=均值，K=k·σ，H=h·σ（σ 用移动极差法估计）。
+    C⁺_i = max(0, C⁺_{i-1} + x_i - (μ0+K))，C⁻_i = max(0, C⁻_{i-1} + (μ0-K) - x_i)，
+    任一超过 H 即报警。chart_series 为 C⁺，lower_series 为 -C⁻；传入 state 可续算。
+    """
+    x = np.asarray(values, dtype=float)
+    if state:
+        target, sigma = float(state["target"]), float(state["sigma"])
+        cp0, cm0, start = float(state["c_plus"]), float(state["c_minus"]), int(state["n"])
+        k, h = float(state.get("k", k)), float(state.get("h", h))
+    else:
+        target, sigma = float(np.mean(x)), _moving_range_sigma(x)
+        cp0 = cm0 = 0.0
+        start = 0
+
+    K = k * sigma
+    H = h * sigma
+    upper = cusum_kernel(x - (target + K), cp0)
+    lower = cusum_kernel((target - K) - x, cm0)
+    if sigma > 0:
+        signals = np.nonzero((upper > H) | (lower > H))[0]
+    else:
+        signals = np.array([], dtype=np.int64)
+
+    return {
+        "cl": 0.0,
+        "ucl": H,
+        "lcl": -H,
+        "sigma": sigma,
+        "target": target,
+        "chart_series": upper,
+        "lower_series": -lower,
+        "signals": signals,
+        "state": {
+            "target": target,
+            "sigma": sigma,
+            "c_plus": float(upper[-1]) if len(upper) else cp0,
+            "c_minus": float(lower[-1]) if len(lower) else cm0,
+            "n": start + len(x),
+            "k": k,
+            "h": h,
+        },
+    }
 
 
 def compute_limits(chart_type: str, values: List[float], subgroup_size: int = 5, sample_sizes: List[int] | None = None) -> Dict[str, float]:
     """
     分发控制限计算；未覆盖的图型回退 IX。
     chart_series: 用于规则检测的序列（例如 Xbar-R 使用子组均值）。
+    EWMA/CUSUM 另返回 signals（超出控制限的索引），不再套用西电规则。
     """
     chart_type = chart_type.upper()
     if chart_type in ("XBAR-R", "XBAR_R", "XBAR"):
@@ -277,7 +438,94 @@ def compute_limits(chart_type: str, values: List[float], subgroup_size: int = 5,
         return compute_c_limits(values)
     if chart_type == "U":
         return compute_u_limits(values, sample_size=subgroup_size, sample_sizes=sample_sizes)
+    if chart_type == "EWMA":
+        return compute_ewma_limits(values)
+    if chart_type == "CUSUM":
+        return compute_cusum_limits(values)
     # 默认 IX-MR
     base = compute_basic_limits(values)
     base["chart_series"] = values
     return base
+
+
+def _stratified_chunk_counts(
+    values: np.ndarray,
+    z: np.ndarray,
+    position: np.ndarray,
+    codes: np.ndarray,
+    n_streams: int,
+    enabled_rules: List[int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """对按流排序后的一段连续数据做规则判定，返回 (各流异常点数, 各流各规则触发数)。"""
+    mask = western_rule_mask(values, z, enabled_rules, position)
+    anomaly_counts = np.bincount(codes[mask.any(axis=1)], minlength=n_streams)
+    rule_counts = np.stack([np.bincount(codes[mask[:, r]], minlength=n_streams) for r in range(8)], axis=1)
+    return anomaly_counts, rule_counts
+
+
+def compute_stratified_limits(
+    values: np.ndarray,
+    codes: np.ndarray,
+    n_streams: int,
+    enabled_rules: List[int],
+    parallel_threshold: int = 200_000,
+    max_workers: int | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    分层（多数据流）IX 控制限与西电规则批量计算。
+    - values/codes 等长，codes 为 0..n_streams-1 的流编号（来自一次 factorize），流内保持原始顺序
+    - 各流 CL=均值，Sigma=总体标准差，UCL/LCL = CL ± 3*Sigma，全部以 bincount 一次算出
+    - 数据量超过 parallel_threshold 时按流边界切块，多线程并行判定规则
+    返回各流的 n、cl、sigma、ucl、lcl、anomaly_count 以及 rule_counts（形状 (n_streams, 8)）。
+    """
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes, dtype=np.int64)
+    order = np.argsort(codes, kind="stable")
+    v = values[order]
+    c = codes[order]
+
+    counts = np.bincount(c, minlength=n_streams)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = np.arange(len(v)) - starts[c]
+
+    safe_counts = np.maximum(counts, 1)
+    cl = np.bincount(c, weights=v, minlength=n_streams) / safe_counts
+    sigma = np.sqrt(np.bincount(c, weights=(v - cl[c]) ** 2, minlength=n_streams) / safe_counts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(sigma[c] > 0, (v - cl[c]) / sigma[c], 0.0)
+    # 与单流一致：sigma 为 0 的流不做规则判定
+    active_rules = [r for r in enabled_rules if 1 <= r <= 8]
+
+    if len(v) <= parallel_threshold or n_streams < 2:
+        anomaly_counts, rule_counts = _stratified_chunk_counts(v, z, position, c, n_streams, active_rules)
+    else:
+        workers = max_workers or min(8, os.cpu_count() or 1)
+        # 在流边界处切块，保证滑窗不跨块
+        targets = np.arange(1, workers) * (len(v) / workers)
+        cut_streams = np.unique(np.searchsorted(starts, targets))
+        bounds = [0] + [int(starts[s]) for s in cut_streams if 0 < s < n_streams] + [len(v)]
+        bounds = sorted(set(bounds))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    _stratified_chunk_counts,
+                    v[lo:hi], z[lo:hi], position[lo:hi], c[lo:hi], n_streams, active_rules,
+                )
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            parts = [f.result() for f in futures]
+        anomaly_counts = sum(p[0] for p in parts)
+        rule_counts = sum(p[1] for p in parts)
+
+    flat = sigma <= 0
+    anomaly_counts = np.where(flat, 0, anomaly_counts)
+    rule_counts = np.where(flat[:, None], 0, rule_counts)
+    return {
+        "n": counts,
+        "cl": cl,
+        "sigma": sigma,
+        "ucl": cl + 3 * sigma,
+        "lcl": cl - 3 * sigma,
+        "anomaly_count": anomaly_counts,
+        "rule_counts": rule_counts,
+    }
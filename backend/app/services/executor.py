@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing as mp
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from multiprocessing.connection import wait as wait_connections
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import record, timed
+from app.core.settings import settings
+from app.services.engine.methods import EngineResult
+from app.services.planner import Plan
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisTimeout(TimeoutError):
+    pass
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+_POLL_INTERVAL_S = 0.05
+_WORKER_FRAME_CACHE = 4
+
+
+def _worker_main(conn: Any) -> None:
+    """Worker loop: receive (snapshot, method, params), run the plan, send back ("ok"|"error", payload)."""
+    import pandas as pd
+
+    from app.services.planner import run_plan
+    from app.services.storage.snapshots import load_snapshot
+
+    # snapshots are cached across tasks; copy-on-write keeps one analysis from leaking into the next
+    pd.set_option("mode.copy_on_write", True)
+    frames: OrderedDict[str, pd.DataFrame] = OrderedDict()
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            return
+        snapshot, method, params = msg
+        try:
+            df = frames.get(snapshot)
+            if df is None:
+                df = load_snapshot(snapshot)
+                frames[snapshot] = df
+                while len(frames) > _WORKER_FRAME_CACHE:
+                    frames.popitem(last=False)
+            frames.move_to_end(snapshot)
+            conn.send(("ok", run_plan(df, Plan(method=method, params=params))))
+        except Exception as exc:
+            try:
+                pickle.loads(pickle.dumps(exc))
+            except Exception:
+                exc = RuntimeError(f"{type(exc).__name__}: {exc}")
+            conn.send(("error", exc))
+
+
+class _Worker:
+    def __init__(self, ctx: Any) -> None:
+        self.conn, child = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(target=_worker_main, args=(child,), name="analysis-worker", daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self, *, kill: bool) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout=2)
+        except Exception:
+            logger.debug("worker_stop_failed", exc_info=True)
+        finally:
+            self.conn.close()
+
+
+class AnalysisExecutor:
+    """
+    Runs engine plans in a pool of long-lived worker processes so CPU-bound pandas/scipy
+    work does not hold the GIL of the API process. A task that exceeds its wall-clock
+    timeout or whose caller cancels has its worker killed and replaced lazily.
+    Frames reach workers as on-disk snapshots (see storage.snapshots), not pickles.
+    max_workers <= 0 runs plans inline in the calling thread (no timeout enforcement).
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        default_timeout_s: float,
+        method_timeouts: dict[str, float] | None = None,
+        start_method: str = "spawn",
+    ) -> None:
+        self.max_workers = int(max_workers)
+        self.default_timeout_s = float(default_timeout_s)
+        self.method_timeouts = dict(method_timeouts or {})
+        self._ctx = mp.get_context(start_method)
+        self._cond = threading.Condition()
+        self._idle: list[_Worker] = []
+        self._spawned = 0
+        self._queued = 0
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "cancelled": 0, "restarts": 0}
+
+    def timeout_for(self, method: str) -> float:
+        return float(self.method_timeouts.get(method, self.default_timeout_s))
+
+    def start(self) -> None:
+        """Pre-spawn the pool so the first requests do not pay the worker import cost."""
+        with self._cond:
+            while self._spawned < self.max_workers:
+                self._idle.append(_Worker(self._ctx))
+                self._spawned += 1
+
+    def shutdown(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+        for w in idle:
+            w.stop(kill=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "workers": self._spawned,
+                "busy": self._spawned - len(self._idle),
+                "idle": len(self._idle),
+                "queued": self._queued,
+                **self._counters,
+            }
+
+    def _count(self, key: str) -> None:
+        with self._cond:
+            self._counters[key] += 1
+
+    def _acquire(self, cancel: threading.Event | None) -> _Worker:
+        with self._cond:
+            self._queued += 1
+            try:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        self._counters["cancelled"] += 1
+                        raise AnalysisCancelled("client disconnected while queued")
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._spawned < self.max_workers:
+                        self._spawned += 1
+                        break
+                    self._cond.wait(timeout=_POLL_INTERVAL_S * 4)
+            finally:
+                self._queued -= 1
+        try:
+            return _Worker(self._ctx)
+        except Exception:
+            with self._cond:
+                self._spawned -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker: _Worker, *, healthy: bool) -> None:
+        if healthy and worker.process.is_alive():
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+            return
+        worker.stop(kill=True)
+        with self._cond:
+            self._spawned -= 1
+            self._counters["restarts"] += 1
+            self._cond.notify()
+
+    def execute(
+        self,
+        snapshot: str,
+        plan: Plan,
+        *,
+        cancel: threading.Event | None = None,
+        timeout_s: float | None = None,
+    ) -> EngineResult:
+        """Blocking call; raises AnalysisTimeout / AnalysisCancelled or re-raises the engine error."""
+        self._count("submitted")
+        if self.max_workers <= 0:
+            from app.services.planner import run_plan
+            from app.services.storage.snapshots import load_snapshot
+
+            try:
+                with timed("run_plan", method=plan.method):
+                    result = run_plan(load_snapshot(snapshot), plan)
+            except Exception:
+                self._count("failed")
+                raise
+            self._count("completed")
+            return result
+
+        limit = timeout_s if timeout_s is not None else self.timeout_for(plan.method)
+        with timed("analysis_queue"):
+            worker = self._acquire(cancel)
+        healthy = False
+        started = time.perf_counter()
+        try:
+            worker.conn.send((snapshot, plan.method, plan.params))
+            deadline = time.monotonic() + limit
+            while not wait_connections([worker.conn, worker.process.sentinel], timeout=_POLL_INTERVAL_S):
+                if cancel is not None and cancel.is_set():
+                    self._count("cancelled")
+                    raise AnalysisCancelled("client disconnected")
+                if time.monotonic() > deadline:
+                    self._count("timeouts")
+                    raise AnalysisTimeout(f"分析超时：{plan.method} 超过 {limit:g} 秒未完成")
+            if not worker.conn.poll():
+                raise RuntimeError("分析进程异常退出")
+            status, payload = worker.conn.recv()
+            healthy = True
+        except (AnalysisCancelled, AnalysisTimeout):
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            self._release(worker, healthy=healthy)
+            record("run_plan", time.perf_counter() - started, method=plan.method)
+
+        if status == "error":
+            self._count("failed")
+            raise payload
+        self._count("completed")
+        return payload
+
+    async def run(
+        self,
+        snapshot: str,
+        plan: Plan,
+        *,
+        is_cancelled: Callable[[], Awaitable[bool]] | None = None,
+        timeout_s: float | None = None,
+    ) -> EngineResult:
+        """Async wrapper: waits in a thread and polls is_cancelled (e.g. Request.is_disconnected)."""
+        cancel = threading.Event()
+        task = asyncio.ensure_future(
+            run_in_threadpool(self.execute, snapshot, plan, cancel=cancel, timeout_s=timeout_s)
+        )
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=_POLL_INTERVAL_S * 5)
+                if done:
+                    return task.result()
+                if is_cancelled is not None and await is_cancelled():
+                    cancel.set()
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+
+analysis_executor = AnalysisExecutor(
+    max_workers=settings.analysis_workers,
+    default_timeout_s=settings.analysis_timeout_s,
+    method_timeouts=settings.analysis_method_timeout_map,
+    start_method=settings.analysis_start_method,
+)
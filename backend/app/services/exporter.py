@@ -3,13 +3,18 @@ from __future__ import annotations
 import base64
 import io
 import logging
+import zipfile
+from collections.abc import Callable, Iterator
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Any
 
 from docx import Document
 from docx.shared import Pt, RGBColor
 
 from app.db.models import SessionModel
+from app.services.charts import chart_renderer, chart_title, control_chart_series
+from app.services.sessions import load_visualizations
 
 logger = logging.getLogger(__name__)
 
@@ -28,11 +33,12 @@ def _to_iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def _collect_analyses(session: SessionModel) -> list[dict[str, Any]]:
+def _collect_analyses(session: SessionModel, *, with_charts: bool = False) -> list[dict[str, Any]]:
+    """Assistant analyses in order; chart payloads are read from the blob store only if asked for."""
     results: list[dict[str, Any]] = []
     for m in session.messages:
         if m.role == "assistant" and m.analysis:
-            results.append(m.analysis)
+            results.append({**m.analysis, "visualizations": load_visualizations(m)} if with_charts else m.analysis)
     return results
 
 
@@ -181,7 +187,7 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
     suggestions = a.get("suggestions", [])
     vis = (a.get("visualizations") or [{}])[0] if a.get("visualizations") else {}
     chart_data = vis.get("data") or {}
-    points = chart_data.get("points", [])
+    _, _, anomaly_pts, n_points = control_chart_series(chart_data)
     ucl = chart_data.get("ucl")
     cl = chart_data.get("cl")
     lcl = chart_data.get("lcl")
@@ -191,11 +197,9 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
     # Extract Y variable from title like "IX-MR 控制图 — Transactional CT"
     y_var = chart_title.split("—")[-1].strip() if "—" in chart_title else "—"
 
-    anomaly_pts = [p for p in points if p.get("is_anomaly")]
     violated_rules: set[int] = set()
-    for p in anomaly_pts:
-        for r in (p.get("rule_violated") or []):
-            violated_rules.add(r)
+    for _x, _y, rules in anomaly_pts:
+        violated_rules.update(rules)
 
     rule_desc = {
         1: "1点超出3σ控制限",
@@ -214,7 +218,7 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
     # 1 数据识别
     lines.append("**步骤一 · 数据识别**")
     lines.append(f"- Y 变量：{y_var}")
-    lines.append(f"- 样本量：{len(points)} 个数据点")
+    lines.append(f"- 样本量：{n_points} 个数据点")
     lines.append("- 数据类型：连续型（计量数据）")
     if data_summary:
         lines.append(f"- 原始数据集：{data_summary.get('rows', '-')} 行 × {data_summary.get('columns', '-')} 列")
@@ -231,6 +235,8 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
         "NP": "不合格品数数据，适用于 NP 控制图",
         "C": "缺陷数数据（固定检验单位），适用于 C 控制图",
         "U": "单位缺陷数数据（可变检验单位），适用于 U 控制图",
+        "EWMA": "指数加权移动平均，适用于检测小幅持续偏移",
+        "CUSUM": "表格累积和，适用于检测小幅持续偏移",
     }
     lines.append(f"- 选型依据：{type_reasons.get(chart_type, f'根据数据特征选择 {chart_type} 控制图')}")
     lines.append("")
@@ -250,7 +256,7 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
 
     # 4 异常检测
     lines.append("**步骤四 · 异常检测（西联规则）**")
-    lines.append(f"- 异常点数：{len(anomaly_pts)} / {len(points)}")
+    lines.append(f"- 异常点数：{len(anomaly_pts)} / {n_points}")
     if violated_rules:
         for r in sorted(violated_rules):
             lines.append(f"- 规则 {r}：{rule_desc.get(r, f'自定义规则 {r}')}")
@@ -277,161 +283,31 @@ def _spc_process_md(a: dict[str, Any], index: int, data_summary: dict[str, Any]
     return lines
 
 
-def _safe_title(title: str | None, fallback: str) -> str:
-    if title and str(title).strip():
-        return str(title).strip()
-    return fallback
+def _iter_chart_pngs(analyses: list[dict[str, Any]]) -> Iterator[bytes | None]:
+    """Every chart of the report in one pool batch, yielded in report order as each finishes."""
+    return chart_renderer.iter_render([chart for a in analyses for chart in (a.get("visualizations") or [])])
 
 
-def _render_chart_png(config: dict[str, Any]) -> bytes | None:
-    try:
-        import matplotlib
-
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-        import matplotlib.font_manager as fm
-
-        # Configure Chinese font support
-        _zh_fonts = ["Microsoft YaHei", "SimHei", "WenQuanYi Micro Hei", "Noto Sans CJK SC", "Arial Unicode MS"]
-        _found_font = None
-        for fname in _zh_fonts:
-            matches = fm.findfont(fname, fallback_to_default=False)
-            if matches and "LastResort" not in matches:
-                _found_font = fname
-                break
-        if _found_font:
-            plt.rcParams["font.sans-serif"] = [_found_font] + plt.rcParams.get("font.sans-serif", [])
-        plt.rcParams["axes.unicode_minus"] = False
-    except Exception:
-        return None
-
-    chart_type = config.get("type")
-    title = _safe_title(config.get("title"), "Chart")
-    data = config.get("data") or {}
-
-    fig, ax = plt.subplots(figsize=(6, 3.5))
-    ax.set_title(title)
-
-    def _maybe_sample(points: list[list[float]], max_n: int = 4000) -> list[list[float]]:
-        if len(points) <= max_n:
-            return points
-        step = max(1, len(points) // max_n)
-        return points[::step]
-
-    try:
-        if chart_type in {"scatter", "residual"}:
-            points = data.get("points", [])
-            points = _maybe_sample(points)
-            xs = [p[0] for p in points]
-            ys = [p[1] for p in points]
-            ax.scatter(xs, ys, s=12, alpha=0.7)
-            if config.get("xLabel"):
-                ax.set_xlabel(str(config.get("xLabel")))
-            if config.get("yLabel"):
-                ax.set_ylabel(str(config.get("yLabel")))
-
-        elif chart_type == "box":
-            groups = data.get("groups", [])
-            values = data.get("values", [])
-            if groups and values:
-                ax.boxplot(values, labels=[str(g) for g in groups], showfliers=False)
-                if config.get("xLabel"):
-                    ax.set_xlabel(str(config.get("xLabel")))
-                if config.get("yLabel"):
-                    ax.set_ylabel(str(config.get("yLabel")))
-
-        elif chart_type == "bar":
-            table = data.get("table")
-            if table and isinstance(table, dict):
-                series_names = list(table.keys())
-                row_set = set()
-                for col in series_names:
-                    rows = table.get(col, {}) or {}
-                    row_set.update(rows.keys())
-                categories = list(row_set)
-                bottoms = [0] * len(categories)
-                for col in series_names:
-                    vals = [int((table.get(col, {}) or {}).get(r, 0)) for r in categories]
-                    ax.bar(categories, vals, bottom=bottoms, label=str(col))
-                    bottoms = [b + v for b, v in zip(bottoms, vals)]
-                ax.legend(fontsize=7)
-            else:
-                categories = data.get("categories", [])
-                values = data.get("values", [])
-                ax.bar(categories, values)
-            if config.get("xLabel"):
-                ax.set_xlabel(str(config.get("xLabel")))
-            if config.get("yLabel"):
-                ax.set_ylabel(str(config.get("yLabel")))
-
-        elif chart_type == "distribution":
-            bins = data.get("bins", [])
-            counts = data.get("counts", [])
-            if bins and counts:
-                labels = [f"{b[0]}-{b[1]}" if isinstance(b, list) else str(b) for b in bins]
-                ax.bar(labels, counts)
-                ax.tick_params(axis="x", labelrotation=45)
-            if config.get("xLabel"):
-                ax.set_xlabel(str(config.get("xLabel")))
-            if config.get("yLabel"):
-                ax.set_ylabel(str(config.get("yLabel")))
-
-        elif chart_type == "control_chart":
-            points = data.get("points", [])
-            ucl = data.get("ucl")
-            cl = data.get("cl")
-            lcl = data.get("lcl")
-            chart_subtype = data.get("chart_type", "")
-
-            xs = [p.get("x", i) for i, p in enumerate(points)]
-            ys = [p.get("y", 0) for p in points]
-
-            # Normal points line
-            ax.plot(xs, ys, marker="o", markersize=4, linewidth=1, color="#3498db", label="数据", zorder=2)
-
-            # Anomaly points
-            anom_xs = [p.get("x", i) for i, p in enumerate(points) if p.get("is_anomaly")]
-            anom_ys = [p.get("y", 0) for p in points if p.get("is_anomaly")]
-            if anom_xs:
-                ax.scatter(anom_xs, anom_ys, color="#e74c3c", s=50, zorder=3, label="异常点")
-
-            # Control limits
-            if ucl is not None:
-                ax.axhline(y=ucl, color="#e74c3c", linestyle="--", linewidth=1.2, label=f"UCL={ucl:.2f}")
-            if cl is not None:
-                ax.axhline(y=cl, color="#2ecc71", linestyle="-", linewidth=1.5, label=f"CL={cl:.2f}")
-            if lcl is not None:
-                ax.axhline(y=lcl, color="#e74c3c", linestyle="--", linewidth=1.2, label=f"LCL={lcl:.2f}")
-
-            ax.set_xlabel("样本序号")
-            ax.set_ylabel(chart_subtype or "值")
-            ax.legend(fontsize=7, loc="upper right")
-
-        else:
-            ax.text(0.5, 0.5, f"Unsupported chart type: {chart_type}", ha="center", va="center")
-    except Exception:
-        plt.close(fig)
-        return None
-
-    buf = io.BytesIO()
-    fig.tight_layout()
-    fig.savefig(buf, format="png", dpi=150)
-    plt.close(fig)
-    return buf.getvalue()
+def has_charts(session: SessionModel) -> bool:
+    """Whether any analysis in the session carries charts, without reading the chart blobs."""
+    return any(
+        m.visualization_count or (m.analysis or {}).get("visualizations")
+        for m in session.messages
+        if m.role == "assistant"
+    )
 
 
 # =========================================================================
 # Markdown
 # =========================================================================
 
-def build_markdown_report(
+def _markdown_report(
     session: SessionModel,
     include_charts: bool,
-    llm_config: dict | None = None,
-) -> tuple[str, list[tuple[str, bytes]]]:
-    """Return (markdown_text, [(image_filename, png_bytes), ...])."""
+    add_image: Callable[[str, bytes], None],
+) -> str:
+    """Markdown text; each chart PNG is passed to add_image(file_name, png) as soon as it is rendered."""
     lines: list[str] = []
-    images: list[tuple[str, bytes]] = []
 
     lines.append("# 分析报告")
     lines.append("")
@@ -439,7 +315,7 @@ def build_markdown_report(
         lines.append(f"> 数据文件：{session.file_name}　|　生成时间：{_to_iso(session.created_at)}")
         lines.append("")
 
-    analyses = _collect_analyses(session)
+    analyses = _collect_analyses(session, with_charts=include_charts)
 
     # ── 分析结论 ──
     if session.report_conclusion:
@@ -456,6 +332,7 @@ def build_markdown_report(
         lines.append("## 图表")
         lines.append("")
         img_idx = 0
+        pngs = _iter_chart_pngs(analyses)
         for i, a in enumerate(analyses, 1):
             charts = a.get("visualizations") or []
             if not charts:
@@ -464,19 +341,57 @@ def build_markdown_report(
                 lines.append(f"### 分析 {i}")
                 lines.append("")
             for j, chart in enumerate(charts, 1):
-                title = _safe_title(chart.get("title"), f"图表 {i}.{j}")
+                title = chart_title(chart.get("title"), f"图表 {i}.{j}")
                 lines.append(f"**{title}**")
-                png = _render_chart_png(chart)
+                png = next(pngs)
                 if png:
                     img_idx += 1
                     img_name = f"chart-{img_idx}.png"
-                    images.append((img_name, png))
+                    add_image(img_name, png)
                     lines.append(f"![{title}]({img_name})")
                 else:
                     lines.append("（图表渲染失败）")
                 lines.append("")
 
-    return "\n".join(lines).strip() + "\n", images
+    return "\n".join(lines).strip() + "\n"
+
+
+def build_markdown_report(
+    session: SessionModel,
+    include_charts: bool,
+    llm_config: dict | None = None,
+) -> tuple[str, list[tuple[str, bytes]]]:
+    """Return (markdown_text, [(image_filename, png_bytes), ...])."""
+    images: list[tuple[str, bytes]] = []
+    md_text = _markdown_report(session, include_charts, lambda name, png: images.append((name, png)))
+    return md_text, images
+
+
+def write_markdown_report(session: SessionModel, include_charts: bool, path: Path) -> bool:
+    """
+    Write the report to `path`: a zip of report.md plus chart PNGs when include_charts is
+    set, plain Markdown otherwise. Each PNG goes into the zip as soon as it is rendered, so
+    the images are never all held in memory; PNGs are already compressed and are stored
+    as-is. If no chart renders, `path` gets plain Markdown after all. Returns whether it
+    holds a zip.
+    """
+    if include_charts:
+        added = 0
+
+        def add_image(name: str, png: bytes) -> None:
+            nonlocal added
+            zf.writestr(name, png, compress_type=zipfile.ZIP_STORED)
+            added += 1
+
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            md_text = _markdown_report(session, True, add_image)
+            if added:
+                zf.writestr("report.md", md_text.encode("utf-8"))
+                return True
+    else:
+        md_text = _markdown_report(session, False, lambda name, png: None)
+    path.write_text(md_text, encoding="utf-8")
+    return False
 
 
 # =========================================================================
@@ -496,18 +411,14 @@ def _add_step(doc: Document, title: str, content: str, bold_content: str | None
         p.add_run(content)
 
 
-def build_docx_report(
-    session: SessionModel,
-    include_charts: bool,
-    llm_config: dict | None = None,
-) -> bytes:
+def _docx_report(session: SessionModel, include_charts: bool) -> Document:
     doc = Document()
 
     doc.add_heading("分析报告", level=0)
     if session.file_name:
         doc.add_paragraph(f"数据文件：{session.file_name}　|　生成时间：{_to_iso(session.created_at)}")
 
-    analyses = _collect_analyses(session)
+    analyses = _collect_analyses(session, with_charts=include_charts)
 
     # ── 分析结论 ──
     if session.report_conclusion:
@@ -521,6 +432,7 @@ def build_docx_report(
     # ── 图表 ──
     if include_charts and analyses:
         doc.add_heading("图表", level=1)
+        pngs = _iter_chart_pngs(analyses)
         for i, a in enumerate(analyses, 1):
             charts = a.get("visualizations") or []
             if not charts:
@@ -528,14 +440,30 @@ def build_docx_report(
             if len(analyses) > 1:
                 doc.add_heading(f"分析 {i}", level=2)
             for j, chart in enumerate(charts, 1):
-                title = _safe_title(chart.get("title"), f"图表 {i}.{j}")
+                title = chart_title(chart.get("title"), f"图表 {i}.{j}")
                 doc.add_paragraph(title)
-                png = _render_chart_png(chart)
+                png = next(pngs)
                 if png:
                     doc.add_picture(io.BytesIO(png), width=Pt(420))
                 else:
                     doc.add_paragraph("图表渲染失败。")
+    return doc
+
 
+def build_docx_report(
+    session: SessionModel,
+    include_charts: bool,
+    llm_config: dict | None = None,
+) -> bytes:
     buf = io.BytesIO()
-    doc.save(buf)
+    _docx_report(session, include_charts).save(buf)
     return buf.getvalue()
+
+
+def write_docx_report(session: SessionModel, include_charts: bool, path: Path) -> None:
+    """
+    Save the report straight to `path` instead of through an in-memory copy. python-docx
+    still keeps every added picture in memory until save(), so a docx with charts peaks
+    at roughly the size of its PNGs; the Markdown zip does not.
+    """
+    _docx_report(session, include_charts).save(str(path))
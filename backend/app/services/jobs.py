@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.core.settings import settings
+from app.services.executor import AnalysisCancelled, AnalysisTimeout
+
+logger = logging.getLogger(__name__)
+
+
+# queued -> running -> succeeded | failed | cancelled
+_ACTIVE = ("queued", "running")
+
+
+def _iso(ts: float | None) -> str | None:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+@dataclass
+class Job:
+    job_id: str
+    session_id: str
+    key: str
+    status: str = "queued"
+    stage: str = "queued"
+    progress: float = 0.0
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    error_status: int | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status not in _ACTIVE
+
+    def report(self, stage: str, progress: float) -> None:
+        self.stage = stage
+        self.progress = max(self.progress, min(float(progress), 1.0))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "created_at": _iso(self.created_at),
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+        }
+
+
+class JobManager:
+    """
+    In-process registry of background analysis jobs. Jobs run on a small thread pool
+    (the heavy lifting happens in the analysis executor's worker processes); finished
+    jobs are kept for job_retention_s so clients can fetch the result.
+    """
+
+    def __init__(self, max_workers: int, retention_s: float) -> None:
+        self.retention_s = float(retention_s)
+        self._pool = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="analysis-job")
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._active_by_key: dict[str, str] = {}
+
+    def register(self, key: str, session_id: str) -> tuple[Job, bool]:
+        """Return (job, created); an in-flight job with the same key is reused instead of duplicated."""
+        with self._lock:
+            self._prune()
+            existing = self._active_by_key.get(key)
+            if existing is not None:
+                return self._jobs[existing], False
+            job = Job(job_id=str(uuid.uuid4()), session_id=session_id, key=key)
+            self._jobs[job.job_id] = job
+            self._active_by_key[key] = job.job_id
+            return job, True
+
+    def start(self, job: Job, fn: Callable[[Job], dict[str, Any]]) -> None:
+        self._pool.submit(self._run, job, fn)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel.set()
+        return job
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {s: statuses.count(s) for s in ("queued", "running", "succeeded", "failed", "cancelled")}
+
+    def _finish(self, job: Job, status: str) -> None:
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            if self._active_by_key.get(job.key) == job.job_id:
+                del self._active_by_key[job.key]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_s
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and (j.finished_at or 0) < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, fn: Callable[[Job], dict[str, Any]]) -> None:
+        if job.cancel.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job)
+        except AnalysisCancelled:
+            self._finish(job, "cancelled")
+            return
+        except AnalysisTimeout as e:
+            job.error, job.error_status = str(e), 504
+        except HTTPException as e:
+            job.error, job.error_status = str(e.detail), e.status_code
+        except KeyError:
+            job.error, job.error_status = "会话不存在", 404
+        except Exception as e:
+            logger.exception("analysis_job_failed")
+            job.error, job.error_status = str(e), 400
+        else:
+            job.report("done", 1.0)
+            self._finish(job, "succeeded")
+            return
+        self._finish(job, "failed")
+
+
+job_manager = JobManager(max_workers=settings.job_workers, retention_s=settings.job_retention_s)
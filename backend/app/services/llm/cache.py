@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.settings import settings
+from app.db.models import LLMCacheModel
+from app.db.session import SessionLocal
+
+if TYPE_CHECKING:
+    from app.services.llm.client import LLMModelConfig
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(config: LLMModelConfig, system_prompt: str, user_prompt: str) -> str:
+    raw = json.dumps(
+        [(config.provider or "").lower().strip(), config.model, float(config.temperature), system_prompt, user_prompt],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class LLMResponseCache:
+    """
+    Persistent LLM response cache in the application database, so every worker process
+    shares it. Entries expire after ttl_s; past max_entries the least recently used rows
+    are evicted. Sampling (temperature > 0) bypasses the cache unless explicitly allowed;
+    planning calls run at LLM_PLANNING_TEMPERATURE (0 by default) so they are cached, while
+    conclusions keep the configured temperature. Cache errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self, *, enabled: bool, ttl_s: float, max_entries: int, allow_sampling: bool,
+        factory: sessionmaker = SessionLocal,
+    ) -> None:
+        self.factory = factory
+        self.enabled = bool(enabled)
+        self.ttl = timedelta(seconds=float(ttl_s))
+        self.max_entries = max(int(max_entries), 1)
+        self.allow_sampling = bool(allow_sampling)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "bypassed": 0, "evicted": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[key] += n
+
+    def applies_to(self, config: LLMModelConfig) -> bool:
+        if not self.enabled or (float(config.temperature) > 0 and not self.allow_sampling):
+            self._count("bypassed")
+            return False
+        return True
+
+    def get(self, key: str) -> str | None:
+        now = datetime.now(timezone.utc)
+        try:
+            with self.factory() as db:
+                row = db.get(LLMCacheModel, key)
+                if row is None or _utc(row.expires_at) <= now:
+                    self._count("misses")
+                    return None
+                row.hits = (row.hits or 0) + 1
+                row.last_used_at = now
+                response = row.response
+                db.commit()
+        except Exception:
+            logger.warning("llm_cache_get_failed", exc_info=True)
+            return None
+        self._count("hits")
+        return response
+
+    def put(self, key: str, config: LLMModelConfig, response: str) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            with self.factory() as db:
+                db.merge(LLMCacheModel(
+                    key=key,
+                    provider=(config.provider or "").lower().strip(),
+                    model=config.model,
+                    response=response,
+                    hits=0,
+                    created_at=now,
+                    last_used_at=now,
+                    expires_at=now + self.ttl,
+                ))
+                db.flush()
+                evicted = db.execute(delete(LLMCacheModel).where(LLMCacheModel.expires_at <= now)).rowcount or 0
+                excess = db.scalar(select(func.count()).select_from(LLMCacheModel)) - self.max_entries
+                if excess > 0:
+                    oldest = select(LLMCacheModel.key).order_by(LLMCacheModel.last_used_at.asc()).limit(excess)
+                    evicted += db.execute(delete(LLMCacheModel).where(LLMCacheModel.key.in_(oldest))).rowcount or 0
+                db.commit()
+        except Exception:
+            logger.warning("llm_cache_put_failed", exc_info=True)
+            return
+        if evicted:
+            self._count("evicted", evicted)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+llm_cache = LLMResponseCache(
+    enabled=settings.llm_cache_enabled,
+    ttl_s=settings.llm_cache_ttl_s,
+    max_entries=settings.llm_cache_max_entries,
+    allow_sampling=settings.llm_cache_allow_sampling,
+)
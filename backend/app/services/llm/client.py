@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
 from dataclasses import dataclass
+from typing import Any
 
 import httpx
 
+from app.core.metrics import timed
+from app.core.settings import settings
+from app.services.llm.cache import LLMResponseCache, cache_key, llm_cache
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass(frozen=True)
 class LLMModelConfig:
@@ -21,16 +35,34 @@ class LLMError(RuntimeError):
     pass
 
 
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+_LATENCY_WINDOW = 512
+
+
 def _strip_trailing_slash(url: str) -> str:
     return url.rstrip("/")
 
 
-def call_llm_json(
-    *,
-    config: LLMModelConfig,
-    system_prompt: str,
-    user_prompt: str,
-) -> str:
+def _parse_openai(data: dict[str, Any]) -> str:
+    try:
+        return str(data["choices"][0]["message"]["content"])
+    except Exception:
+        raise LLMError(f"Unexpected LLM response: {json.dumps(data)[:200]}")
+
+
+def _parse_claude(data: dict[str, Any]) -> str:
+    try:
+        parts = data.get("content") or []
+        texts = [p.get("text", "") for p in parts if p.get("type") == "text"]
+        return "\n".join([t for t in texts if t]).strip()
+    except Exception:
+        raise LLMError(f"Unexpected Claude response: {json.dumps(data)[:200]}")
+
+
+def _build_request(
+    config: LLMModelConfig, system_prompt: str, user_prompt: str
+) -> tuple[str, str, dict[str, str], dict[str, Any], Callable[[dict[str, Any]], str]]:
+    """Return (base_url, path, headers, payload, parser) for the configured provider."""
     provider = (config.provider or "").lower().strip()
     if not config.api_key:
         raise LLMError("Missing api_key")
@@ -46,7 +78,6 @@ def call_llm_json(
                 base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
             else:
                 base_url = "https://api.openai.com/v1"
-        url = f"{base_url}/chat/completions"
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         payload = {
             "model": config.model,
@@ -58,21 +89,12 @@ def call_llm_json(
                 {"role": "user", "content": user_prompt},
             ],
         }
-        with httpx.Client(timeout=httpx.Timeout(connect=30.0, read=300.0, write=30.0, pool=30.0)) as client:
-            r = client.post(url, headers=headers, json=payload)
-        if r.status_code >= 400:
-            raise LLMError(f"LLM HTTP {r.status_code}: {r.text[:200]}")
-        data = r.json()
-        try:
-            return str(data["choices"][0]["message"]["content"])
-        except Exception:
-            raise LLMError(f"Unexpected LLM response: {json.dumps(data)[:200]}")
+        return base_url, "/chat/completions", headers, payload, _parse_openai
 
     # Anthropic Messages API (Claude)
     if provider == "claude":
         if not base_url:
             base_url = "https://api.anthropic.com"
-        url = f"{base_url}/v1/messages"
         headers = {
             "x-api-key": api_key,
             "anthropic-version": "2023-06-01",
@@ -86,17 +108,250 @@ def call_llm_json(
             "system": system_prompt,
             "messages": [{"role": "user", "content": user_prompt}],
         }
-        with httpx.Client(timeout=httpx.Timeout(connect=30.0, read=300.0, write=30.0, pool=30.0)) as client:
-            r = client.post(url, headers=headers, json=payload)
-        if r.status_code >= 400:
-            raise LLMError(f"LLM HTTP {r.status_code}: {r.text[:200]}")
-        data = r.json()
-        try:
-            parts = data.get("content") or []
-            texts = [p.get("text", "") for p in parts if p.get("type") == "text"]
-            return "\n".join([t for t in texts if t]).strip()
-        except Exception:
-            raise LLMError(f"Unexpected Claude response: {json.dumps(data)[:200]}")
+        return base_url, "/v1/messages", headers, payload, _parse_claude
 
     raise LLMError(f"Unsupported provider: {provider}")
 
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClientPool:
+    """
+    Shared outbound LLM transport: one keep-alive httpx.AsyncClient per (provider, base_url),
+    HTTP/2 when the optional h2 package is installed, jittered exponential retry on 429/5xx
+    and transport errors, a global concurrency semaphore and per-call latency metrics.
+
+    The clients live on a private event loop thread so sync callers (thread-pool routes,
+    the exporter) and async callers share the same connections and limits.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int,
+        max_connections: int,
+        keepalive_expiry_s: float,
+        connect_timeout_s: float,
+        read_timeout_s: float,
+        max_retries: int,
+        retry_backoff_s: float,
+        retry_backoff_max_s: float = 8.0,
+        http2: bool = True,
+        cache: LLMResponseCache | None = None,
+    ) -> None:
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.max_connections = max(int(max_connections), 1)
+        self.keepalive_expiry_s = float(keepalive_expiry_s)
+        self.timeout = httpx.Timeout(connect=connect_timeout_s, read=read_timeout_s, write=30.0, pool=read_timeout_s)
+        self.max_retries = max(int(max_retries), 0)
+        self.retry_backoff_s = float(retry_backoff_s)
+        self.retry_backoff_max_s = float(retry_backoff_max_s)
+        self.http2 = bool(http2) and _http2_available()
+        self.cache = cache
+
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._clients: dict[tuple[str, str], httpx.AsyncClient] = {}
+        self._in_flight = 0
+        self._counters = {"calls": 0, "errors": 0, "retries": 0}
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+    # -- event loop ---------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _run() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    try:
+                        loop.run_forever()
+                    finally:
+                        loop.close()
+
+                self._thread = threading.Thread(target=_run, name="llm-io", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+            clients, self._clients = self._clients, {}
+        if loop is None:
+            return
+
+        async def _aclose() -> None:
+            for client in clients.values():
+                await client.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_aclose(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=5)
+
+    def _client(self, provider: str, base_url: str) -> httpx.AsyncClient:
+        key = (provider, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry_s,
+                ),
+            )
+            self._clients[key] = client
+        return client
+
+    # -- calls ----------------------------------------------------------------
+
+    def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_backoff_max_s)
+            except ValueError:
+                pass
+        # full jitter
+        return random.uniform(0, min(self.retry_backoff_max_s, self.retry_backoff_s * (2**attempt)))
+
+    async def _call(self, config: LLMModelConfig, system_prompt: str, user_prompt: str) -> str:
+        base_url, path, headers, payload, parse = _build_request(config, system_prompt, user_prompt)
+        client = self._client((config.provider or "").lower().strip(), base_url)
+        assert self._semaphore is not None
+
+        async with self._semaphore:
+            self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                attempt = 0
+                while True:
+                    response: httpx.Response | None = None
+                    try:
+                        response = await client.post(path, headers=headers, json=payload)
+                        if response.status_code not in _RETRY_STATUS:
+                            break
+                        error: Exception = LLMError(f"LLM HTTP {response.status_code}: {response.text[:200]}")
+                    except httpx.TransportError as e:
+                        error = LLMError(f"LLM transport error: {e!r}")
+                    if attempt >= self.max_retries:
+                        raise error
+                    delay = self._backoff(attempt, response)
+                    attempt += 1
+                    self._counters["retries"] += 1
+                    logger.warning("llm_retry attempt=%s delay=%.2fs: %s", attempt, delay, error)
+                    await asyncio.sleep(delay)
+
+                if response.status_code >= 400:
+                    raise LLMError(f"LLM HTTP {response.status_code}: {response.text[:200]}")
+                return parse(response.json())
+            except Exception:
+                self._counters["errors"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+                self._counters["calls"] += 1
+                self._latencies.append(time.perf_counter() - started)
+
+    def _cache_key(self, config: LLMModelConfig, system_prompt: str, user_prompt: str, use_cache: bool) -> str | None:
+        if not use_cache or self.cache is None or not self.cache.applies_to(config):
+            return None
+        return cache_key(config, system_prompt, user_prompt)
+
+    async def acall(
+        self, *, config: LLMModelConfig, system_prompt: str, user_prompt: str, use_cache: bool = True
+    ) -> str:
+        key = self._cache_key(config, system_prompt, user_prompt, use_cache)
+        if key is not None:
+            hit = await asyncio.to_thread(self.cache.get, key)
+            if hit is not None:
+                return hit
+        loop = self._ensure_loop()
+        with timed("llm", provider=(config.provider or "").lower().strip()):
+            future = asyncio.run_coroutine_threadsafe(self._call(config, system_prompt, user_prompt), loop)
+            response = await asyncio.wrap_future(future)
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, key, config, response)
+        return response
+
+    def call(self, *, config: LLMModelConfig, system_prompt: str, user_prompt: str, use_cache: bool = True) -> str:
+        key = self._cache_key(config, system_prompt, user_prompt, use_cache)
+        if key is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        loop = self._ensure_loop()
+        with timed("llm", provider=(config.provider or "").lower().strip()):
+            response = asyncio.run_coroutine_threadsafe(self._call(config, system_prompt, user_prompt), loop).result()
+        if key is not None:
+            self.cache.put(key, config, response)
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        lat = sorted(self._latencies)
+
+        def _pct(p: float) -> float | None:
+            return round(lat[min(int(p * len(lat)), len(lat) - 1)], 4) if lat else None
+
+        return {
+            **self._counters,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "clients": len(self._clients),
+            "http2": self.http2,
+            "latency_p50_s": _pct(0.5),
+            "latency_p95_s": _pct(0.95),
+            "latency_max_s": round(lat[-1], 4) if lat else None,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+llm_pool = LLMClientPool(
+    max_concurrency=settings.llm_max_concurrency,
+    max_connections=settings.llm_max_connections,
+    keepalive_expiry_s=settings.llm_keepalive_expiry_s,
+    connect_timeout_s=settings.llm_connect_timeout_s,
+    read_timeout_s=settings.llm_read_timeout_s,
+    max_retries=settings.llm_max_retries,
+    retry_backoff_s=settings.llm_retry_backoff_s,
+    http2=settings.llm_http2,
+    cache=llm_cache,
+)
+
+
+async def acall_llm_json(
+    *,
+    config: LLMModelConfig,
+    system_prompt: str,
+    user_prompt: str,
+) -> str:
+    return await llm_pool.acall(config=config, system_prompt=system_prompt, user_prompt=user_prompt)
+
+
+def call_llm_json(
+    *,
+    config: LLMModelConfig,
+    system_prompt: str,
+    user_prompt: str,
+) -> str:
+    return llm_pool.call(config=config, system_prompt=system_prompt, user_prompt=user_prompt)
@@ -15,6 +15,11 @@ class Intent:
     alpha: float = 0.05
     usl: float | None = None
     lsl: float | None = None
+    stream: str | None = None
+    chart_type: str | None = None
+    specs: list[dict[str, Any]] | None = None
+    top_n: int | None = None
+    window: int | None = None
 
 
 _JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
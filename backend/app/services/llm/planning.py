@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any
+
+from app.core.settings import settings
+from app.schemas.llm import IntentOut, IntentPlanOut, PlanOut
+from app.services.llm.client import LLMModelConfig, call_llm_json
+from app.services.llm.intent import Intent
+from app.services.llm.json_parse import extract_first_json_object
+from app.services.planner import Plan
+
+logger = logging.getLogger(__name__)
+
+_SYSTEM = "你是一个统计分析助手。严格只输出 JSON，不要输出额外文字。"
+_TASKS = "auto/regression/difference/correlation/chi_square"
+_METHODS = "auto/linear_regression/pearson/spearman/t_test/mann_whitney_u/anova/kruskal/chi_square/auto_group_diff"
+
+# LLM planning runs off the request thread so the heuristic path can proceed meanwhile;
+# a call that misses its budget keeps running and still lands in the LLM response cache.
+_planning_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-plan")
+
+
+def _to_intent(intent_out: IntentOut) -> Intent:
+    return Intent(
+        task=intent_out.task,
+        x=intent_out.x,
+        y=intent_out.y or intent_out.value,
+        group=intent_out.group,
+        alpha=float(intent_out.alpha),
+    )
+
+
+def llm_intent_and_plan(
+    cfg: LLMModelConfig,
+    prompts: dict[str, Any],
+    message: str,
+    data_summary: dict[str, Any],
+    *,
+    merged: bool = True,
+) -> tuple[Intent, Plan]:
+    """Resolve intent and plan with the LLM: one merged round-trip, or intent then plan."""
+    if not settings.llm_planning_use_model_temperature and cfg.temperature != settings.llm_planning_temperature:
+        logger.debug(
+            "llm_planning_temperature_override configured=%s used=%s", cfg.temperature, settings.llm_planning_temperature
+        )
+        cfg = replace(cfg, temperature=float(settings.llm_planning_temperature))
+    if merged:
+        prompt = (
+            f"{prompts.get('intent','')}\n{prompts.get('planning','')}\n\n"
+            f"用户问题：{message}\n"
+            f"data_summary：{data_summary}\n\n"
+            "请输出 JSON：{\"intent\":{task,x,y,group,value,alpha},\"plan\":{method,params}}，"
+            f"task 只能是 {_TASKS}；method 只能是 {_METHODS}。"
+        )
+        text = call_llm_json(config=cfg, system_prompt=_SYSTEM, user_prompt=prompt)
+        out = IntentPlanOut.model_validate(extract_first_json_object(text))
+        return _to_intent(out.intent), Plan(method=out.plan.method, params=out.plan.params)
+
+    intent_prompt = (
+        f"{prompts.get('intent','')}\n\n"
+        f"用户问题：{message}\n"
+        f"数据列名：{data_summary.get('column_names',[])}\n\n"
+        f"请输出 JSON：{{task,x,y,group,value,alpha}}，task 只能是 {_TASKS}。"
+    )
+    intent_text = call_llm_json(config=cfg, system_prompt=_SYSTEM, user_prompt=intent_prompt)
+    intent_out = IntentOut.model_validate(extract_first_json_object(intent_text))
+
+    plan_prompt = (
+        f"{prompts.get('planning','')}\n\n"
+        f"intent：{intent_out.model_dump()}\n"
+        f"data_summary：{data_summary}\n\n"
+        f"请输出 JSON：{{method,params}}，method 只能是 {_METHODS}。"
+    )
+    plan_text = call_llm_json(config=cfg, system_prompt=_SYSTEM, user_prompt=plan_prompt)
+    plan_out = PlanOut.model_validate(extract_first_json_object(plan_text))
+    return _to_intent(intent_out), Plan(method=plan_out.method, params=plan_out.params)
+
+
+def start_llm_planning(
+    cfg: LLMModelConfig,
+    prompts: dict[str, Any],
+    message: str,
+    data_summary: dict[str, Any],
+    *,
+    merged: bool = True,
+) -> Future[tuple[Intent, Plan]]:
+    # copy the caller context so the LLM stage lands in the request's Server-Timing header
+    ctx = contextvars.copy_context()
+    return _planning_pool.submit(ctx.run, llm_intent_and_plan, cfg, prompts, message, data_summary, merged=merged)
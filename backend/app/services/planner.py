@@ -4,9 +4,12 @@ from dataclasses import dataclass
 
 import pandas as pd
 
+from app.core.metrics import timed
 from app.services.engine.methods import (
     anova_oneway,
     capability_analysis,
+    capability_batch,
+    capability_rolling,
     chi_square,
     kruskal_wallis,
     linear_regression,
@@ -14,6 +17,7 @@ from app.services.engine.methods import (
     pearson_correlation,
     spearman_correlation,
     spc_control_chart,
+    spc_stratified,
     suggest_default_method,
     t_test_independent,
 )
@@ -26,12 +30,25 @@ class Plan:
     params: dict
 
 
+@timed("choose_plan")
 def choose_plan(df: pd.DataFrame, intent: Intent) -> Plan:
     # explicit task hint
+    if intent.task == "capability_batch":
+        return Plan(method="capability_batch", params={"specs": intent.specs, "top_n": intent.top_n, "alpha": intent.alpha})
+    if intent.task == "capability" and intent.window:
+        return Plan(
+            method="capability_rolling",
+            params={"y": intent.y, "usl": intent.usl, "lsl": intent.lsl, "window": intent.window, "alpha": intent.alpha},
+        )
     if intent.task == "capability":
         return Plan(method="capability", params={"y": intent.y, "usl": intent.usl, "lsl": intent.lsl, "alpha": intent.alpha})
+    if intent.task == "spc" and intent.group:
+        return Plan(
+            method="spc_stratified",
+            params={"y": intent.y, "group": intent.group, "stream": intent.stream, "alpha": intent.alpha},
+        )
     if intent.task == "spc":
-        return Plan(method="spc", params={"y": intent.y, "alpha": intent.alpha})
+        return Plan(method="spc", params={"y": intent.y, "chart_type": intent.chart_type, "alpha": intent.alpha})
     if intent.task == "chi_square":
         return Plan(method="chi_square", params={"x": intent.x, "y": intent.y, "alpha": intent.alpha})
     if intent.task == "correlation":
@@ -97,9 +114,22 @@ def run_plan(df: pd.DataFrame, plan: Plan):
     if method == "chi_square":
         return chi_square(df, x=str(p["x"]), y=str(p["y"]), alpha=alpha)
     if method == "spc":
-        return spc_control_chart(df, y=str(p["y"]), alpha=alpha)
+        return spc_control_chart(df, y=str(p["y"]), alpha=alpha, chart_type=p.get("chart_type") or None)
+    if method == "spc_stratified":
+        stream = p.get("stream")
+        return spc_stratified(
+            df, y=str(p["y"]), group=str(p["group"]), stream=str(stream) if stream is not None else None, alpha=alpha
+        )
     if method == "capability":
         return capability_analysis(df, y=str(p["y"]), usl=float(p["usl"]), lsl=float(p["lsl"]), alpha=alpha)
+    if method == "capability_batch":
+        return capability_batch(df, specs=list(p.get("specs") or []), top_n=int(p.get("top_n") or 5), alpha=alpha)
+    if method == "capability_rolling":
+        window = p.get("window")
+        return capability_rolling(
+            df, y=str(p["y"]), usl=float(p["usl"]), lsl=float(p["lsl"]),
+            window=int(window) if window else None, alpha=alpha,
+        )
     if method == "auto_group_diff":
         # reuse engine default chooser for group/value by subsetting column choices
         group = p.get("group")
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.metrics import timed
+from app.core.settings import settings
+from app.db.models import MessageModel, SessionMethodModel, SessionModel
+from app.db.session import SessionLocal
+from app.services.storage.blobs import blob_dir
+from app.services.storage.paths import session_export_dir, session_upload_dir
+from app.services.storage.snapshots import snapshot_dir, snapshot_key
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = ("sessions", "messages", "files", "bytes", "blobs", "vacuum_pages")
+
+
+def _tree_size(path: Path) -> tuple[int, int]:
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return files, size
+
+
+def _older_than(path: Path, cutoff: float) -> bool:
+    try:
+        return path.stat().st_mtime < cutoff
+    except OSError:
+        return False
+
+
+class SessionReaper:
+    """
+    Background garbage collector. Sessions soft-deleted longer than `grace_s` ago are
+    hard-deleted together with their messages and on-disk files, in short transactions of
+    `batch_size` sessions so request handlers never wait long for the SQLite write lock.
+    Upload/export directories, dataset snapshots and chart blobs nothing refers to any more
+    are removed after the same grace period, and freed database pages are returned with
+    incremental vacuum.
+    """
+
+    def __init__(self, factory: sessionmaker, *, grace_s: float, interval_s: float, batch_size: int,
+                 vacuum_pages: int) -> None:
+        self.factory = factory
+        self.grace_s = float(grace_s)
+        self.interval_s = float(interval_s)
+        self.batch_size = max(int(batch_size), 1)
+        self.vacuum_pages = int(vacuum_pages)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._totals = dict.fromkeys(_COUNTERS, 0)
+        self._last: dict[str, Any] | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="session-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"runs": self._runs, **{f"{k}_total": v for k, v in self._totals.items()}}
+
+    def last_report(self) -> dict[str, Any] | None:
+        with self._lock:
+            return dict(self._last) if self._last else None
+
+    def _loop(self) -> None:
+        # first pass shortly after startup, then every interval
+        delay = min(self.interval_s, 60.0)
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("reaper_run_failed")
+            delay = self.interval_s
+
+    def run_once(self) -> dict[str, Any]:
+        report = dict.fromkeys(_COUNTERS, 0)
+        started = time.perf_counter()
+        with timed("reaper"):
+            self._purge_sessions(report)
+            self._purge_orphan_dirs(report)
+            self._purge_orphan_snapshots(report)
+            self._purge_orphan_blobs(report)
+            self._incremental_vacuum(report)
+        report["duration_s"] = round(time.perf_counter() - started, 3)
+        with self._lock:
+            self._runs += 1
+            for k in _COUNTERS:
+                self._totals[k] += report[k]
+            self._last = report
+        if any(report[k] for k in _COUNTERS):
+            logger.info(
+                "reaper_freed sessions=%s messages=%s files=%s bytes=%s blobs=%s vacuum_pages=%s duration_s=%s",
+                *(report[k] for k in _COUNTERS), report["duration_s"],
+            )
+        return report
+
+    # ── rows ─────────────────────────────────────────────────────────────
+
+    def _purge_sessions(self, report: dict[str, Any]) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_s)
+        while not self._stop.is_set():
+            with self.factory() as db:
+                batch = db.execute(
+                    select(SessionModel.session_id, SessionModel.file_uri)
+                    .where(SessionModel.deleted_at.is_not(None), SessionModel.deleted_at < cutoff)
+                    .limit(self.batch_size)
+                ).all()
+                if not batch:
+                    return
+                ids = [sid for sid, _ in batch]
+                # snapshot keys hash the upload's stat(), so resolve them before the files go
+                snapshots = [snapshot_dir() / snapshot_key(uri) for _, uri in batch if uri and os.path.exists(uri)]
+                report["messages"] += self._delete_rows(db, ids)
+                db.commit()
+            report["sessions"] += len(ids)
+            for sid in ids:
+                self._remove_tree(session_upload_dir(sid), report)
+                self._remove_tree(session_export_dir(sid), report)
+            for path in snapshots:
+                self._remove_tree(path, report)
+
+    @staticmethod
+    def _delete_rows(db: Session, ids: list[str]) -> int:
+        # children first: SQLite does not enforce the ON DELETE CASCADE unless foreign_keys is on
+        messages = db.execute(delete(MessageModel).where(MessageModel.session_id.in_(ids))).rowcount
+        db.execute(delete(SessionMethodModel).where(SessionMethodModel.session_id.in_(ids)))
+        db.execute(delete(SessionModel).where(SessionModel.session_id.in_(ids)))
+        return messages or 0
+
+    # ── files ────────────────────────────────────────────────────────────
+
+    def _remove_tree(self, path: Path, report: dict[str, Any]) -> None:
+        if not path.exists():
+            return
+        files, size = _tree_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        report["files"] += files
+        report["bytes"] += size
+
+    def _purge_orphan_dirs(self, report: dict[str, Any]) -> None:
+        """Upload/export directories whose session row no longer exists (or never got committed)."""
+        cutoff = time.time() - self.grace_s
+        base = Path(settings.data_dir)
+        for kind in ("uploads", "exports"):
+            root = base / kind
+            if not root.is_dir():
+                continue
+            candidates = [p for p in root.iterdir() if p.is_dir() and _older_than(p, cutoff)]
+            for i in range(0, len(candidates), self.batch_size):
+                chunk = candidates[i:i + self.batch_size]
+                with self.factory() as db:
+                    known = set(db.scalars(
+                        select(SessionModel.session_id).where(SessionModel.session_id.in_([p.name for p in chunk]))
+                    ))
+                for path in chunk:
+                    if path.name not in known:
+                        self._remove_tree(path, report)
+
+    def _purge_orphan_snapshots(self, report: dict[str, Any]) -> None:
+        """
+        Dataset snapshots no current upload maps to. Keys hash the upload's stat(), so each
+        re-upload into a live session leaves the previous snapshot behind.
+        """
+        root = snapshot_dir()
+        if not root.is_dir():
+            return
+        cutoff = time.time() - self.grace_s
+        candidates = [p for p in root.iterdir() if p.is_dir() and _older_than(p, cutoff)]
+        if not candidates:
+            return
+        live: set[str] = set()
+        with self.factory() as db:
+            uris = db.scalars(
+                select(SessionModel.file_uri).where(SessionModel.file_uri.is_not(None)).execution_options(yield_per=1000)
+            )
+            for uri in uris:
+                try:
+                    live.add(snapshot_key(uri))
+                except OSError:
+                    pass  # upload already gone
+        for path in candidates:
+            if path.name not in live:
+                self._remove_tree(path, report)
+
+    def _purge_orphan_blobs(self, report: dict[str, Any]) -> None:
+        """
+        Chart blobs no message references. The grace period covers blobs written by a
+        chat turn whose commit is still in flight.
+        """
+        root = blob_dir()
+        if not root.is_dir():
+            return
+        cutoff = time.time() - self.grace_s
+        candidates = [p for p in root.glob("*/*.json.gz") if _older_than(p, cutoff)]
+        for i in range(0, len(candidates), self.batch_size):
+            chunk = {p.name.split(".", 1)[0]: p for p in candidates[i:i + self.batch_size]}
+            with self.factory() as db:
+                referenced = set(db.scalars(
+                    select(MessageModel.visualizations_ref).where(MessageModel.visualizations_ref.in_(list(chunk)))
+                ))
+            for digest, path in chunk.items():
+                if digest in referenced:
+                    continue
+                try:
+                    st = path.stat()
+                    # put_blob refreshes the mtime of a blob it reuses, possibly for a turn
+                    # that committed after the query above; such a blob is no longer an orphan
+                    if st.st_mtime >= cutoff:
+                        continue
+                    path.unlink()
+                except OSError:
+                    continue
+                report["blobs"] += 1
+                report["bytes"] += st.st_size
+
+    # ── database file ────────────────────────────────────────────────────
+
+    def _incremental_vacuum(self, report: dict[str, Any]) -> None:
+        """
+        Hand free pages back to the filesystem a slice at a time. Needs auto_vacuum=INCREMENTAL,
+        which new databases get from the connection pragmas; older files need one full VACUUM
+        (scripts/migrate_analysis_blobs.py --vacuum) to switch over.
+        """
+        engine: Engine = self.factory.kw["bind"]
+        if engine.dialect.name != "sqlite" or self.vacuum_pages <= 0:
+            return
+        with engine.connect() as conn:
+            if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+                return
+            while not self._stop.is_set():
+                free = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+                if not free:
+                    break
+                conn.execute(text(f"PRAGMA incremental_vacuum({min(free, self.vacuum_pages)})"))
+                conn.commit()
+                freed = free - (conn.execute(text("PRAGMA freelist_count")).scalar() or 0)
+                report["vacuum_pages"] += freed
+                if freed <= 0 or free <= self.vacuum_pages:
+                    break
+
+
+session_reaper = SessionReaper(
+    SessionLocal,
+    grace_s=settings.reaper_grace_s,
+    interval_s=settings.reaper_interval_s,
+    batch_size=settings.reaper_batch_size,
+    vacuum_pages=settings.reaper_vacuum_pages,
+)
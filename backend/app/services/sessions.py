@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import base64
+import json
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Iterator
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import String, cast, func, or_, select
-from sqlalchemy.orm import Session
+from sqlalchemy import JSON, String, and_, func, or_, select, text, type_coerce, union
+from sqlalchemy.orm import Session, defer
 
-from app.db.models import MessageModel, SessionModel
+from app.core.metrics import timed
+from app.core.serialization import dumps
+from app.core.settings import settings
+from app.db.models import MessageModel, SessionMethodModel, SessionModel, utcnow
+from app.db.search import FTS_MIN_KEYWORD, fts_enabled, fts_phrase, gram_query
+from app.services.storage.blobs import iter_blob, put_json_blob, read_json_blob
+
+logger = logging.getLogger(__name__)
 
 
 def _to_iso(dt: datetime) -> str:
@@ -20,6 +34,7 @@ def create_session(db: Session, *, industry: str | None = None) -> SessionModel:
     db.add(s)
     db.commit()
     db.refresh(s)
+    session_totals.invalidate()
     return s
 
 
@@ -36,6 +51,19 @@ def touch_session(db: Session, s: SessionModel) -> None:
     db.commit()
 
 
+def offload_visualizations(analysis: dict[str, Any] | None) -> tuple[dict[str, Any] | None, str | None, int]:
+    """
+    Split the chart payload off an analysis: returns (analysis without "visualizations",
+    blob id or None, chart count). The blob is written before the row is committed; if the
+    commit fails it is left unreferenced.
+    """
+    if not analysis or "visualizations" not in analysis:
+        return analysis, None, 0
+    light = {k: v for k, v in analysis.items() if k != "visualizations"}
+    charts = analysis["visualizations"] or []
+    return light, (put_json_blob(charts) if charts else None), len(charts)
+
+
 def add_message(
     db: Session,
     *,
@@ -44,18 +72,174 @@ def add_message(
     content: str,
     analysis: dict[str, Any] | None = None,
 ) -> MessageModel:
-    msg = MessageModel(session_id=session_id, role=role, content=content, analysis=analysis)
+    analysis, ref, charts = offload_visualizations(analysis)
+    msg = MessageModel(
+        session_id=session_id, role=role, content=content, analysis=analysis,
+        visualizations_ref=ref, visualization_count=charts,
+    )
     db.add(msg)
     s = db.get(SessionModel, session_id)
     if s:
         s.message_count = (s.message_count or 0) + 1
         if role == "user" and not s.first_query:
             s.first_query = content
-    db.commit()
+    with timed("db_commit"):
+        db.commit()
     db.refresh(msg)
     return msg
 
 
+class ChatTurn:
+    """
+    Unit of work for one chat turn. The session row is loaded once; the user message, data
+    summary, assistant message(s) and methods_used are staged on the ORM session and written
+    by a single commit, without per-message commit/refresh. Nothing is flushed before
+    commit(), so no SQLite write lock is held while the analysis runs.
+    """
+
+    def __init__(self, db: Session, session: SessionModel, *, created: bool = False) -> None:
+        self.db = db
+        self.session = session
+        self.session_id = session.session_id
+        self.created = created
+
+    @classmethod
+    def open(cls, db: Session, session_id: str | None, *, industry: str | None = None) -> ChatTurn:
+        if session_id:
+            return cls(db, get_session_or_404(db, session_id))
+        # new session: staged with the rest of the turn (the id is assigned here, not at flush)
+        s = SessionModel(session_id=str(uuid.uuid4()), industry=industry, methods_used=[], message_count=0)
+        db.add(s)
+        return cls(db, s, created=True)
+
+    def add_message(self, role: str, content: str, analysis: dict[str, Any] | None = None) -> MessageModel:
+        analysis, ref, charts = offload_visualizations(analysis)
+        # explicit timestamps keep question/answer order when both rows land in one flush
+        msg = MessageModel(
+            session_id=self.session_id, role=role, content=content, analysis=analysis,
+            visualizations_ref=ref, visualization_count=charts, timestamp=utcnow(),
+        )
+        self.db.add(msg)
+        s = self.session
+        s.message_count = (s.message_count or 0) + 1
+        if role == "user" and not s.first_query:
+            s.first_query = content
+        return msg
+
+    def record_method(self, method: str) -> None:
+        used = list(self.session.methods_used or [])
+        if method not in used:
+            used.append(method)
+            self.session.methods_used = used
+            self.db.merge(SessionMethodModel(session_id=self.session_id, method=method))
+
+    def commit(self) -> None:
+        """Write the staged turn in one transaction; if the commit fails none of it is kept."""
+        try:
+            with timed("db_commit"):
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        if self.created:
+            session_totals.invalidate()
+            self.created = False
+
+    def fail(self) -> None:
+        """
+        Planning or the engine failed. Only the question (and session/data-summary updates)
+        has been staged at this point, so keep it in the history like a normal turn would;
+        a failure here is logged, not raised over the original error.
+        """
+        try:
+            self.commit()
+        except Exception:
+            logger.warning("chat_turn_fail_commit_failed session_id=%s", self.session_id, exc_info=True)
+
+
+def _index_matches(index: str, query: str):
+    return text(
+        f"SELECT s.session_id FROM sessions_{index} JOIN sessions s ON s.rowid = sessions_{index}.rowid "
+        f"WHERE sessions_{index} MATCH :q "
+        "UNION "
+        f"SELECT m.session_id FROM messages_{index} JOIN messages m ON m.rowid = messages_{index}.rowid "
+        f"WHERE messages_{index} MATCH :q"
+    ).bindparams(q=query).columns(session_id=String)
+
+
+def _keyword_matches(keyword: str):
+    """
+    Session ids whose file name, first question or any message contains the keyword: the
+    trigram index for 3+ characters, the character-pair index below that, and LIKE over
+    the same fields where FTS5 is unavailable.
+    """
+    if fts_enabled():
+        if len(keyword) >= FTS_MIN_KEYWORD:
+            return _index_matches("fts", fts_phrase(keyword))
+        query = gram_query(keyword)
+        if query is not None:
+            return _index_matches("grams", query)
+    like = f"%{keyword}%"
+    return union(
+        select(SessionModel.session_id).where(or_(SessionModel.first_query.like(like), SessionModel.file_name.like(like))),
+        select(MessageModel.session_id).where(MessageModel.content.like(like)),
+    )
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(s: SessionModel) -> str:
+    """Opaque keyset cursor: the (updated_at, session_id) of the last row on a page."""
+    raw = json.dumps([s.updated_at.isoformat(), s.session_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, session_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), str(session_id)
+    except Exception as e:
+        raise InvalidCursor("无效的分页游标") from e
+
+
+class SessionTotals:
+    """
+    Short-lived cache of COUNT(*) per filter combination. The history list asks for the
+    same total on every page turn; a count over the filtered set is the one part of the
+    query that cannot stop after `size` rows. Local creates/deletes clear it right away,
+    other workers' writes show up within `ttl_s`.
+    """
+
+    def __init__(self, ttl_s: float) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._totals: dict[tuple, tuple[float, int]] = {}
+
+    def get(self, db: Session, key: tuple, stmt) -> int:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._totals.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        total = int(db.execute(select(func.count()).select_from(stmt.subquery())).scalar_one())
+        if self.ttl_s > 0:
+            with self._lock:
+                if len(self._totals) >= 256:
+                    self._totals.clear()
+                self._totals[key] = (now + self.ttl_s, total)
+        return total
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+session_totals = SessionTotals(settings.sessions_total_cache_s)
+
+
 def list_sessions(
     db: Session,
     *,
@@ -66,17 +250,24 @@ def list_sessions(
     method: str | None,
     start_date: str | None,
     end_date: str | None,
-) -> tuple[int, list[SessionModel]]:
+    cursor: str | None = None,
+    with_total: bool = True,
+) -> tuple[int | None, list[SessionModel], str | None]:
+    """
+    Returns (total, items, next_cursor). With a cursor the page is located by keyset on
+    (updated_at, session_id), served from ix_sessions_live_updated without scanning the
+    skipped rows; `page` is then ignored. Without one the legacy OFFSET paging applies.
+    """
     stmt = select(SessionModel).where(SessionModel.deleted_at.is_(None))
 
     if keyword:
-        like = f"%{keyword}%"
-        stmt = stmt.where(or_(SessionModel.first_query.like(like), SessionModel.file_name.like(like)))
+        stmt = stmt.where(SessionModel.session_id.in_(_keyword_matches(keyword)))
     if industry:
         stmt = stmt.where(SessionModel.industry == industry)
     if method:
-        # Portable filtering across SQLite/Postgres: match on JSON text
-        stmt = stmt.where(cast(SessionModel.methods_used, String).like(f"%{method}%"))
+        stmt = stmt.where(
+            SessionModel.session_id.in_(select(SessionMethodModel.session_id).where(SessionMethodModel.method == method))
+        )
 
     def parse_date(s: str | None) -> datetime | None:
         if not s:
@@ -96,10 +287,27 @@ def list_sessions(
     if end_dt:
         stmt = stmt.where(SessionModel.created_at <= end_dt)
 
-    count = db.execute(select(func.count()).select_from(stmt.subquery())).scalar_one()
-    stmt = stmt.order_by(SessionModel.updated_at.desc()).offset((page - 1) * size).limit(size)
-    items = db.execute(stmt).scalars().all()
-    return int(count), items
+    total = None
+    if with_total:
+        key = (keyword, industry, method, start_dt, end_dt)
+        total = session_totals.get(db, key, stmt)
+
+    page_stmt = stmt.order_by(SessionModel.updated_at.desc(), SessionModel.session_id.desc())
+    if cursor:
+        after_updated, after_id = decode_cursor(cursor)
+        page_stmt = page_stmt.where(
+            or_(
+                SessionModel.updated_at < after_updated,
+                and_(SessionModel.updated_at == after_updated, SessionModel.session_id < after_id),
+            )
+        )
+    elif page > 1:
+        page_stmt = page_stmt.offset((page - 1) * size)
+    # one extra row tells whether there is a next page without a second query
+    rows = db.execute(page_stmt.limit(size + 1)).scalars().all()
+    items = rows[:size]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > size else None
+    return total, items, next_cursor
 
 
 def serialize_session(s: SessionModel) -> dict[str, Any]:
@@ -115,20 +323,112 @@ def serialize_session(s: SessionModel) -> dict[str, Any]:
     }
 
 
-def serialize_message(m: MessageModel) -> dict[str, Any]:
+def serialize_message(m: MessageModel, *, analysis: dict[str, Any] | None = None) -> dict[str, Any]:
     return {
         "id": m.id,
         "role": m.role,
         "content": m.content,
         "timestamp": _to_iso(m.timestamp),
-        "analysis": m.analysis,
+        "analysis": analysis,
     }
 
 
-def serialize_session_detail(s: SessionModel) -> dict[str, Any]:
+def _analysis_light(db: Session):
+    """
+    (analysis without visualizations, number of charts) computed by SQLite's JSON1, so the
+    chart arrays are never shipped to Python; None on other backends.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return None
+    return (
+        type_coerce(func.json_remove(MessageModel.analysis, "$.visualizations"), JSON),
+        func.json_array_length(MessageModel.analysis, "$.visualizations"),
+    )
+
+
+def list_messages(db: Session, session_id: str, *, page: int, size: int) -> tuple[int, list[dict[str, Any]]]:
+    """
+    One page of a session's messages in chat order. `analysis` comes back without its
+    `visualizations` (see `iter_message_visualizations`); `visualization_count` says how
+    many charts there are to fetch.
+    """
+    total = db.execute(select(func.count()).where(MessageModel.session_id == session_id)).scalar_one()
+    stmt = (
+        select(MessageModel)
+        .where(MessageModel.session_id == session_id)
+        .order_by(MessageModel.timestamp.asc(), MessageModel.id.asc())
+        .offset((page - 1) * size)
+        .limit(size)
+    )
+    light = _analysis_light(db)
+    items = []
+    if light is not None:
+        rows = db.execute(stmt.add_columns(*light).options(defer(MessageModel.analysis, raiseload=True))).all()
+        for m, analysis, inline in rows:
+            items.append({**serialize_message(m, analysis=analysis), "visualization_count": inline or m.visualization_count})
+    else:
+        for m in db.execute(stmt).scalars():
+            analysis = dict(m.analysis) if m.analysis else None
+            inline = analysis.pop("visualizations", None) if analysis else None
+            items.append(
+                {**serialize_message(m, analysis=analysis), "visualization_count": len(inline or []) or m.visualization_count}
+            )
+    return int(total), items
+
+
+def iter_message_visualizations(db: Session, session_id: str, message_id: str) -> Iterator[bytes]:
+    """
+    The message's charts as a JSON array, streamed from the blob store. Rows not yet moved
+    by scripts/migrate_analysis_blobs.py still carry them inline. Lookup errors, including
+    a missing blob, are raised here as KeyError, before the first chunk.
+    """
+    m = db.get(MessageModel, message_id, options=[defer(MessageModel.analysis)])
+    if m is None or m.session_id != session_id:
+        raise KeyError("message_not_found")
+    if m.visualizations_ref:
+        return iter_blob(m.visualizations_ref)
+    return iter([dumps((m.analysis or {}).get("visualizations") or [])])
+
+
+def load_visualizations(m: MessageModel) -> list[dict[str, Any]]:
+    if m.visualizations_ref:
+        return read_json_blob(m.visualizations_ref)
+    return (m.analysis or {}).get("visualizations") or []
+
+
+def offload_inline_visualizations(db: Session, *, batch_size: int = 200) -> int:
+    """
+    Move chart arrays still stored inside messages.analysis into the blob store. Walks the
+    table by primary key, one commit per batch, so it can be interrupted and re-run.
+    Returns the number of rows moved.
+    """
+    moved = 0
+    last_id = ""
+    while True:
+        batch = db.execute(
+            select(MessageModel)
+            .where(MessageModel.id > last_id, MessageModel.analysis.is_not(None))
+            .order_by(MessageModel.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not batch:
+            return moved
+        for m in batch:
+            if m.visualizations_ref is None and "visualizations" in (m.analysis or {}):
+                m.analysis, m.visualizations_ref, m.visualization_count = offload_visualizations(m.analysis)
+                moved += 1
+        last_id = batch[-1].id
+        db.commit()
+        db.expunge_all()
+
+
+def serialize_session_detail(db: Session, s: SessionModel, *, page: int = 1, size: int = 100) -> dict[str, Any]:
+    total, messages = list_messages(db, s.session_id, page=page, size=size)
     return {
         **serialize_session(s),
-        "messages": [serialize_message(m) for m in s.messages],
+        "messages": messages,
+        "messages_total": total,
+        "messages_page": page,
         "data_summary": s.data_summary,
         "report_conclusion": s.report_conclusion,
     }
@@ -139,3 +439,4 @@ def soft_delete_session(db: Session, session_id: str) -> None:
     s.deleted_at = datetime.now(timezone.utc)
     db.add(s)
     db.commit()
+    session_totals.invalidate()
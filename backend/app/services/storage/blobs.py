@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO, Any
+
+import orjson
+
+from app.core.serialization import dumps
+from app.core.settings import settings
+
+_CHUNK = 64 * 1024
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+def blob_dir() -> Path:
+    return Path(settings.data_dir) / "blobs"
+
+
+def blob_path(digest: str) -> Path:
+    if not _DIGEST.match(digest):
+        raise ValueError(f"invalid blob id: {digest!r}")
+    return blob_dir() / digest[:2] / f"{digest}.json.gz"
+
+
+def put_blob(data: bytes) -> str:
+    """
+    Store bytes gzip-compressed under their sha256 and return the digest. Identical
+    payloads share one file; writes go through a temp file + rename, so readers never
+    see a partial blob.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    target = blob_path(digest)
+    try:
+        # a dedup hit counts as a fresh write, so the reaper's grace period covers it again
+        os.utime(target)
+        return digest
+    except FileNotFoundError:
+        pass
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".tmp-{uuid.uuid4().hex}")
+    try:
+        with open(tmp, "wb") as raw:
+            # mtime=0 keeps the compressed bytes reproducible for the same payload
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=settings.blob_compress_level, mtime=0) as gz:
+                gz.write(data)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return digest
+
+
+def put_json_blob(obj: Any) -> str:
+    return put_blob(dumps(obj))
+
+
+def open_blob(digest: str) -> IO[bytes]:
+    """Decompressing file object over a blob; raises KeyError if it does not exist."""
+    try:
+        return gzip.open(blob_path(digest), "rb")
+    except FileNotFoundError:
+        raise KeyError("blob_not_found") from None
+
+
+def iter_blob(digest: str, chunk_size: int = _CHUNK) -> Iterator[bytes]:
+    """
+    Stream a blob's decompressed bytes without holding the whole payload in memory. The
+    blob is opened here, so a missing one raises KeyError at the call, not on first read.
+    """
+    return _read_chunks(open_blob(digest), chunk_size)
+
+
+def _read_chunks(f: IO[bytes], chunk_size: int) -> Iterator[bytes]:
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def read_json_blob(digest: str) -> Any:
+    with open_blob(digest) as f:
+        return orjson.loads(f.read())
+
+
+def delete_blob(digest: str) -> bool:
+    try:
+        blob_path(digest).unlink()
+        return True
+    except FileNotFoundError:
+        return False
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 import base64
+import os
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
 from app.services.storage.paths import safe_filename, session_export_dir, session_upload_dir
@@ -32,6 +36,26 @@ def save_export_bytes(session_id: str, file_name: str, content: bytes) -> tuple[
     return safe_name, str(path)
 
 
+@contextmanager
+def export_writer(session_id: str, file_name: str) -> Iterator[Path]:
+    """
+    Yield a temp path in the session's export directory to write an export into; it is
+    renamed to `file_name` only when the block completes, so downloads never see a
+    half-written file. On error the temp file is removed; a block that moves the temp file
+    elsewhere publishes nothing.
+    """
+    export_dir = session_export_dir(session_id)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    target = export_dir / safe_filename(file_name)
+    tmp = export_dir / f".{target.name}.{uuid.uuid4().hex}.partial"
+    try:
+        yield tmp
+        if tmp.exists():
+            os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
 def resolve_export_path(session_id: str, file_name: str) -> Path:
     return session_export_dir(session_id) / safe_filename(file_name)
 
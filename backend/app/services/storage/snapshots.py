@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import shutil
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.settings import settings
+
+
+_META = "meta.pkl"
+_OBJECTS = "objects.pkl"
+
+
+def snapshot_dir() -> Path:
+    return Path(settings.data_dir) / "snapshots"
+
+
+def snapshot_key(file_uri: str) -> str:
+    """Key a snapshot by source path, size and mtime so a re-upload gets a fresh one."""
+    st = os.stat(file_uri)
+    raw = f"{os.path.abspath(file_uri)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def write_snapshot(df: pd.DataFrame, file_uri: str) -> str:
+    """
+    Persist df as one .npy file per plain numpy column (plus a pickle for everything else)
+    and return the snapshot directory. Worker processes memory-map the .npy files instead
+    of re-parsing the upload or receiving a pickled copy of the frame.
+    """
+    target = snapshot_dir() / snapshot_key(file_uri)
+    if (target / _META).exists():
+        return str(target)
+
+    tmp = snapshot_dir() / f".tmp-{uuid.uuid4().hex}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    columns: list[tuple[object, str | None]] = []
+    others: dict[str, pd.Series] = {}
+    for i, name in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biufcmM":
+            fname = f"c{i}.npy"
+            np.save(tmp / fname, s.to_numpy(), allow_pickle=False)
+            columns.append((name, fname))
+        else:
+            others[f"c{i}"] = s
+            columns.append((name, None))
+    with open(tmp / _OBJECTS, "wb") as f:
+        pickle.dump(others, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(tmp / _META, "wb") as f:
+        pickle.dump({"columns": columns, "index": df.index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    try:
+        tmp.rename(target)
+    except OSError:
+        # another request finished the same snapshot first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return str(target)
+
+
+def load_snapshot(path: str) -> pd.DataFrame:
+    """Open a snapshot; numeric columns are copy-on-write memory maps (no read, no copy)."""
+    base = Path(path)
+    with open(base / _META, "rb") as f:
+        meta = pickle.load(f)
+    with open(base / _OBJECTS, "rb") as f:
+        others = pickle.load(f)
+    data: dict[str, object] = {}
+    for i, (_, fname) in enumerate(meta["columns"]):
+        key = f"c{i}"
+        data[key] = np.load(base / fname, mmap_mode="c") if fname else others[key]
+    df = pd.DataFrame(data, index=meta["index"], copy=False)
+    df.columns = pd.Index([name for name, _ in meta["columns"]])
+    return df
@@ -0,0 +1,120 @@
+"""
+Concurrency benchmark for the SQLite database profiles.
+
+Mixed workload: worker threads either append a message (sessions.add_message, one write
+transaction) or read the first page of the history list (sessions.list_sessions).
+Each profile runs against its own fresh database file.
+
+    cd backend
+    python scripts/bench_db_concurrency.py --threads 16 --seconds 10 --write-ratio 0.3
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db.models import Base, SessionModel  # noqa: E402
+from app.db.session import build_engine  # noqa: E402
+from app.services.sessions import add_message, list_sessions  # noqa: E402
+
+
+def run_profile(profile: str, *, threads: int, seconds: float, write_ratio: float, sessions: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix=f"bench-{profile}-"), "bench.db")
+    engine = build_engine(f"sqlite:///{path}", profile=profile)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False, future=True)
+
+    with factory() as db:
+        ids = []
+        for i in range(sessions):
+            s = SessionModel(industry="finance", file_name=f"f{i}.csv")
+            db.add(s)
+            db.flush()
+            ids.append(s.session_id)
+        db.commit()
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    latencies: list[float] = []
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        local = {"reads": 0, "writes": 0, "locked": 0}
+        local_lat = []
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                with factory() as db:
+                    if rng.random() < write_ratio:
+                        add_message(db, session_id=rng.choice(ids), role="user", content="bench", analysis={"p": 0.5})
+                        local["writes"] += 1
+                    else:
+                        list_sessions(db, page=1, size=20, keyword=None, industry=None, method=None,
+                                      start_date=None, end_date=None)
+                        local["reads"] += 1
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                local["locked"] += 1
+            local_lat.append(time.perf_counter() - started)
+        with lock:
+            for k, v in local.items():
+                counts[k] += v
+            latencies.extend(local_lat)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    engine.dispose()
+
+    latencies.sort()
+    ops = counts["reads"] + counts["writes"]
+    return {
+        "profile": profile,
+        "ops_per_s": ops / seconds,
+        "writes_per_s": counts["writes"] / seconds,
+        "reads_per_s": counts["reads"] / seconds,
+        "locked": counts["locked"],
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--profiles", default="default,wal")
+    args = parser.parse_args()
+
+    rows = [
+        run_profile(p.strip(), threads=args.threads, seconds=args.seconds,
+                    write_ratio=args.write_ratio, sessions=args.sessions)
+        for p in args.profiles.split(",")
+    ]
+    print(f"{'profile':<10}{'ops/s':>10}{'writes/s':>10}{'reads/s':>10}{'locked':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in rows:
+        print(f"{r['profile']:<10}{r['ops_per_s']:>10.0f}{r['writes_per_s']:>10.0f}{r['reads_per_s']:>10.0f}"
+              f"{r['locked']:>8}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+    if len(rows) == 2 and rows[0]["ops_per_s"]:
+        print(f"\n{rows[1]['profile']} vs {rows[0]['profile']}: {rows[1]['ops_per_s'] / rows[0]['ops_per_s']:.2f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Move chart payloads still stored inline in messages.analysis into the blob store
+(data_dir/blobs), one transaction per batch. Safe to interrupt and re-run; the app reads
+both layouts in the meantime.
+
+    cd backend
+    python scripts/migrate_analysis_blobs.py --batch-size 200 --vacuum
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db.init_db import init_db  # noqa: E402
+from app.db.search import rebuild_search_index  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services.sessions import offload_inline_visualizations  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to give the freed pages back (SQLite)")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        moved = offload_inline_visualizations(db, batch_size=args.batch_size)
+    print(f"moved {moved} message(s) in {time.perf_counter() - started:.1f}s")
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        # VACUUM may renumber the rowids the search indexes point at
+        rebuild_search_index(engine)
+        print("vacuumed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Test runs use a throwaway database and data dir, so they never write into the working
+tree. Set DATABASE_URL / DATA_DIR explicitly to point them elsewhere.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="hts-tests-")
+atexit.register(shutil.rmtree, _tmp, True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/app.db")
+os.environ.setdefault("DATA_DIR", os.path.join(_tmp, "data"))
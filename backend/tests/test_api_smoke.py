@@ -50,6 +50,299 @@ class ApiSmokeTest(unittest.TestCase):
         resp = self.client.delete(f"/api/v2/session/{sid}")
         self.assertEqual(resp.status_code, 204, resp.text)
 
+    def test_chat_job_flow(self):
+        import time
+
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+
+        body = {"session_id": sid, "message": "请做相关性分析 X=x,Y=y"}
+        first = self.client.post("/api/v2/chat/jobs", json=body)
+        self.assertEqual(first.status_code, 202, first.text)
+        job_id = first.json()["job_id"]
+
+        status = {}
+        for _ in range(300):
+            status = self.client.get(f"/api/v2/chat/jobs/{job_id}").json()
+            if status["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.1)
+        self.assertEqual(status["status"], "succeeded", status)
+        self.assertEqual(status["progress"], 1.0)
+
+        resp = self.client.get(f"/api/v2/chat/jobs/{job_id}/result")
+        self.assertEqual(resp.status_code, 200, resp.text)
+        self.assertIn(resp.json()["analysis"]["method"], {"pearson", "spearman"})
+
+        detail = self.client.get(f"/api/v2/session/{sid}").json()
+        self.assertEqual([m["role"] for m in detail["messages"]], ["user", "assistant"])
+        self.assertEqual(self.client.get("/api/v2/chat/jobs/missing").status_code, 404)
+
+    def test_chat_stream_event_order(self):
+        import json
+
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+
+        events = []
+        with self.client.stream("POST", "/api/v2/chat/stream", json={"session_id": sid, "message": "X=x,Y=y"}) as resp:
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.headers["content-type"].startswith("text/event-stream"))
+            for line in resp.iter_lines():
+                if line.startswith("event:"):
+                    events.append([line[6:].strip(), None])
+                elif line.startswith("data:"):
+                    events[-1][1] = json.loads(line[5:])
+        self.assertEqual([e for e, _ in events], ["session", "intent", "plan", "statistic", "charts", "done"])
+        statistic = dict(events)["statistic"]
+        self.assertIn("p_value", statistic)
+        self.assertNotIn("visualizations", statistic)
+        self.assertEqual(len(self.client.get(f"/api/v2/session/{sid}").json()["messages"]), 2)
+
+    def test_chat_batch_in_order_with_item_errors(self):
+        csv = "x,y,g\n1,2,a\n2,4,a\n3,3,b\n4,9,b\n5,8,b\n6,7,a\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+
+        messages = [
+            "请做相关性分析 X=x,Y=y",
+            {"task": "correlation", "x": "missing_column", "y": "y"},
+            "请做差异检验 group=g,value=y",
+        ]
+        resp = self.client.post("/api/v2/chat/batch", json={"session_id": sid, "messages": messages})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        results = resp.json()["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2])
+        self.assertIn(results[0]["analysis"]["method"], {"pearson", "spearman"})
+        self.assertEqual(results[1]["status"], 400)
+        self.assertIn("missing_column", results[1]["error"])
+        self.assertIn(results[2]["analysis"]["method"], {"t_test", "mann_whitney_u"})
+
+        detail = self.client.get(f"/api/v2/session/{sid}").json()
+        self.assertEqual([m["role"] for m in detail["messages"]], ["user", "assistant", "user", "user", "assistant"])
+        self.assertEqual(self.client.post("/api/v2/chat/batch", json={"session_id": "nope", "messages": ["x"]}).status_code, 404)
+
+    def test_chat_batch_admits_one_item_per_worker(self):
+        import threading
+        from unittest import mock
+
+        from app.services.executor import analysis_executor
+
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        sid = self.client.post("/api/v2/upload", files={"file": ("t.csv", csv.encode(), "text/csv")}).json()["session_id"]
+        lock, active, peak = threading.Lock(), [0], [0]
+        execute = analysis_executor.execute
+
+        def counting(*args, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        with mock.patch.object(analysis_executor, "execute", counting):
+            resp = self.client.post("/api/v2/chat/batch", json={"session_id": sid, "messages": ["X=x,Y=y"] * 8})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        self.assertEqual(len(resp.json()["results"]), 8)
+        self.assertLessEqual(peak[0], max(analysis_executor.max_workers, 1))
+
+    def test_chat_turn_is_one_transaction(self):
+        import json
+
+        from sqlalchemy import event
+
+        from app.db.session import engine
+
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+
+        commits = []
+
+        def _on_commit(conn):
+            commits.append(conn)
+
+        event.listen(engine, "commit", _on_commit)
+        self.addCleanup(event.remove, engine, "commit", _on_commit)
+
+        resp = self.client.post("/api/v2/chat", json={"session_id": sid, "message": "请做相关性分析 X=x,Y=y"})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        self.assertEqual(len(commits), 1)
+
+        # engine failure: the staged question is kept, no partial answer is written
+        commits.clear()
+        bad = json.dumps({"task": "correlation", "x": "missing_column", "y": "y"})
+        resp = self.client.post("/api/v2/chat", json={"session_id": sid, "message": bad})
+        self.assertGreaterEqual(resp.status_code, 400, resp.text)
+        self.assertEqual(len(commits), 1)
+        detail = self.client.get(f"/api/v2/session/{sid}").json()
+        self.assertEqual([m["role"] for m in detail["messages"]], ["user", "assistant", "user"])
+        self.assertEqual(detail["message_count"], 3)
+
+    def test_session_detail_pages_and_lazy_visualizations(self):
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+        for _ in range(2):
+            resp = self.client.post("/api/v2/chat", json={"session_id": sid, "message": "请做相关性分析 X=x,Y=y"})
+            self.assertEqual(resp.status_code, 200, resp.text)
+        charts = resp.json()["analysis"]["visualizations"]
+
+        detail = self.client.get(f"/api/v2/session/{sid}", params={"page": 2, "size": 3}).json()
+        self.assertEqual((detail["messages_total"], detail["messages_page"]), (4, 2))
+        self.assertEqual([m["role"] for m in detail["messages"]], ["assistant"])
+        answer = detail["messages"][0]
+        self.assertNotIn("visualizations", answer["analysis"])
+        self.assertIn(answer["analysis"]["method"], {"pearson", "spearman"})
+        self.assertEqual(answer["visualization_count"], len(charts))
+
+        resp = self.client.get(f"/api/v2/session/{sid}/messages/{answer['id']}/visualizations")
+        self.assertEqual(resp.status_code, 200, resp.text)
+        self.assertEqual(resp.json()["visualizations"], charts)
+        self.assertEqual(self.client.get(f"/api/v2/session/{sid}/messages/missing/visualizations").status_code, 404)
+
+        # a blob lost from disk is a 404, not a 200 with a truncated body
+        from app.db.models import MessageModel
+        from app.db.session import SessionLocal
+        from app.services.storage.blobs import blob_path
+
+        with SessionLocal() as db:
+            ref = db.get(MessageModel, answer["id"]).visualizations_ref
+        self.assertTrue(ref)
+        blob_path(ref).unlink()
+        resp = self.client.get(f"/api/v2/session/{sid}/messages/{answer['id']}/visualizations")
+        self.assertEqual(resp.status_code, 404, resp.text)
+
+    def test_streamed_export_and_resumable_download(self):
+        import io
+        import zipfile
+
+        from app.db.models import SessionModel
+        from app.db.session import SessionLocal
+        from app.services.storage.paths import session_export_dir
+
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+        resp = self.client.post("/api/v2/chat", json={"session_id": sid, "message": "请做相关性分析 X=x,Y=y"})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        with SessionLocal() as db:
+            db.get(SessionModel, sid).report_conclusion = "结论"
+            db.commit()
+
+        resp = self.client.post("/api/v2/export", json={"session_id": sid, "format": "md", "include_charts": True})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        name = resp.json()["file_name"]
+        self.assertTrue(name.endswith(".zip"))
+        self.assertEqual([p.name for p in session_export_dir(sid).iterdir()], [name])
+        path = f"/api/v2/download/{sid}/{name}"
+
+        full = self.client.get(path)
+        self.assertEqual(full.status_code, 200, full.text)
+        self.assertEqual(full.headers["accept-ranges"], "bytes")
+        with zipfile.ZipFile(io.BytesIO(full.content)) as zf:
+            names = zf.namelist()
+            self.assertIn("report.md", names)
+            self.assertIn("chart-1.png", names)
+            self.assertIn("(chart-1.png)", zf.read("report.md").decode("utf-8"))
+        etag, size = full.headers["etag"], len(full.content)
+
+        part = self.client.get(path, headers={"Range": "bytes=10-"})
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part.headers["content-range"], f"bytes 10-{size - 1}/{size}")
+        self.assertEqual(full.content[:10] + part.content, full.content)
+
+        resumed = self.client.get(path, headers={"Range": "bytes=0-9", "If-Range": etag})
+        self.assertEqual((resumed.status_code, resumed.content), (206, full.content[:10]))
+        stale = self.client.get(path, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        self.assertEqual((stale.status_code, len(stale.content)), (200, size))
+
+        cached = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual((cached.status_code, cached.headers["etag"]), (304, etag))
+        head = self.client.head(path)
+        self.assertEqual((head.status_code, head.headers["content-length"]), (200, str(size)))
+
+        # when no chart renders, the export falls back to plain Markdown rather than a zip of report.md alone
+        from unittest import mock
+
+        from app.services.charts import chart_renderer
+
+        with mock.patch.object(chart_renderer, "iter_render", side_effect=lambda configs, dpi=150: iter([None] * len(configs))):
+            resp = self.client.post("/api/v2/export", json={"session_id": sid, "format": "md", "include_charts": True})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        md_name = resp.json()["file_name"]
+        self.assertTrue(md_name.endswith(".md"))
+        self.assertEqual(sorted(p.name for p in session_export_dir(sid).iterdir()), sorted([name, md_name]))
+        plain = self.client.get(f"/api/v2/download/{sid}/{md_name}")
+        self.assertIn("（图表渲染失败）", plain.content.decode("utf-8"))
+
+        resp = self.client.post("/api/v2/export", json={"session_id": sid, "format": "docx", "include_charts": True})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        docx = self.client.get(f"/api/v2/download/{sid}/{resp.json()['file_name']}")
+        self.assertEqual(docx.status_code, 200)
+        self.assertTrue(zipfile.is_zipfile(io.BytesIO(docx.content)))
+
+    def test_server_timing_and_metrics(self):
+        csv = "x,y\n1,2\n2,4\n3,3\n4,9\n5,8\n"
+        files = {"file": ("test.csv", csv.encode("utf-8"), "text/csv")}
+        sid = self.client.post("/api/v2/upload", files=files).json()["session_id"]
+
+        resp = self.client.post("/api/v2/chat", json={"session_id": sid, "message": "请做相关性分析 X=x,Y=y"})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        stages = [part.split(";")[0] for part in resp.headers["server-timing"].split(", ")]
+        for stage in ("load_dataframe", "choose_plan", "run_plan", "db_commit", "encode", "total"):
+            self.assertIn(stage, stages)
+
+        metrics = self.client.get("/metrics")
+        self.assertEqual(metrics.status_code, 200)
+        self.assertTrue(metrics.headers["content-type"].startswith("text/plain"))
+        self.assertRegex(metrics.text, r'hts_stage_duration_seconds_count\{stage="run_plan",method="(pearson|spearman)"\} \d+')
+        self.assertIn('hts_stage_duration_seconds_bucket{stage="load_dataframe",le="+Inf"}', metrics.text)
+        for gauge in ("hts_executor_queued", "hts_llm_in_flight", "hts_llm_cache_hit_ratio", "hts_jobs_running"):
+            self.assertIn(f"\n{gauge} ", metrics.text)
+
+
+class ChatStreamDisconnectTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    async def test_session_outlives_the_worker_after_a_disconnect(self):
+        import asyncio
+        import time
+        from unittest import mock
+
+        from app.api import chat
+        from app.schemas.api import ChatRequest
+
+        timeline = []
+
+        def slow_prepare(db, req, emit):
+            time.sleep(0.3)
+            timeline.append("worker_done")
+            raise KeyError("session_not_found")
+
+        db = mock.Mock()
+        db.close.side_effect = lambda: timeline.append("db_closed")
+        with mock.patch.object(chat, "_prepare_turn", slow_prepare), mock.patch.object(chat, "SessionLocal", return_value=db):
+            resp = await chat.chat_stream(ChatRequest(session_id="s", message="m"), request=None)
+            # the client goes away while the worker thread is still inside _prepare_turn
+            pending = asyncio.ensure_future(resp.body_iterator.__anext__())
+            await asyncio.sleep(0.1)
+            pending.cancel()
+            for _ in range(50):
+                if "db_closed" in timeline:
+                    break
+                await asyncio.sleep(0.02)
+        self.assertEqual(timeline, ["worker_done", "db_closed"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+
+class BlobStoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+        from app.db.init_db import init_db
+
+        init_db()
+
+    def test_content_addressed_roundtrip_and_streaming(self):
+        import gzip
+        import os
+        import time
+
+        from app.services.storage.blobs import blob_path, iter_blob, put_blob, put_json_blob, read_json_blob
+
+        payload = [{"type": "scatter", "title": "散点图", "data": {"points": [[i, i * 0.5] for i in range(20000)]}}]
+        digest = put_json_blob(payload)
+        past = time.time() - 30 * 86400
+        os.utime(blob_path(digest), (past, past))
+        self.assertEqual(put_json_blob(payload), digest)  # same content, same blob
+        self.assertGreater(blob_path(digest).stat().st_mtime, past + 86400)  # and a fresh grace period
+        self.assertEqual(read_json_blob(digest), payload)
+
+        raw = b"".join(iter_blob(digest, chunk_size=4096))
+        self.assertEqual(put_blob(raw), digest)
+        self.assertLess(blob_path(digest).stat().st_size, len(raw) // 3)
+        self.assertEqual(gzip.decompress(blob_path(digest).read_bytes()), raw)
+
+        with self.assertRaises(KeyError):
+            read_json_blob("0" * 64)
+        with self.assertRaises(KeyError):
+            iter_blob("0" * 64)  # before the first chunk
+        with self.assertRaises(ValueError):
+            blob_path("../../etc/passwd")
+
+    def test_batched_migration_of_inline_rows(self):
+        import orjson
+
+        from app.db.models import MessageModel, SessionModel
+        from app.db.session import SessionLocal
+        from app.services.sessions import iter_message_visualizations, list_messages, offload_inline_visualizations
+
+        charts = [{"type": "bar", "title": f"图{i}", "data": {"values": list(range(50))}} for i in range(2)]
+        with SessionLocal() as db:
+            s = SessionModel(methods_used=[], message_count=0)
+            db.add(s)
+            db.flush()
+            sid = s.session_id
+            legacy = [
+                MessageModel(session_id=sid, role="assistant", content=f"a{i}", analysis={"method": "anova", "visualizations": charts})
+                for i in range(5)
+            ]
+            db.add_all(legacy)
+            db.commit()
+            ids = [m.id for m in legacy]
+
+            # inline rows are readable before the migration runs
+            self.assertEqual(orjson.loads(b"".join(iter_message_visualizations(db, sid, ids[0]))), charts)
+
+            self.assertGreaterEqual(offload_inline_visualizations(db, batch_size=2), 5)
+            self.assertEqual(offload_inline_visualizations(db, batch_size=2), 0)  # idempotent
+
+            rows = {m.id: m for m in db.query(MessageModel).filter(MessageModel.session_id == sid)}
+            self.assertEqual({m.visualizations_ref for m in rows.values()}, {rows[ids[0]].visualizations_ref})
+            self.assertTrue(all("visualizations" not in m.analysis and m.visualization_count == 2 for m in rows.values()))
+            self.assertEqual(orjson.loads(b"".join(iter_message_visualizations(db, sid, ids[3]))), charts)
+
+            total, items = list_messages(db, sid, page=1, size=10)
+            self.assertEqual(total, 5)
+            self.assertEqual({m["visualization_count"] for m in items}, {2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+
+class CapabilityEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+        import numpy as np
+        import pandas as pd
+
+        cls.np = np
+        cls.pd = pd
+
+    def _frame(self, n: int = 500, m: int = 12):
+        np, pd = self.np, self.pd
+        rng = np.random.default_rng(2)
+        data = rng.normal(10.0, rng.uniform(0.2, 0.9, size=m), size=(n, m))
+        df = pd.DataFrame(data, columns=[f"dim{i}" for i in range(m)])
+        df.iloc[::9, 4] = np.nan
+        return df
+
+    def test_batch_matches_single_capability(self):
+        from app.services.engine.methods import capability_analysis, capability_batch
+
+        df = self._frame()
+        specs = [{"y": c, "usl": 12.0, "lsl": 8.5} for c in df.columns]
+        result = capability_batch(df, specs=specs, top_n=3)
+        rows = result.visualizations[0]["data"]["rows"]
+
+        self.assertEqual(len(rows), len(df.columns))
+        cpks = [r["cpk"] for r in rows]
+        self.assertEqual(cpks, sorted(cpks))
+        # ranking bar chart + distribution charts for the worst 3 only
+        self.assertEqual([v["type"] for v in result.visualizations], ["bar", "distribution", "distribution", "distribution"])
+
+        by_col = {r["y"]: r for r in rows}
+        for col in ("dim0", "dim4", "dim7"):
+            single = capability_analysis(df, col, usl=12.0, lsl=8.5).visualizations[0]["data"]
+            for key in ("cp", "cpk", "pp", "ppk", "ppm"):
+                self.assertAlmostEqual(by_col[col][key], single[key], places=3, msg=f"{col}.{key}")
+            self.assertEqual(by_col[col]["is_normal"], single["normality_test"]["is_normal"])
+
+    def test_rolling_matches_per_window_capability(self):
+        from app.services.engine.methods import capability_analysis, capability_rolling, rolling_capability_indices
+
+        np, pd = self.np, self.pd
+        vals = np.random.default_rng(4).normal(1000.0, 0.3, size=300)
+        vals[200:] += 0.6  # drift late in the run
+        idx = rolling_capability_indices(vals, 1001.5, 998.5, 40)
+        self.assertEqual(len(idx["cpk"]), 300 - 40 + 1)
+        for k in (0, 137, 260):
+            single = capability_analysis(pd.DataFrame({"v": vals[k:k + 40]}), "v", usl=1001.5, lsl=998.5)
+            data = single.visualizations[0]["data"]
+            for key in ("cp", "cpk", "pp", "ppk"):
+                self.assertAlmostEqual(float(idx[key][k]), data[key], places=3, msg=f"{k}.{key}")
+
+        result = capability_rolling(pd.DataFrame({"v": vals}), "v", usl=1001.5, lsl=998.5, window=40)
+        chart = result.visualizations[0]
+        self.assertEqual(chart["type"], "line")
+        self.assertEqual(chart["data"]["x"][-1], 300)
+        self.assertEqual(set(chart["data"]["series"]), {"Cp", "Cpk", "Pp", "Ppk"})
+        self.assertTrue(result.significant)
+
+    def test_batch_rejects_unknown_columns(self):
+        from app.services.engine.methods import capability_batch
+
+        with self.assertRaises(ValueError):
+            capability_batch(self._frame(), specs=[{"y": "nope", "usl": 1, "lsl": 0}])
+
+
+if __name__ == "__main__":
+    unittest.main()
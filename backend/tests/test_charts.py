@@ -0,0 +1,108 @@
+import unittest
+
+
+def _charts():
+    return [
+        {"type": "scatter", "title": "温度 vs 良率", "data": {"points": [[i, i * 0.3] for i in range(200)]}, "xLabel": "温度"},
+        {"type": "bar", "title": "各线别数量", "data": {"categories": ["A", "B", "C"], "values": [3, 5, 2]}},
+        {"type": "control_chart", "title": "I-MR", "data": {"format": "columnar", "y": [1, 2, 1.5, 3, 1], "anomalies": [4],
+                                                           "ucl": 2.8, "cl": 1.7, "lcl": 0.6}},
+        {"type": "box", "title": "", "data": {"groups": ["a", "b"], "values": [[1, 2, 3], [2, 3, 4]]}},
+    ]
+
+
+class ChartRendererTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    def test_inline_render_no_longer_fails_without_cjk_fonts(self):
+        from app.services.charts import ChartRenderer
+
+        pngs = ChartRenderer(max_workers=0, timeout_s=10).render_many(_charts())
+        self.assertEqual(len(pngs), 4)
+        self.assertTrue(all(p and p.startswith(b"\x89PNG") for p in pngs))
+
+    def test_pool_keeps_order_and_recovers_from_timeout(self):
+        from app.services.charts import ChartRenderer
+
+        charts = _charts()
+        inline = ChartRenderer(max_workers=0, timeout_s=10).render_many(charts)
+        renderer = ChartRenderer(max_workers=2, timeout_s=30)
+        self.addCleanup(renderer.shutdown)
+        self.assertEqual(renderer.render_many(charts), inline)  # same bytes, same order
+
+        renderer.timeout_s = 0.0001
+        self.assertEqual(renderer.render_many(charts), [None] * len(charts))
+        stats = renderer.stats()
+        self.assertEqual(stats["timeouts"], len(charts))
+        self.assertLessEqual(stats["workers"], 2)
+
+        renderer.timeout_s = 30
+        self.assertEqual(renderer.render_many(charts[:1]), inline[:1])
+
+    def test_pool_replaces_a_worker_that_dies(self):
+        from app.services.charts import ChartRenderer
+
+        charts = _charts()
+        inline = ChartRenderer(max_workers=0, timeout_s=10).render_many(charts)
+        renderer = ChartRenderer(max_workers=1, timeout_s=30)
+        self.addCleanup(renderer.shutdown)
+        renderer.start()
+        dead = renderer._idle[0].process
+        dead.kill()
+        dead.join(timeout=5)
+
+        # the first chart goes to the dead worker; the rest render on its replacement
+        self.assertEqual(renderer.render_many(charts), [None, *inline[1:]])
+        stats = renderer.stats()
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["workers"], 1)
+
+        # killed mid-batch, while it renders the chart handed to it before the first yield
+        import multiprocessing as mp
+
+        stream = renderer.iter_render(charts[::-1])
+        self.assertEqual(next(stream), inline[-1])
+        for child in mp.active_children():
+            if child.name == "chart-worker":
+                child.kill()
+        rest = list(stream)
+        self.assertEqual(len(rest), len(charts) - 1)
+        self.assertEqual(rest[-1], inline[0])
+        self.assertEqual(renderer.stats()["restarts"], 2)
+
+    def test_cache_reuses_renders_across_exports_and_stays_bounded(self):
+        import tempfile
+        from pathlib import Path
+
+        from app.services.charts import ChartCache, ChartRenderer
+
+        root = Path(tempfile.mkdtemp(prefix="chart-cache-"))
+        charts = _charts()
+        renderer = ChartRenderer(max_workers=0, timeout_s=10, cache=ChartCache(root, max_bytes=10 * 1024 * 1024))
+
+        first = renderer.render_many(charts[:3])
+        self.assertEqual(renderer.stats()["rendered"], 3)
+        # "re-export after one more analysis": only the new chart is rendered
+        second = renderer.render_many(charts)
+        self.assertEqual(second[:3], first)
+        self.assertEqual(renderer.stats()["rendered"], 4)
+        self.assertEqual(renderer.cache.stats()["hits"], 3)
+
+        # key ignores dict ordering, but not DPI
+        reordered = {k: charts[1][k] for k in reversed(list(charts[1]))}
+        self.assertEqual(ChartCache.key(reordered, 150), ChartCache.key(charts[1], 150))
+        renderer.render_many(charts[:1], dpi=72)
+        self.assertEqual(renderer.stats()["rendered"], 5)
+
+        small = ChartCache(root, max_bytes=max(len(p) for p in second) + 1)
+        small.put("f" * 64, second[0])
+        self.assertLessEqual(sum(f.stat().st_size for f in root.glob("*/*.png")), small.max_bytes)
+        self.assertGreater(small.stats()["evictions"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+
+class ConfigCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from sqlalchemy.orm import sessionmaker
+
+        from app.db.models import Base
+        from app.db.session import build_engine
+
+        # config writes only ever reach a throwaway database, never the app's default one
+        tmp = tempfile.mkdtemp(prefix="config-test-")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        self.engine = build_engine(f"sqlite:///{tmp}/app.db", profile="wal")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.factory = sessionmaker(bind=self.engine, autoflush=False, future=True)
+
+    def _count_queries(self):
+        from sqlalchemy import event
+
+        statements = []
+
+        def _on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", _on_execute)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", _on_execute)
+        return statements
+
+    def test_reads_served_from_memory_and_writes_seen_across_workers(self):
+        import time
+
+        from app.services import config_store
+        from app.services.config_store import ConfigCache, get_prompt_templates, set_config
+
+        local = ConfigCache(check_interval_s=60)
+        other_worker = ConfigCache(check_interval_s=0.05)
+        self.addCleanup(setattr, config_store, "config_cache", config_store.config_cache)
+
+        with self.factory() as db:
+            config_store.config_cache = local
+            set_config(db, "prompt_templates", {"intent": "v1", "planning": "p", "interpret": "i"})
+            get_prompt_templates(db)["intent"] = "mutated by caller"
+
+            statements = self._count_queries()
+            for _ in range(20):
+                self.assertEqual(get_prompt_templates(db)["intent"], "v1")
+            self.assertEqual(statements, [])  # write-through: no reads at all
+
+            config_store.config_cache = other_worker
+            self.assertEqual(get_prompt_templates(db)["intent"], "v1")
+            config_store.config_cache = local
+            set_config(db, "prompt_templates", {"intent": "v2", "planning": "p", "interpret": "i"})
+
+            config_store.config_cache = other_worker
+            time.sleep(0.06)
+            self.assertEqual(get_prompt_templates(db)["intent"], "v2")
+
+
+if __name__ == "__main__":
+    unittest.main()
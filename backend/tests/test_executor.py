@@ -0,0 +1,67 @@
+import unittest
+
+
+class AnalysisExecutorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+        import tempfile
+
+        sys.path.insert(0, "backend")
+        import numpy as np
+        import pandas as pd
+
+        from app.services.executor import AnalysisExecutor
+        from app.services.storage.snapshots import write_snapshot
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        src = f"{cls.tmp.name}/data.csv"
+        df = pd.DataFrame({"g": np.repeat(list("abcd"), 50_000), "v": np.random.default_rng(0).normal(size=200_000)})
+        df.to_csv(src, index=False)
+        cls.snapshot = write_snapshot(df, src)
+        cls.executor = AnalysisExecutor(max_workers=1, default_timeout_s=60)
+        cls.executor.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        cls.tmp.cleanup()
+
+    def test_snapshot_round_trip_is_memory_mapped(self):
+        import numpy as np
+
+        from app.services.storage.snapshots import load_snapshot
+
+        df = load_snapshot(self.snapshot)
+        self.assertEqual(list(df.columns), ["g", "v"])
+        self.assertIsInstance(df["v"].to_numpy().base, np.memmap)
+
+    def test_timeout_and_cancel_replace_the_worker(self):
+        import threading
+
+        from app.services.executor import AnalysisCancelled, AnalysisTimeout
+        from app.services.planner import Plan
+
+        plan = Plan(method="kruskal", params={"group": "g", "value": "v"})
+        with self.assertRaises(AnalysisTimeout):
+            self.executor.execute(self.snapshot, plan, timeout_s=0.01)
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(AnalysisCancelled):
+            self.executor.execute(self.snapshot, plan, cancel=cancel)
+
+        self.assertEqual(self.executor.execute(self.snapshot, plan).method, "kruskal")
+        stats = self.executor.stats()
+        self.assertGreaterEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["cancelled"], 1)
+        self.assertEqual(stats["busy"], 0)
+
+    def test_engine_errors_are_reraised(self):
+        from app.services.planner import Plan
+
+        with self.assertRaises(KeyError):
+            self.executor.execute(self.snapshot, Plan(method="kruskal", params={"group": "missing", "value": "v"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
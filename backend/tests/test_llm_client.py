@@ -0,0 +1,292 @@
+import unittest
+
+
+class _StandInLLM:
+    """Tiny OpenAI-compatible server: optional leading failures, artificial latency, connection tracking."""
+
+    def __init__(self, *, fail_first: int = 0, fail_status: int = 429, delay_s: float = 0.0, reply=None):
+        import json
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.fail_first = fail_first
+        self.requests = 0
+        self.last_body = None
+        self.reply = reply or (lambda prompt: prompt.upper())
+        self.connections: set[tuple[str, int]] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with lock:
+                    server.requests += 1
+                    server.last_body = body
+                    server.connections.add(self.client_address)
+                    failing = server.requests <= server.fail_first
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                time.sleep(delay_s)
+                with lock:
+                    server.in_flight -= 1
+                if failing:
+                    payload, status = b'{"error":"busy"}', fail_status
+                else:
+                    reply = {"choices": [{"message": {"content": server.reply(body["messages"][-1]["content"])}}]}
+                    payload, status = json.dumps(reply).encode(), 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class LLMClientPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    def _pool(self, **overrides):
+        from app.services.llm.client import LLMClientPool
+
+        opts = dict(
+            max_concurrency=4, max_connections=4, keepalive_expiry_s=30, connect_timeout_s=2,
+            read_timeout_s=5, max_retries=3, retry_backoff_s=0.01, http2=False,
+        )
+        opts.update(overrides)
+        pool = LLMClientPool(**opts)
+        self.addCleanup(pool.close)
+        return pool
+
+    def _config(self, server):
+        from app.services.llm.client import LLMModelConfig
+
+        return LLMModelConfig(provider="custom", api_key="k", base_url=server.base_url, model="stand-in")
+
+    def test_reuses_keepalive_connection(self):
+        server = _StandInLLM()
+        self.addCleanup(server.close)
+        pool = self._pool()
+        for i in range(5):
+            self.assertEqual(pool.call(config=self._config(server), system_prompt="s", user_prompt=f"q{i}"), f"Q{i}")
+        self.assertEqual(server.requests, 5)
+        self.assertEqual(len(server.connections), 1)
+        stats = pool.stats()
+        self.assertEqual((stats["calls"], stats["errors"], stats["clients"]), (5, 0, 1))
+        self.assertIsNotNone(stats["latency_p95_s"])
+
+    def test_retries_429_then_gives_up(self):
+        from app.services.llm.client import LLMError
+
+        server = _StandInLLM(fail_first=2)
+        self.addCleanup(server.close)
+        pool = self._pool()
+        self.assertEqual(pool.call(config=self._config(server), system_prompt="s", user_prompt="ok"), "OK")
+        self.assertEqual(pool.stats()["retries"], 2)
+
+        failing = _StandInLLM(fail_first=100, fail_status=503)
+        self.addCleanup(failing.close)
+        with self.assertRaises(LLMError):
+            self._pool(max_retries=1).call(config=self._config(failing), system_prompt="s", user_prompt="x")
+        self.assertEqual(failing.requests, 2)
+
+    def test_semaphore_bounds_concurrent_calls(self):
+        import asyncio
+
+        server = _StandInLLM(delay_s=0.1)
+        self.addCleanup(server.close)
+        pool = self._pool(max_concurrency=2)
+        cfg = self._config(server)
+
+        async def burst():
+            return await asyncio.gather(*[pool.acall(config=cfg, system_prompt="s", user_prompt=f"p{i}") for i in range(6)])
+
+        self.assertEqual(asyncio.run(burst()), [f"P{i}" for i in range(6)])
+        self.assertLessEqual(server.max_in_flight, 2)
+
+    def test_response_cache_ttl_bound_and_sampling_bypass(self):
+        import shutil
+        import tempfile
+        import time
+        from dataclasses import replace
+
+        from sqlalchemy import func, select
+        from sqlalchemy.orm import sessionmaker
+
+        from app.db.models import Base, LLMCacheModel
+        from app.db.session import build_engine
+        from app.services.llm.cache import LLMResponseCache
+
+        # eviction works on the whole table, so the cache gets a database of its own
+        tmp = tempfile.mkdtemp(prefix="llm-cache-test-")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        engine = build_engine(f"sqlite:///{tmp}/cache.db")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine, autoflush=False, future=True)
+
+        server = _StandInLLM()
+        self.addCleanup(server.close)
+        cache = LLMResponseCache(enabled=True, ttl_s=0.5, max_entries=3, allow_sampling=False, factory=factory)
+        pool = self._pool(cache=cache)
+        greedy = replace(self._config(server), temperature=0.0)
+
+        for _ in range(3):
+            self.assertEqual(pool.call(config=greedy, system_prompt="s", user_prompt="same"), "SAME")
+        self.assertEqual(server.requests, 1)
+
+        sampled = replace(greedy, temperature=0.7)
+        pool.call(config=sampled, system_prompt="s", user_prompt="same")
+        self.assertEqual(server.requests, 2)
+
+        for i in range(5):
+            pool.call(config=greedy, system_prompt="s", user_prompt=f"fill{i}")
+        with factory() as db:
+            self.assertEqual(db.scalar(select(func.count()).select_from(LLMCacheModel)), 3)
+
+        time.sleep(0.6)
+        requests = server.requests
+        pool.call(config=greedy, system_prompt="s", user_prompt="fill4")
+        self.assertEqual(server.requests, requests + 1)
+        self.assertGreaterEqual(cache.stats()["hits"], 2)
+
+
+def _stored_config(key):
+    from app.db.models import AppConfigModel
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as db:
+        row = db.get(AppConfigModel, key)
+        return dict(row.value) if row is not None else None
+
+
+def _restore_config(key, value):
+    """Put an app_config row back the way _stored_config found it (deleting it if it was absent)."""
+    from sqlalchemy import update
+
+    from app.db.models import AppConfigModel, ConfigVersionModel
+    from app.db.session import SessionLocal
+    from app.services.config_store import config_cache, set_config
+
+    with SessionLocal() as db:
+        if value is not None:
+            set_config(db, key, value)
+            return
+        row = db.get(AppConfigModel, key)
+        if row is not None:
+            db.delete(row)
+            db.execute(update(ConfigVersionModel).values(version=ConfigVersionModel.version + 1))
+            db.commit()
+        config_cache.invalidate()
+
+
+class SpeculativePlanningTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import json
+        import sys
+
+        sys.path.insert(0, "backend")
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        cls.client = TestClient(app)
+        merged = {"intent": {"task": "correlation", "x": "x", "y": "y"}, "plan": {"method": "pearson", "params": {"x": "x", "y": "y"}}}
+        cls.answer = json.dumps(merged)
+
+    def _configure(self, server):
+        from unittest import mock
+
+        from app.core.settings import settings
+        from app.services.llm.cache import llm_cache
+
+        body = {"provider": "custom", "api_key": "k", "base_url": server.base_url, "model": "stand-in"}
+        self.addCleanup(_restore_config, "model_config", _stored_config("model_config"))
+        self.client.put("/api/v2/config/model", json=body)
+        budget = settings.llm_plan_budget_s
+        self.addCleanup(setattr, settings, "llm_plan_budget_s", budget)
+        # planning calls are cacheable now; every test here must reach the stand-in server
+        patcher = mock.patch.object(llm_cache, "enabled", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _plan_event(self, message, csv="x,y,g\n1,2,a\n2,4,a\n3,3,b\n4,9,b\n5,8,b\n"):
+        import json
+
+        sid = self.client.post("/api/v2/upload", files={"file": ("t.csv", csv.encode(), "text/csv")}).json()["session_id"]
+        with self.client.stream("POST", "/api/v2/chat/stream", json={"session_id": sid, "message": message}) as resp:
+            lines = list(resp.iter_lines())
+        idx = lines.index("event: plan")
+        return json.loads(lines[idx + 1][5:])
+
+    def test_merged_llm_plan_within_budget(self):
+        from unittest import mock
+
+        from app.core.settings import settings
+
+        server = _StandInLLM(reply=lambda _: self.answer)
+        self.addCleanup(server.close)
+        self._configure(server)
+
+        plan = self._plan_event("x 和 y 有没有关系")
+        self.assertEqual((plan["source"], plan["method"]), ("llm", "pearson"))
+        self.assertEqual(server.requests, 1)  # intent + plan in one round-trip
+        self.assertEqual(server.last_body["temperature"], 0.0)  # planning is greedy, hence cacheable
+
+        with mock.patch.object(settings, "llm_planning_use_model_temperature", True):
+            self._plan_event("x 和 y 有没有关系")
+        self.assertEqual(server.last_body["temperature"], 0.2)  # the model config's default
+
+    def test_llm_plan_used_when_heuristic_cannot_classify_data(self):
+        import json
+
+        answer = json.dumps({"intent": {"task": "chi_square", "x": "a", "y": "b"},
+                             "plan": {"method": "chi_square", "params": {"x": "a", "y": "b"}}})
+        server = _StandInLLM(reply=lambda _: answer)
+        self.addCleanup(server.close)
+        self._configure(server)
+
+        # only categorical columns: suggest_default_method raises, the LLM plan still wins
+        plan = self._plan_event("这两个字段有关联吗", csv="a,b\nu,p\nv,q\nu,q\nv,p\nu,p\n")
+        self.assertEqual((plan["source"], plan["method"]), ("llm", "chi_square"))
+
+    def test_slow_llm_falls_back_to_heuristic_plan(self):
+        import time
+
+        from app.core.settings import settings
+
+        server = _StandInLLM(delay_s=2.0, reply=lambda _: self.answer)
+        self.addCleanup(server.close)
+        self._configure(server)
+        settings.llm_plan_budget_s = 0.2
+
+        started = time.monotonic()
+        plan = self._plan_event("请做差异检验 group=g,value=y")
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(plan["source"], "heuristic")
+        self.assertEqual(plan["params"]["group"], "g")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+
+class SessionReaperTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from unittest import mock
+
+        from sqlalchemy.orm import sessionmaker
+
+        from app.core.settings import settings
+        from app.db.models import Base
+        from app.db.session import build_engine
+
+        # the reaper hard-deletes rows and files, so it only ever sees a throwaway database and data dir
+        tmp = tempfile.mkdtemp(prefix="reaper-test-")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        patcher = mock.patch.object(settings, "data_dir", tmp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = build_engine(f"sqlite:///{tmp}/app.db", profile="wal")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.factory = sessionmaker(bind=self.engine, autoflush=False, future=True)
+
+    def _age(self, path, seconds):
+        import os
+        import time
+
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+    def _session_with_upload(self, db):
+        from app.services.sessions import add_message, create_session
+        from app.services.storage.files import save_export_bytes, save_upload_bytes
+
+        s = create_session(db)
+        _, s.file_uri = save_upload_bytes(s.session_id, "t.csv", b"x,y\n1,2\n2,4\n3,3\n")
+        db.commit()
+        add_message(db, session_id=s.session_id, role="user", content="X=x,Y=y")
+        add_message(db, session_id=s.session_id, role="assistant", content="ok",
+                    analysis={"method": "pearson", "visualizations": [{"type": "scatter", "sid": s.session_id}]})
+        save_export_bytes(s.session_id, "report.md", b"# r")
+        return s.session_id
+
+    def test_purges_expired_sessions_and_orphans(self):
+        from datetime import datetime, timedelta, timezone
+        from pathlib import Path
+
+        import pandas as pd
+        from sqlalchemy import func, select, text
+
+        from app.db.models import MessageModel, SessionModel
+        from app.services.reaper import SessionReaper
+        from app.services.sessions import soft_delete_session
+        from app.services.storage.blobs import blob_path, put_json_blob
+        from app.services.storage.paths import session_export_dir, session_upload_dir
+        from app.services.storage.snapshots import write_snapshot
+
+        with self.factory() as db:
+            expired, recent, live = (self._session_with_upload(db) for _ in range(3))
+            soft_delete_session(db, expired)
+            soft_delete_session(db, recent)
+            db.get(SessionModel, expired).deleted_at = datetime.now(timezone.utc) - timedelta(days=30)
+            db.commit()
+            live_uri = db.get(SessionModel, live).file_uri
+
+        # a re-upload into the live session leaves its previous snapshot unreferenced
+        frame = pd.DataFrame({"x": [1, 2, 3], "y": [2, 4, 3]})
+        replaced = Path(write_snapshot(frame, live_uri))
+        with open(live_uri, "ab") as f:
+            f.write(b"4,9\n")
+        current = Path(write_snapshot(frame, live_uri))
+        for snap in (replaced, current):
+            self._age(snap, 30 * 86400)
+
+        # an export dir left behind by a session row that never got committed, and a stray blob
+        orphan_dir = session_export_dir("never-committed")
+        orphan_dir.mkdir(parents=True, exist_ok=True)
+        (orphan_dir / "x.md").write_bytes(b"x" * 100)
+        self._age(orphan_dir, 30 * 86400)
+        stray = put_json_blob([{"stray": True}])
+        self._age(blob_path(stray), 30 * 86400)
+
+        reaper = SessionReaper(self.factory, grace_s=7 * 86400, interval_s=3600, batch_size=1, vacuum_pages=100)
+        report = reaper.run_once()
+
+        self.assertEqual(report["sessions"], 1)
+        self.assertEqual(report["messages"], 2)
+        self.assertEqual(report["blobs"], 1)
+        self.assertGreater(report["bytes"], 0)
+        with self.factory() as db:
+            self.assertIsNone(db.get(SessionModel, expired))
+            self.assertEqual(db.scalar(select(func.count()).where(MessageModel.session_id == expired)), 0)
+            self.assertIsNotNone(db.get(SessionModel, recent))  # still inside the grace period
+            self.assertIsNotNone(db.get(SessionModel, live))
+            live_refs = db.scalars(select(MessageModel.visualizations_ref).where(MessageModel.session_id == live)).all()
+        self.assertFalse(session_upload_dir(expired).exists())
+        self.assertFalse(session_export_dir(expired).exists())
+        self.assertFalse(orphan_dir.exists())
+        self.assertTrue(session_upload_dir(recent).exists())
+        self.assertFalse(blob_path(stray).exists())
+        self.assertFalse(replaced.exists())
+        self.assertTrue(current.exists())
+        self.assertTrue(live_refs and all(blob_path(r).exists() for r in live_refs if r))
+        self.assertEqual(reaper.stats()["runs"], 1)
+
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA auto_vacuum")).scalar(), 2)  # incremental
+        self.assertIn("vacuum_pages", report)
+
+    def test_keeps_a_blob_reused_after_the_candidate_scan(self):
+        from app.services.reaper import SessionReaper
+        from app.services.storage.blobs import blob_path, put_json_blob
+
+        payload = [{"type": "bar", "data": {"categories": ["a"], "values": [1]}}]
+        digest = put_json_blob(payload)
+        self._age(blob_path(digest), 30 * 86400)
+
+        def factory():
+            # a chat turn reuses the blob while the reaper looks up references
+            put_json_blob(payload)
+            return self.factory()
+
+        reaper = SessionReaper(factory, grace_s=7 * 86400, interval_s=3600, batch_size=10, vacuum_pages=100)
+        report = {"blobs": 0, "bytes": 0}
+        reaper._purge_orphan_blobs(report)
+        self.assertEqual(report["blobs"], 0)
+        self.assertTrue(blob_path(digest).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+
+class SerializationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+
+    def test_non_finite_and_numpy_values_in_one_pass(self):
+        import json
+
+        import numpy as np
+
+        from app.core.serialization import FastJSONResponse, dumps
+
+        payload = {
+            "p_value": float("nan"),
+            "effect_size": np.float64("inf"),
+            "n": np.int64(12),
+            "significant": np.bool_(False),
+            "series": np.array([1.5, np.nan, -np.inf]),
+            "strided": np.arange(6, dtype=float)[::2],
+            "labels": np.array(["甲", "乙"], dtype=object),
+            "nested": [{"x": np.float32(0.5)}, (1, float("-inf"))],
+        }
+        decoded = json.loads(dumps(payload))
+        self.assertEqual(decoded, {
+            "p_value": None,
+            "effect_size": None,
+            "n": 12,
+            "significant": False,
+            "series": [1.5, None, None],
+            "strided": [0.0, 2.0, 4.0],
+            "labels": ["甲", "乙"],
+            "nested": [{"x": 0.5}, [1, None]],
+        })
+        self.assertIn("甲".encode(), dumps(payload))
+        self.assertEqual(FastJSONResponse(content={"v": float("nan")}).body, b'{"v":null}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+
+
+class SessionSearchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+        from app.db.init_db import init_db
+
+        init_db()
+
+    def _turn(self, db, *, file_name, question, answer, method):
+        from app.services.sessions import ChatTurn
+
+        turn = ChatTurn.open(db, None, industry="manufacturing")
+        turn.session.file_name = file_name
+        turn.add_message("user", question)
+        turn.add_message("assistant", answer, {"method": method})
+        turn.record_method(method)
+        turn.commit()
+        return turn.session_id
+
+    def _ids(self, db, **filters):
+        from app.services.sessions import list_sessions
+
+        opts = dict(page=1, size=100, keyword=None, industry=None, method=None, start_date=None, end_date=None)
+        opts.update(filters)
+        return {s.session_id for s in list_sessions(db, **opts)[1]}
+
+    def test_method_filter_and_full_text_search(self):
+        import uuid
+
+        from app.db.search import fts_enabled
+        from app.db.session import SessionLocal
+
+        tag = uuid.uuid4().hex[:8]
+        with SessionLocal() as db:
+            a = self._turn(db, file_name=f"line_{tag}.csv", question="请做方差分析 group=线别", answer="各线别均值差异显著", method="anova")
+            b = self._turn(db, file_name=f"yield_{tag}.xlsx", question="良率和温度有关系吗", answer=f"相关系数 r=0.82 批次{tag}", method="welch_anova")
+
+            self.assertTrue(fts_enabled())
+            self.assertIn(a, self._ids(db, method="anova"))
+            self.assertNotIn(b, self._ids(db, method="anova"))  # no substring false positive
+            self.assertIn(b, self._ids(db, method="welch_anova"))
+
+            self.assertEqual(self._ids(db, keyword=f"line_{tag}"), {a})       # file name
+            self.assertEqual(self._ids(db, keyword=f"批次{tag}"), {b})          # assistant message content
+            self.assertIn(a, self._ids(db, keyword="方差分析"))                  # Chinese substring (trigram)
+            self.assertIn(b, self._ids(db, keyword="良率"))                      # two characters: pair index
+            self.assertIn(a, self._ids(db, keyword="显著"))                      # ... in message content too
+            self.assertIn(b, self._ids(db, keyword="率"))                        # one character: prefix query
+            self.assertNotIn(a, self._ids(db, keyword="良率"))
+            self.assertEqual(self._ids(db, keyword=f'"{tag} OR x'), set())      # query syntax is quoted
+
+    def test_short_keywords_use_the_pair_index_and_follow_writes(self):
+        import uuid
+
+        from sqlalchemy import delete, select
+
+        from app.db.models import MessageModel, SessionModel
+        from app.db.session import SessionLocal
+        from app.services.sessions import _keyword_matches
+
+        self.assertIn("messages_grams", str(_keyword_matches("回归")))
+        self.assertIn("messages_fts", str(_keyword_matches("回归分析")))
+
+        tag = uuid.uuid4().hex[:6]
+        with SessionLocal() as db:
+            sid = self._turn(db, file_name=f"{tag}.csv", question="做一下回归", answer=f"斜率显著 {tag}", method="linear_regression")
+            self.assertIn(sid, self._ids(db, keyword="回归"))
+            self.assertIn(sid, self._ids(db, keyword="斜率"))
+
+            db.get(SessionModel, sid).first_query = "看看方差"
+            db.commit()
+            self.assertIn(sid, self._ids(db, keyword="方差"))
+
+            db.execute(delete(MessageModel).where(MessageModel.session_id == sid))
+            db.commit()
+            self.assertNotIn(sid, self._ids(db, keyword="回归"))  # gone from first_query and messages
+            self.assertNotIn(sid, self._ids(db, keyword="斜率"))
+            self.assertIsNotNone(db.scalar(select(SessionModel.session_id).where(SessionModel.session_id == sid)))
+
+    def test_backfills_existing_rows_into_search_index(self):
+        import shutil
+        import tempfile
+
+        from sqlalchemy import text
+        from sqlalchemy.orm import sessionmaker
+
+        from app.db.init_db import init_db
+        from app.db.session import build_engine
+
+        # drops tables to mimic a pre-Alembic, pre-FTS database: never on the real app.db
+        tmp = tempfile.mkdtemp(prefix="search-adopt-test-")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        engine = build_engine(f"sqlite:///{tmp}/app.db")
+        self.addCleanup(engine.dispose)
+        init_db(engine)
+        factory = sessionmaker(bind=engine, autoflush=False, future=True)
+
+        with factory() as db:
+            sid = self._turn(db, file_name="legacy.csv", question="历史会话检索回填", answer="ok", method="kruskal")
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE sessions_fts"))
+            conn.execute(text("DROP TABLE messages_fts"))
+            conn.execute(text("DROP TABLE sessions_grams"))
+            conn.execute(text("DROP TABLE messages_grams"))
+            conn.execute(text("DELETE FROM session_methods WHERE session_id = :s"), {"s": sid})
+            conn.execute(text("DROP TABLE session_methods"))
+            conn.execute(text("DROP TABLE alembic_version"))  # as left by a pre-Alembic build
+        init_db(engine)
+        with factory() as db:
+            self.assertIn(sid, self._ids(db, keyword="会话检索回填"))
+            self.assertIn(sid, self._ids(db, keyword="回填"))
+            self.assertIn(sid, self._ids(db, method="kruskal"))
+
+    def test_keyset_pages_cover_the_list_once(self):
+        from alembic.script import ScriptDirectory
+        from sqlalchemy import text
+
+        from app.db.init_db import alembic_config
+        from app.db.session import SessionLocal
+        from app.services.sessions import InvalidCursor, list_sessions, session_totals
+
+        opts = dict(keyword=None, industry="manufacturing", method=None, start_date=None, end_date=None)
+        with SessionLocal() as db:
+            for i in range(7):
+                self._turn(db, file_name=f"page{i}.csv", question="分页", answer="ok", method="pareto")
+            expected = [s.session_id for s in list_sessions(db, page=1, size=1000, **opts)[1]]
+            total = list_sessions(db, page=1, size=1, **opts)[0]
+            self.assertEqual(total, len(expected))
+
+            seen, cursor = [], None
+            while True:
+                page_total, items, cursor = list_sessions(db, page=1, size=3, cursor=cursor, with_total=False, **opts)
+                self.assertIsNone(page_total)
+                seen.extend(s.session_id for s in items)
+                if cursor is None:
+                    break
+            self.assertEqual(seen, expected)
+
+            # the cached total follows local creates without waiting for the TTL
+            self._turn(db, file_name="late.csv", question="分页", answer="ok", method="pareto")
+            self.assertEqual(list_sessions(db, page=1, size=1, **opts)[0], total + 1)
+            self.assertEqual(len(session_totals._totals), 1)
+
+            with self.assertRaises(InvalidCursor):
+                list_sessions(db, page=1, size=3, cursor="not-a-cursor", **opts)
+
+            plan = db.execute(
+                text("EXPLAIN QUERY PLAN SELECT session_id FROM sessions WHERE deleted_at IS NULL "
+                     "ORDER BY updated_at DESC, session_id DESC LIMIT 3")
+            ).all()
+            self.assertIn("ix_sessions_live_updated", " ".join(str(r[-1]) for r in plan))
+            head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+            self.assertEqual(db.execute(text("SELECT version_num FROM alembic_version")).scalar_one(), head)
+
+
+if __name__ == "__main__":
+    unittest.main()
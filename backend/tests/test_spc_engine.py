@@ -0,0 +1,179 @@
+import unittest
+
+
+def _baseline_western_rules(values, cl, sigma, enabled_rules):
+    """Frozen copy of the original per-point loop, kept as the reference for the vectorized kernel."""
+    if sigma <= 0:
+        return []
+    z = [(v - cl) / sigma for v in values]
+    anomalies = []
+    for i in range(len(values)):
+        zi = z[i]
+        if 1 in enabled_rules and abs(zi) > 3:
+            anomalies.append((i, 1))
+        if 2 in enabled_rules and i >= 8:
+            window = z[i - 8 : i + 1]
+            if all(v > 0 for v in window) or all(v < 0 for v in window):
+                anomalies.append((i, 2))
+        if 3 in enabled_rules and i >= 5:
+            window = values[i - 5 : i + 1]
+            if all(window[j] > window[j - 1] for j in range(1, 6)) or all(
+                window[j] < window[j - 1] for j in range(1, 6)
+            ):
+                anomalies.append((i, 3))
+        if 4 in enabled_rules and i >= 13:
+            window = values[i - 13 : i + 1]
+            if all((window[j] - window[j - 1]) * (window[j - 1] - window[j - 2]) < 0 for j in range(2, 14)):
+                anomalies.append((i, 4))
+        if 5 in enabled_rules and i >= 2:
+            window = z[i - 2 : i + 1]
+            if sum(1 for v in window if v > 2) >= 2 or sum(1 for v in window if v < -2) >= 2:
+                anomalies.append((i, 5))
+        if 6 in enabled_rules and i >= 4:
+            window = z[i - 4 : i + 1]
+            if sum(1 for v in window if v > 1) >= 4 or sum(1 for v in window if v < -1) >= 4:
+                anomalies.append((i, 6))
+        if 7 in enabled_rules and i >= 14:
+            window = z[i - 14 : i + 1]
+            if all(abs(v) < 1 for v in window):
+                anomalies.append((i, 7))
+        if 8 in enabled_rules and i >= 7:
+            window = z[i - 7 : i + 1]
+            if all(abs(v) > 1 for v in window):
+                anomalies.append((i, 8))
+    return anomalies
+
+
+class SpcEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import sys
+
+        sys.path.insert(0, "backend")
+        import numpy as np
+        import pandas as pd
+
+        cls.np = np
+        cls.pd = pd
+
+    def _plant_frame(self, n_streams: int = 12, per_stream: int = 60):
+        np, pd = self.np, self.pd
+        rng = np.random.default_rng(7)
+        rows = []
+        for s in range(n_streams):
+            vals = rng.normal(10.0, 0.5, size=per_stream)
+            if s == 3:
+                vals[40:] += 3.0  # sustained shift on one spindle
+            # each spindle logs at its own irregular pace; time order within a stream is kept
+            at = np.cumsum(rng.exponential(1.0, size=per_stream))
+            rows.append(pd.DataFrame({"at": at, "spindle": f"S{s:03d}", "diameter": vals}))
+        # interleave streams by arrival time the way a plant log would
+        df = pd.concat(rows, ignore_index=True).sort_values("at", kind="stable", ignore_index=True)
+        assert df["spindle"].ne(df["spindle"].shift()).mean() > 0.5
+        return df
+
+    def test_stratified_matches_per_stream_detection(self):
+        from app.services.engine.spc import compute_basic_limits, compute_stratified_limits
+
+        np, pd = self.np, self.pd
+        df = self._plant_frame()
+        codes, uniques = pd.factorize(df["spindle"])
+        values = df["diameter"].to_numpy(dtype=float)
+        rules = list(range(1, 9))
+
+        serial = compute_stratified_limits(values, codes, len(uniques), rules)
+        parallel = compute_stratified_limits(values, codes, len(uniques), rules, parallel_threshold=0, max_workers=4)
+        np.testing.assert_array_equal(serial["anomaly_count"], parallel["anomaly_count"])
+        np.testing.assert_array_equal(serial["rule_counts"], parallel["rule_counts"])
+
+        for i, key in enumerate(uniques):
+            stream = values[codes == i].tolist()
+            lim = compute_basic_limits(stream)
+            hits = _baseline_western_rules(stream, lim["cl"], lim["sigma"], rules)
+            self.assertEqual(int(serial["anomaly_count"][i]), len({idx for idx, _ in hits}), key)
+            self.assertAlmostEqual(float(serial["cl"][i]), lim["cl"], places=9)
+
+    def test_stratified_ranks_shifted_stream_first_and_fetches_on_demand(self):
+        from app.services.engine.methods import spc_stratified
+
+        df = self._plant_frame()
+        result = spc_stratified(df, y="diameter", group="spindle")
+        self.assertEqual(result.method, "spc_stratified")
+        streams = result.visualizations[0]["data"]["streams"]
+        self.assertEqual(streams[0]["stream"], "S003")
+        self.assertEqual(len(streams), 12)
+
+        one = spc_stratified(df, y="diameter", group="spindle", stream="S003")
+        self.assertEqual(one.visualizations[0]["type"], "control_chart")
+        self.assertIn("S003", one.interpretation)
+
+    def test_ewma_and_cusum_match_naive_recursion(self):
+        from app.services.engine.spc import compute_cusum_limits, compute_ewma_limits, cusum_kernel, ewma_filter
+
+        np = self.np
+        rng = np.random.default_rng(3)
+        x = rng.normal(size=1000)
+
+        z, prev = [], 0.5
+        for v in x:
+            prev = 0.2 * v + 0.8 * prev
+            z.append(prev)
+        np.testing.assert_allclose(ewma_filter(x, 0.2, 0.5), z)
+
+        c, prev = [], 1.0
+        for v in x:
+            prev = max(0.0, prev + v - 0.3)
+            c.append(prev)
+        np.testing.assert_allclose(cusum_kernel(x - 0.3, 1.0, chunk=64), c)
+
+        # appending from the saved state equals one pass with the same parameters
+        for compute in (compute_ewma_limits, compute_cusum_limits):
+            head = compute(x[:600])
+            tail = compute(x[600:], state=head["state"])
+            fresh = dict(head["state"], n=0, z=head["state"].get("cl"), c_plus=0.0, c_minus=0.0)
+            full = compute(x, state=fresh)
+            np.testing.assert_allclose(np.concatenate([head["chart_series"], tail["chart_series"]]), full["chart_series"])
+
+    def test_small_shift_charts_flag_sustained_shift(self):
+        from app.services.engine.methods import spc_control_chart
+
+        np, pd = self.np, self.pd
+        rng = np.random.default_rng(5)
+        vals = rng.normal(0.0, 1.0, size=400)
+        vals[200:] += 1.0
+        df = pd.DataFrame({"v": vals})
+        for chart_type in ("EWMA", "CUSUM"):
+            result = spc_control_chart(df, y="v", chart_type=chart_type)
+            data = result.visualizations[0]["data"]
+            self.assertEqual(data["chart_type"], chart_type)
+            self.assertTrue(any(x > 200 for x in data["anomalies"]), chart_type)
+
+    def test_columnar_payload_downsamples_but_keeps_anomalies(self):
+        from app.services.engine.methods import spc_control_chart
+        from app.services.charts import control_chart_series as _control_chart_series
+
+        np, pd = self.np, self.pd
+        vals = np.random.default_rng(11).normal(size=500_000)
+        vals[[1234, 250_000, 499_998]] = [9.0, -9.0, 9.0]
+        result = spc_control_chart(pd.DataFrame({"v": vals}), y="v")
+        data = result.visualizations[0]["data"]
+        self.assertEqual(data["format"], "columnar")
+        self.assertEqual(data["n"], 500_000)
+        self.assertLess(len(data["y"]), 500_000)
+        self.assertEqual(len(data["x"]), len(data["y"]))
+        for x in (1235, 250_001, 499_999):
+            self.assertIn(x, data["anomalies"])
+            self.assertIn(1, data["rules"][str(x)])
+
+        xs, ys, anomalies, n = _control_chart_series(data)
+        self.assertEqual(n, 500_000)
+        self.assertEqual(len(anomalies), len(data["anomalies"]))
+        self.assertTrue(all(y is not None for _, y, _ in anomalies))
+
+        legacy = {"points": [{"x": 1, "y": 0.5, "is_anomaly": False, "rule_violated": []},
+                             {"x": 2, "y": 4.0, "is_anomaly": True, "rule_violated": [1]}]}
+        self.assertEqual(_control_chart_series(legacy), ([1, 2], [0.5, 4.0], [(2, 4.0, [1])], 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
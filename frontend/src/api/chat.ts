@@ -1,5 +1,5 @@
-import apiClient from './index';
-import type { ChatRequest, ChatResponse } from '../types/api';
+import apiClient, { API_BASE_URL } from './index';
+import type { ChatBatchRequest, ChatBatchResponse, ChatRequest, ChatResponse, ChatStreamHandlers } from '../types/api';
 
 export const chatApi = {
   /**
@@ -8,4 +8,63 @@ export const chatApi = {
   sendMessage: async (data: ChatRequest): Promise<ChatResponse> => {
     return apiClient.post<ChatResponse, ChatResponse>('/api/v2/chat', data);
   },
+
+  /**
+   * 批量提问：同一数据集只加载一次，结果按提问顺序返回
+   */
+  sendBatch: async (data: ChatBatchRequest): Promise<ChatBatchResponse> => {
+    return apiClient.post<ChatBatchResponse, ChatBatchResponse>('/api/v2/chat/batch', data);
+  },
+
+  /**
+   * 流式发送对话消息（SSE）：按阶段推送事件；statistic 与 charts 在分析完成后相继发出，
+   * 结论可先于图表数据解析、渲染
+   */
+  streamMessage: async (data: ChatRequest, handlers: ChatStreamHandlers, signal?: AbortSignal): Promise<void> => {
+    const headers: Record<string, string> = { 'Content-Type': 'application/json', Accept: 'text/event-stream' };
+    const token = localStorage.getItem('auth_token');
+    if (token) {
+      headers.Authorization = `Bearer ${token}`;
+    }
+
+    const resp = await fetch(`${API_BASE_URL}/api/v2/chat/stream`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify(data),
+      signal,
+    });
+    if (!resp.ok || !resp.body) {
+      const body = await resp.json().catch(() => ({}));
+      throw new Error(body?.message || body?.detail || '服务器错误');
+    }
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep = buffer.indexOf('\n\n');
+      while (sep !== -1) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        sep = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        const dataLines: string[] = [];
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+        }
+        if (!dataLines.length) continue;
+        const payload = JSON.parse(dataLines.join('\n'));
+
+        if (event === 'error') {
+          throw new Error(payload?.detail || '服务器错误');
+        }
+        handlers[event as keyof ChatStreamHandlers]?.(payload);
+      }
+    }
+  },
 };
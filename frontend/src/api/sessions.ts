@@ -1,5 +1,14 @@
 import apiClient from './index';
-import type { SessionsQuery, SessionsResponse, SessionDetail } from '../types/session';
+import type {
+  MessageVisualizations,
+  SessionsQuery,
+  SessionsResponse,
+  SessionDetail,
+  SessionMessage,
+} from '../types/session';
+
+const MESSAGE_PAGE_SIZE = 200;
+const PAGE_CONCURRENCY = 4;
 
 export const sessionsApi = {
   /**
@@ -10,19 +19,55 @@ export const sessionsApi = {
   },
 
   /**
-   * 获取会话详情
+   * 获取会话详情的一页消息（analysis 不含图表数据）
    */
-  getSessionDetail: async (sessionId: string): Promise<SessionDetail> => {
-    const detail = await apiClient.get<SessionDetail, SessionDetail>(`/api/v2/session/${sessionId}`);
-    if (detail?.messages?.length) {
-      detail.messages = detail.messages.map((m: any) => ({
-        ...m,
-        timestamp: new Date(m.timestamp),
-      }));
-    }
+  getSessionPage: async (sessionId: string, page = 1): Promise<SessionDetail> => {
+    const detail = await apiClient.get<SessionDetail, SessionDetail>(`/api/v2/session/${sessionId}`, {
+      params: { page, size: MESSAGE_PAGE_SIZE },
+    });
+    detail.messages = (detail.messages || []).map((m: any) => ({
+      ...m,
+      timestamp: new Date(m.timestamp),
+    }));
     return detail;
   },
 
+  /**
+   * 补齐尚未加载的消息页（最多 PAGE_CONCURRENCY 个请求并行，按页序拼接）
+   */
+  withAllMessages: async (detail: SessionDetail): Promise<SessionDetail> => {
+    const total = detail.messages_total ?? detail.messages.length;
+    const loaded = Math.ceil(detail.messages.length / MESSAGE_PAGE_SIZE);
+    const pages: number[] = [];
+    for (let page = loaded + 1; (page - 1) * MESSAGE_PAGE_SIZE < total; page++) pages.push(page);
+    const results: SessionMessage[][] = new Array(pages.length);
+    let next = 0;
+    const worker = async () => {
+      while (next < pages.length) {
+        const i = next++;
+        results[i] = (await sessionsApi.getSessionPage(detail.session_id, pages[i])).messages;
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(PAGE_CONCURRENCY, pages.length) }, worker));
+    return { ...detail, messages: [...detail.messages, ...results.flat()] };
+  },
+
+  /**
+   * 获取会话详情（全部消息；图表数据按需通过 getMessageVisualizations 获取）
+   */
+  getSessionDetail: async (sessionId: string): Promise<SessionDetail> => {
+    return sessionsApi.withAllMessages(await sessionsApi.getSessionPage(sessionId));
+  },
+
+  /**
+   * 获取单条消息的图表数据
+   */
+  getMessageVisualizations: async (sessionId: string, messageId: string): Promise<MessageVisualizations> => {
+    return apiClient.get<MessageVisualizations, MessageVisualizations>(
+      `/api/v2/session/${sessionId}/messages/${messageId}/visualizations`
+    );
+  },
+
   /**
    * 删除会话
    */
@@ -21,6 +21,7 @@ import type { AnalysisResult } from '../../types/chat';
 import type { DataSummary } from '../../types/session';
 import Suggestions from './Suggestions';
 import ChartContainer from '../Charts/ChartContainer';
+import { toControlPoints } from '../Charts/controlChartData';
 
 interface SpcStepsProps {
   result: AnalysisResult;
@@ -58,7 +59,7 @@ const SpcSteps: React.FC<SpcStepsProps> = ({ result, dataSummary }) => {
   const [expanded, setExpanded] = React.useState<Set<number>>(new Set([0, 1, 2, 3, 4]));
 
   const chartData = result.visualizations?.[0]?.data as any;
-  const points = Array.isArray(chartData?.points) ? chartData.points : [];
+  const { points, total } = toControlPoints(chartData);
   const ucl = chartData?.ucl ?? null;
   const cl = chartData?.cl ?? null;
   const lcl = chartData?.lcl ?? null;
@@ -101,7 +102,7 @@ const SpcSteps: React.FC<SpcStepsProps> = ({ result, dataSummary }) => {
               <strong style={{ color: '#00e676' }}>Y 变量:</strong> {yVariable}
             </Typography>
             <Typography variant="body2" gutterBottom sx={{ color: '#e0f2f1' }}>
-              <strong style={{ color: '#00e676' }}>样本量:</strong> {points.length} 个数据点
+              <strong style={{ color: '#00e676' }}>样本量:</strong> {total} 个数据点
             </Typography>
             <Typography variant="body2" gutterBottom sx={{ color: '#e0f2f1' }}>
               <strong style={{ color: '#00e676' }}>数据类型:</strong> 连续型（计量数据）
@@ -199,7 +200,7 @@ const SpcSteps: React.FC<SpcStepsProps> = ({ result, dataSummary }) => {
                 <strong style={{ color: '#00e676' }}>异常点数:</strong>
               </Typography>
               <Chip
-                label={`${anomalyPoints.length} / ${points.length}`}
+                label={`${anomalyPoints.length} / ${total}`}
                 size="small"
                 sx={{
                   bgcolor: anomalyPoints.length > 0
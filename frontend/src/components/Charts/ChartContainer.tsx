@@ -2,6 +2,7 @@ import React, { useEffect, useRef } from 'react';
 import { Box, Typography } from '@mui/material';
 import * as echarts from 'echarts';
 import type { ChartConfig } from '../../types/chat';
+import { toControlPoints } from './controlChartData';
 
 interface ChartContainerProps {
   config: ChartConfig;
@@ -153,6 +154,38 @@ function getChartOption(config: ChartConfig): echarts.EChartsOption {
       };
     }
 
+    case 'line': {
+      // Backend shape: { x: [...], series: { name: [...] }, reference?: { name: level } }
+      const d = config.data as any;
+      const xs = asArray(d?.x);
+      const seriesMap = (d?.series || {}) as Record<string, any[]>;
+      const reference = (d?.reference || {}) as Record<string, number>;
+      const names = Object.keys(seriesMap);
+      return {
+        ...baseOption,
+        tooltip: { trigger: 'axis' },
+        legend: { top: 0, data: [...names, ...Object.keys(reference)] },
+        xAxis: { type: 'value', name: config.xLabel, min: xs[0], max: xs[xs.length - 1] },
+        yAxis: { type: 'value', name: config.yLabel },
+        series: [
+          ...names.map((name) => ({
+            name,
+            type: 'line' as const,
+            data: asArray(seriesMap[name]).map((v, i) => [xs[i], v]),
+            symbol: 'none',
+            connectNulls: false,
+          })),
+          ...Object.entries(reference).map(([name, level]) => ({
+            name,
+            type: 'line' as const,
+            data: xs.length ? [[xs[0], level], [xs[xs.length - 1], level]] : [],
+            symbol: 'none',
+            lineStyle: { type: 'dashed' as const, width: 1, color: '#7f8c8d' },
+          })),
+        ],
+      };
+    }
+
     case 'distribution': {
       const d = config.data as any;
 
@@ -278,7 +311,7 @@ function getChartOption(config: ChartConfig): echarts.EChartsOption {
 
     case 'control_chart': {
       const chartData = config.data as any;
-      const points = Array.isArray(chartData?.points) ? chartData.points : [];
+      const { points, total } = toControlPoints(chartData);
       const ucl = Number(chartData?.ucl ?? 0);
       const cl = Number(chartData?.cl ?? 0);
       const lcl = Number(chartData?.lcl ?? 0);
@@ -324,7 +357,7 @@ function getChartOption(config: ChartConfig): echarts.EChartsOption {
           },
         },
         legend: { top: 0, data: ['数据', '异常点', 'UCL', 'CL', 'LCL'] },
-        xAxis: { type: 'value', name: '样本序号', min: 1, max: xData.length },
+        xAxis: { type: 'value', name: '样本序号', min: 1, max: total },
         yAxis: { type: 'value', name: chartType },
         series: [
           {
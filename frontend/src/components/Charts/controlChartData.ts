@@ -0,0 +1,29 @@
+export interface ControlPoint {
+  x: number;
+  y: number;
+  is_anomaly: boolean;
+  rule_violated: number[];
+}
+
+/**
+ * Normalize a control-chart payload into display points.
+ * Accepts the columnar shape ({ x, y, anomalies, rules, n }, possibly downsampled
+ * but always containing every anomaly) and the legacy per-point shape ({ points }).
+ */
+export function toControlPoints(data: any): { points: ControlPoint[]; total: number } {
+  if (data?.format === 'columnar') {
+    const ys: number[] = Array.isArray(data.y) ? data.y : [];
+    const xs: number[] = Array.isArray(data.x) ? data.x : ys.map((_, i) => i + 1);
+    const rules: Record<string, number[]> = data.rules || {};
+    const anomalies = new Set<number>(Array.isArray(data.anomalies) ? data.anomalies : []);
+    const points = ys.map((y, i) => ({
+      x: xs[i],
+      y,
+      is_anomaly: anomalies.has(xs[i]),
+      rule_violated: rules[String(xs[i])] || [],
+    }));
+    return { points, total: Number(data.n ?? ys.length) };
+  }
+  const points: ControlPoint[] = Array.isArray(data?.points) ? data.points : [];
+  return { points, total: points.length };
+}
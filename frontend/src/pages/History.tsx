@@ -30,6 +30,7 @@ const History: React.FC = () => {
   const [filters, setFilters] = useState<SessionsQuery>({ page: 1, size: 10 });
   const [detailOpen, setDetailOpen] = useState(false);
   const [detailLoading, setDetailLoading] = useState(false);
+  const [detailLoadingMore, setDetailLoadingMore] = useState(false);
   const [detailError, setDetailError] = useState<string | null>(null);
   const [selectedDetail, setSelectedDetail] = useState<any>(null);
 
@@ -72,7 +73,7 @@ const History: React.FC = () => {
       setDetailOpen(true);
       setDetailLoading(true);
       setDetailError(null);
-      const detail = await sessionsApi.getSessionDetail(session.session_id);
+      const detail = await sessionsApi.getSessionPage(session.session_id);
       setSelectedDetail(detail);
     } catch (err) {
       setDetailError(err instanceof Error ? err.message : '获取详情失败');
@@ -82,6 +83,20 @@ const History: React.FC = () => {
     }
   };
 
+  const handleLoadMoreMessages = async () => {
+    if (!selectedDetail) return;
+    try {
+      setDetailLoadingMore(true);
+      const page = (selectedDetail.messages_page || 1) + 1;
+      const next = await sessionsApi.getSessionPage(selectedDetail.session_id, page);
+      setSelectedDetail({ ...selectedDetail, messages: [...selectedDetail.messages, ...next.messages], messages_page: page });
+    } catch (err) {
+      setDetailError(err instanceof Error ? err.message : '获取详情失败');
+    } finally {
+      setDetailLoadingMore(false);
+    }
+  };
+
   const handleExportById = async (sessionId: string) => {
     try {
       const detail = await sessionsApi.getSessionDetail(sessionId);
@@ -136,6 +151,7 @@ const History: React.FC = () => {
       setIndustry(detail.industry || null);
       setConclusion(detail.report_conclusion || null);
 
+      // charts are fetched when a message is shown (see chatStore.loadVisualizations)
       detail.messages.forEach((msg) => addMessage(msg));
 
       navigate('/');
@@ -144,14 +160,21 @@ const History: React.FC = () => {
     }
   };
 
-  const continueFromDetail = () => {
+  const continueFromDetail = async () => {
     if (!selectedDetail) return;
+    let messages;
+    try {
+      ({ messages } = await sessionsApi.withAllMessages(selectedDetail));
+    } catch (err) {
+      alert('恢复会话失败');
+      return;
+    }
     clearMessages();
     setSessionId(selectedDetail.session_id);
     setCurrentFile(selectedDetail.file_name, selectedDetail.data_summary);
     setIndustry(selectedDetail.industry || null);
     setConclusion(selectedDetail.report_conclusion || null);
-    selectedDetail.messages.forEach((msg: any) => addMessage(msg));
+    messages.forEach((msg: any) => addMessage(msg));
     setDetailOpen(false);
     setSelectedDetail(null);
     navigate('/');
@@ -235,6 +258,13 @@ const History: React.FC = () => {
                       )}
                     </Box>
                   ))}
+                  {selectedDetail.messages.length < (selectedDetail.messages_total ?? 0) && (
+                    <Button variant="text" disabled={detailLoadingMore} onClick={handleLoadMoreMessages}>
+                      {detailLoadingMore
+                        ? '加载中...'
+                        : `加载更多（已显示 ${selectedDetail.messages.length} / ${selectedDetail.messages_total} 条）`}
+                    </Button>
+                  )}
                 </Box>
               </Box>
             ) : (
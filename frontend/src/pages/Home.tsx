@@ -31,10 +31,18 @@ const Home: React.FC = () => {
     isConclusionLoading,
     setConclusion,
     setConclusionLoading,
+    loadVisualizations,
   } = useChatStore();
 
   // Find the latest analysis result from messages
-  const latestAnalysis = [...messages].reverse().find((m) => m.analysis)?.analysis || null;
+  const latestAnalysisMessage = [...messages].reverse().find((m) => m.analysis);
+  const latestAnalysis = latestAnalysisMessage?.analysis || null;
+
+  // Only the latest analysis is on screen, so a restored session fetches just its charts
+  const latestAnalysisId = latestAnalysisMessage?.id;
+  React.useEffect(() => {
+    if (latestAnalysisId) loadVisualizations(latestAnalysisId);
+  }, [latestAnalysisId, loadVisualizations]);
 
   const handleFollowUp = (text: string) => {
     sendMessage(text);
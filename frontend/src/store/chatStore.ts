@@ -1,7 +1,9 @@
 import { create } from 'zustand';
-import type { Message, MultiAnalysisResult } from '../types/chat';
+import type { ChartConfig, Message, MultiAnalysisResult } from '../types/chat';
 import { chatApi } from '../api/chat';
+import { sessionsApi } from '../api/sessions';
 import type { ChatRequest } from '../types/api';
+import type { SessionMessage } from '../types/session';
 
 interface ChatStore {
   sessionId: string | null;
@@ -16,6 +18,7 @@ interface ChatStore {
   setSessionId: (id: string | null) => void;
   addMessage: (message: Message) => void;
   sendMessage: (content: string) => Promise<void>;
+  loadVisualizations: (messageId: string) => Promise<void>;
   clearMessages: () => void;
   setError: (error: string | null) => void;
   addMultiAnalysisResult: (result: MultiAnalysisResult) => void;
@@ -60,23 +63,41 @@ export const useChatStore = create<ChatStore>((set, get) => ({
         message: content,
       };
 
-      const response = await chatApi.sendMessage(request);
-
-      // Update session ID if new
-      if (!state.sessionId && response.session_id) {
-        set({ sessionId: response.session_id });
-      }
-
-      // Add AI message
-      const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: response.reply,
-        timestamp: new Date(),
-        analysis: response.analysis,
-      };
-
-      get().addMessage(aiMessage);
+      const aiMessageId = (Date.now() + 1).toString();
+      let reply: string | null = null;
+
+      await chatApi.streamMessage(request, {
+        session: ({ session_id }) => {
+          // Update session ID if new
+          if (!state.sessionId && session_id) {
+            set({ sessionId: session_id });
+          }
+        },
+        // Sent just before the charts (both once the analysis finishes): show the conclusion
+        // without waiting for the chart payload to arrive and parse
+        statistic: (analysis) => {
+          reply = analysis.interpretation;
+          get().addMessage({
+            id: aiMessageId,
+            role: 'assistant',
+            content: analysis.interpretation,
+            timestamp: new Date(),
+            analysis: { ...analysis, visualizations: [] },
+          });
+        },
+        charts: ({ visualizations }) => {
+          set((s) => ({
+            messages: s.messages.map((m) =>
+              m.id === aiMessageId && m.analysis ? { ...m, analysis: { ...m.analysis, visualizations } } : m
+            ),
+          }));
+        },
+        done: (data) => {
+          if (reply === null) {
+            get().addMessage({ id: aiMessageId, role: 'assistant', content: data.reply, timestamp: new Date() });
+          }
+        },
+      });
     } catch (error) {
       const errorMessage = error instanceof Error ? error.message : '发送消息失败';
       set({ error: errorMessage });
@@ -94,6 +115,27 @@ export const useChatStore = create<ChatStore>((set, get) => ({
     }
   },
 
+  // Restored history messages come without chart data; fetch it when the message is shown
+  loadVisualizations: async (messageId) => {
+    const { sessionId, messages } = get();
+    const target = messages.find((m) => m.id === messageId) as SessionMessage | undefined;
+    if (!sessionId || !target?.analysis || target.analysis.visualizations || !target.visualization_count) return;
+
+    const setVisualizations = (visualizations: ChartConfig[]) =>
+      set((s) => ({
+        messages: s.messages.map((m) =>
+          m.id === messageId && m.analysis ? { ...m, analysis: { ...m.analysis, visualizations } } : m
+        ),
+      }));
+    setVisualizations([]); // marks the request as in flight
+    try {
+      const { visualizations } = await sessionsApi.getMessageVisualizations(sessionId, messageId);
+      if (get().sessionId === sessionId) setVisualizations(visualizations);
+    } catch {
+      // leave the charts empty; the rest of the analysis is already on screen
+    }
+  },
+
   clearMessages: () => set({ messages: [], sessionId: null, error: null, multiAnalysisResults: [], conclusion: null, isConclusionLoading: false }),
 
   setError: (error) => set({ error }),
@@ -17,6 +17,39 @@ export interface ChatResponse {
   visualizations: ChartConfig[];
 }
 
+export interface ChatBatchRequest {
+  session_id: string;
+  messages: (string | Record<string, unknown>)[]; // 问题文本或显式 intent
+}
+
+export interface ChatBatchItem {
+  index: number;
+  message: string;
+  status: number;
+  reply?: string;
+  analysis?: AnalysisResult;
+  suggestions?: string[];
+  visualizations?: ChartConfig[];
+  error?: string;
+}
+
+export interface ChatBatchResponse {
+  session_id: string;
+  results: ChatBatchItem[];
+}
+
+// Chat stream (SSE) events, in order: session → intent → plan → statistic → charts → done
+export type ChatStreamStatistic = Omit<AnalysisResult, 'visualizations'> & { session_id: string };
+
+export interface ChatStreamHandlers {
+  session?: (data: { session_id: string }) => void;
+  intent?: (data: Record<string, unknown>) => void;
+  plan?: (data: { method: string; params: Record<string, unknown> }) => void;
+  statistic?: (data: ChatStreamStatistic) => void;
+  charts?: (data: { visualizations: ChartConfig[] }) => void;
+  done?: (data: { session_id: string; reply: string }) => void;
+}
+
 // Upload API
 export interface UploadResponse {
   session_id: string;
@@ -24,7 +24,7 @@ export interface EffectSize {
 }
 
 export interface ChartConfig {
-  type: 'scatter' | 'box' | 'bar' | 'distribution' | 'residual' | 'control_chart';
+  type: 'scatter' | 'box' | 'bar' | 'distribution' | 'residual' | 'control_chart' | 'line';
   title: string;
   data: any;
   xLabel?: string;
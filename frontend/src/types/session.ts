@@ -1,4 +1,4 @@
-import type { Message } from './chat';
+import type { ChartConfig, Message } from './chat';
 
 export type Industry =
   | 'ecommerce'
@@ -22,8 +22,15 @@ export interface Session {
   message_count: number;
 }
 
+export interface SessionMessage extends Message {
+  /** analysis 默认不含 visualizations，按需通过 getMessageVisualizations 获取 */
+  visualization_count?: number;
+}
+
 export interface SessionDetail extends Session {
-  messages: Message[];
+  messages: SessionMessage[];
+  messages_total?: number;
+  messages_page?: number;
   data_summary: DataSummary;
   report_conclusion?: string | null;
 }
@@ -51,10 +58,17 @@ export interface SessionsQuery {
   method?: string;
   start_date?: string;
   end_date?: string;
+  cursor?: string;
 }
 
 export interface SessionsResponse {
   total: number;
   page: number;
   items: Session[];
+  next_cursor?: string | null;
+}
+
+export interface MessageVisualizations {
+  message_id: string;
+  visualizations: ChartConfig[];
 }